@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from decouple import config
 import dj_database_url
@@ -71,6 +72,48 @@ DATABASES = {
 }
 
 
+# --- CACHE (resultados de analytics, ver dashboard/analytics_cache.py) ---
+# Com REDIS_URL usa Redis (configure maxmemory-policy allkeys-lru no servidor);
+# sem ele, cache em memória local por processo, com despejo LRU ao atingir MAX_ENTRIES.
+# Os contadores de versão ficam no banco (AnalyticsVersion), então mesmo com o cache
+# local uma escrita invalida os resultados em todos os workers; o cache local só
+# duplica as entradas por worker.
+REDIS_URL = config('REDIS_URL', default='')
+ANALYTICS_CACHE_TIMEOUT = config('ANALYTICS_CACHE_TIMEOUT', default=600, cast=int)
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'TIMEOUT': ANALYTICS_CACHE_TIMEOUT,
+            'KEY_PREFIX': 'finboard',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'finboard-analytics',
+            'TIMEOUT': ANALYTICS_CACHE_TIMEOUT,
+            'OPTIONS': {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=5000, cast=int)},
+        }
+    }
+
+# Threads (e conexões com o banco) por processo para os cálculos das views ASGI
+# (ver dashboard/async_views.py); pedidos além disso esperam na fila
+ANALYTICS_THREADS = config('ANALYTICS_THREADS', default=4, cast=int)
+
+# Processos por worker para as simulações de Monte Carlo grandes (ver
+# dashboard/simulation.py); some-se a isso o número de workers do servidor
+SIMULATION_PROCESSES = config('SIMULATION_PROCESSES', default=2, cast=int)
+
+# Snapshots colunares dos trades por utilizador (ver dashboard/snapshots.py), mapeados
+# em memória: use um disco local, partilhado pelos workers da mesma máquina
+TRADE_SNAPSHOT_DIR = config(
+    'TRADE_SNAPSHOT_DIR', default=os.path.join(tempfile.gettempdir(), 'finboard-snapshots'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -129,5 +172,33 @@ CORS_ALLOWED_ORIGINS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'dashboard.renderers.InstrumentedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+}
+
+# --- INSTRUMENTAÇÃO (ver dashboard/instrumentation.py) ---
+# Fração dos requests medidos (0 desliga o middleware; 0.01 = 1%)
+INSTRUMENTATION_SAMPLE_RATE = config('INSTRUMENTATION_SAMPLE_RATE', default=0.0, cast=float)
+INSTRUMENTATION_SLOW_QUERY_MS = config('INSTRUMENTATION_SLOW_QUERY_MS', default=100, cast=int)
+# A partir de quantas execuções do mesmo SQL num request avisamos de um possível N+1
+INSTRUMENTATION_REPEATED_QUERY_THRESHOLD = config(
+    'INSTRUMENTATION_REPEATED_QUERY_THRESHOLD', default=10, cast=int)
+if INSTRUMENTATION_SAMPLE_RATE > 0:
+    MIDDLEWARE.insert(0, 'dashboard.instrumentation.RequestInstrumentationMiddleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'dashboard': {
+            'handlers': ['console'],
+            'level': config('DASHBOARD_LOG_LEVEL', default='INFO'),
+        },
+    },
 }
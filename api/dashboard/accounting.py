@@ -0,0 +1,217 @@
+# api/dashboard/accounting.py
+
+from decimal import Decimal
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+
+from .ledger import sync_trades
+from .models import Trade, TradeEntry, TradeManualClose, TradeStop, TradeTarget
+from .rollups import rebuild_daily_pnl
+from .tax import reset_tax_months
+
+ACCOUNTING_BATCH_SIZE = 5000
+
+DERIVED_FIELDS = [
+    'quantity', 'avg_entry_price', 'avg_exit_price', 'gross_result',
+    'net_result', 'risk_per_unit', 'r_multiple', 'holding_seconds',
+]
+
+
+def _as_ns(dates):
+    """Lista de datetimes (com ou sem None) -> int64 em nanossegundos UTC."""
+    return pd.to_datetime(pd.Series(dates, dtype=object), utc=True).to_numpy(
+        dtype='datetime64[ns]').view('int64')
+
+
+def _load_legs(queryset, trade_ids, date_field=None, with_quantity=True):
+    """Carrega uma tabela de pernas para o bloco inteiro numa única query, como arrays."""
+    columns = ['trade_id', 'price']
+    if with_quantity:
+        columns.append('quantity')
+    if date_field:
+        columns.append(date_field)
+    rows = list(queryset.filter(trade_id__in=trade_ids).order_by(
+        'trade_id', 'id').values_list(*columns))
+    if not rows:
+        return None
+
+    values = dict(zip(columns, zip(*rows)))
+    legs = {
+        'trade_id': np.array(values['trade_id'], dtype=np.int64),
+        'price': np.array(values['price'], dtype=float),
+    }
+    if with_quantity:
+        legs['quantity'] = np.array(values['quantity'], dtype=float)
+    if date_field:
+        legs['date'] = _as_ns(values[date_field])
+    return legs
+
+
+def _group_sum(index, weights, size):
+    return np.bincount(index, weights=weights, minlength=size)
+
+
+def compute_trade_analytics(trades):
+    """
+    Calcula os campos derivados de um bloco de trades de uma só vez.
+    `trades` é uma sequência de (id, side, fees, net_result). As pernas do bloco
+    inteiro são lidas em quatro queries e agregadas com np.bincount / ufunc.at,
+    sem loops por trade. Devolve um DataFrame indexado pelo id do trade.
+    """
+    ids, sides, fees, current_net = (np.array(column) for column in zip(*trades))
+    ids = ids.astype(np.int64)
+    order = np.argsort(ids)
+    ids, sides = ids[order], sides[order]
+    fees = fees[order].astype(float)
+    current_net = current_net[order].astype(float)
+    size = ids.size
+    trade_ids = ids.tolist()
+
+    # --- Entradas: quantidade, preço médio e data da primeira entrada ---
+    entry_qty = np.zeros(size)
+    entry_notional = np.zeros(size)
+    first_entry = np.full(size, np.iinfo(np.int64).max)
+    entries = _load_legs(TradeEntry.objects, trade_ids, 'entry_date')
+    if entries:
+        index = np.searchsorted(ids, entries['trade_id'])
+        entry_qty = _group_sum(index, entries['quantity'], size)
+        entry_notional = _group_sum(
+            index, entries['price'] * entries['quantity'], size)
+        np.minimum.at(first_entry, index, entries['date'])
+
+    # --- Saídas executadas: alvos com data e fechamentos manuais ---
+    exit_qty = np.zeros(size)
+    exit_notional = np.zeros(size)
+    last_exit = np.full(size, np.iinfo(np.int64).min)
+    for legs in (
+        _load_legs(TradeTarget.objects.filter(
+            target_date__isnull=False), trade_ids, 'target_date'),
+        _load_legs(TradeManualClose.objects, trade_ids, 'close_date'),
+    ):
+        if legs:
+            index = np.searchsorted(ids, legs['trade_id'])
+            exit_qty += _group_sum(index, legs['quantity'], size)
+            exit_notional += _group_sum(index,
+                                        legs['price'] * legs['quantity'], size)
+            np.maximum.at(last_exit, index, legs['date'])
+
+    # --- Stop inicial: o primeiro registrado de cada trade ---
+    initial_stop = np.full(size, np.nan)
+    stops = _load_legs(TradeStop.objects, trade_ids, with_quantity=False)
+    if stops:
+        first_ids, first_rows = np.unique(stops['trade_id'], return_index=True)
+        initial_stop[np.searchsorted(ids, first_ids)] = stops['price'][first_rows]
+
+    has_entry = entry_qty > 0
+    has_exit = has_entry & (exit_qty > 0)
+    direction = np.where(sides == 'BUY', 1.0, -1.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_entry = np.where(has_entry, entry_notional / entry_qty, np.nan)
+        avg_exit = np.where(exit_qty > 0, exit_notional / exit_qty, np.nan)
+        # Resultado realizado sobre a quantidade já encerrada
+        gross = np.where(has_exit, (exit_notional - avg_entry *
+                         exit_qty) * direction, np.nan)
+        # Sem pernas de saída, mantemos o resultado lançado manualmente
+        net = np.where(has_exit, gross - fees, current_net)
+        risk_per_unit = np.abs(avg_entry - initial_stop)
+        risk_amount = risk_per_unit * entry_qty
+        r_multiple = np.where(has_exit & (risk_amount > 0),
+                              net / risk_amount, np.nan)
+
+    holding = np.where(has_exit & (first_entry != np.iinfo(np.int64).max),
+                       (last_exit - first_entry) // 10**9, -1)
+
+    return pd.DataFrame({
+        'quantity': np.where(has_entry, entry_qty, np.nan),
+        'avg_entry_price': avg_entry,
+        'avg_exit_price': avg_exit,
+        'gross_result': gross,
+        'net_result': net,
+        'risk_per_unit': risk_per_unit,
+        'r_multiple': r_multiple,
+        'holding_seconds': holding,
+    }, index=pd.Index(ids, name='id'))
+
+
+# Casas decimais de cada campo derivado (None = inteiro)
+FIELD_PLACES = {
+    'quantity': 5, 'avg_entry_price': 5, 'avg_exit_price': 5, 'gross_result': 2,
+    'net_result': 2, 'risk_per_unit': 5, 'r_multiple': 4, 'holding_seconds': None,
+}
+# Maior valor absoluto que cada DecimalField derivado comporta
+FIELD_LIMITS = {
+    name: 10 ** (Trade._meta.get_field(name).max_digits - places)
+    for name, places in FIELD_PLACES.items() if places is not None
+}
+
+
+def _to_model_value(value, places, limit=None):
+    if places is None:
+        return int(value) if value >= 0 else None
+    value = round(float(value), places)
+    # Um stop colado à entrada dá um R enorme: sem valor, em vez de estourar o campo
+    if np.isnan(value) or abs(value) >= limit:
+        return None
+    return Decimal(str(value))
+
+
+def persist_trade_analytics(analytics):
+    """Grava o DataFrame de compute_trade_analytics com um bulk_update."""
+    trades = []
+    for row in analytics.itertuples():
+        trade = Trade(pk=row.Index)
+        for name, places in FIELD_PLACES.items():
+            setattr(trade, name, _to_model_value(
+                getattr(row, name), places, FIELD_LIMITS.get(name)))
+        # net_result não aceita nulo
+        if trade.net_result is None:
+            trade.net_result = Decimal('0.00')
+        trades.append(trade)
+    Trade.objects.bulk_update(trades, DERIVED_FIELDS, batch_size=1000)
+
+
+def update_trade_analytics(trades):
+    """
+    Recalcula e grava os campos derivados de poucos trades, sem as reconstruções de
+    recompute_trades: `trades` são ids ou tuplas (id, side, fees, net_result).
+    Usado ao importar e quando as pernas de um trade mudam (ver signals.py).
+    """
+    trades = list(trades)
+    if trades and not isinstance(trades[0], tuple):
+        trades = list(Trade.objects.filter(pk__in=trades).values_list(
+            'id', 'side', 'fees', 'net_result'))
+    if trades:
+        persist_trade_analytics(compute_trade_analytics(trades))
+
+
+def recompute_trades(trades, batch_size=ACCOUNTING_BATCH_SIZE):
+    """
+    Recalcula e grava em lote os campos derivados dos trades do queryset.
+    Usado, por exemplo, depois de corrigir as taxas de um portfolio inteiro.
+    Devolve a quantidade de trades processados.
+    """
+    rows = trades.order_by('id').values_list(
+        'id', 'side', 'fees', 'net_result', 'user_id').iterator(chunk_size=batch_size)
+    processed = 0
+    user_ids = set()
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        user_ids.update(row[4] for row in batch)
+        analytics = compute_trade_analytics([row[:4] for row in batch])
+        with transaction.atomic():
+            persist_trade_analytics(analytics)
+            sync_trades(analytics.index.tolist())
+        processed += len(batch)
+
+    # bulk_update não dispara sinais: o saldo é acertado por bloco (acima), o
+    # DailyPnL é reconstruído e a apuração de IR descartada por utilizador
+    for user_id in user_ids:
+        rebuild_daily_pnl(user_id)
+        reset_tax_months(user_id)
+    return processed
@@ -12,6 +12,11 @@ from .models import (
     TradeManualClose,
     JournalNote,
     PortfolioTransaction,
+    ExchangeRate,
+    BalanceLedgerEntry,
+    BalanceSnapshot,
+    TaxMonth,
+    DailyPnL,
 )
 
 # --- Registos Personalizados com @admin.register ---
@@ -77,3 +82,8 @@ admin.site.register(TradeStop)
 admin.site.register(TradeTarget)
 admin.site.register(TradeManualClose)
 admin.site.register(PortfolioTransaction)
+admin.site.register(ExchangeRate)
+admin.site.register(DailyPnL)
+admin.site.register(BalanceLedgerEntry)
+admin.site.register(BalanceSnapshot)
+admin.site.register(TaxMonth)
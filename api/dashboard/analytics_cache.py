@@ -0,0 +1,81 @@
+# api/dashboard/analytics_cache.py
+
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import AnalyticsVersion
+
+# Versão global (reconstruções completas) e uma versão por utilizador. Ambas entram
+# na chave: incrementar a versão torna inalcançáveis as entradas antigas, que
+# expiram pelo TTL ou saem por LRU, sem precisar apagar chave a chave.
+# Os contadores ficam no banco (AnalyticsVersion): com um cache local por processo,
+# um contador em cache só mudaria no worker que recebeu a escrita.
+GLOBAL_SCOPE = 'global'
+USER_SCOPE = 'user:{user_id}'
+
+
+def _fresh_version():
+    # Um contador novo (banco recriado, por exemplo) nunca coincide com um antigo
+    # ainda presente num cache partilhado
+    return time.time_ns()
+
+
+def _bump(scope):
+    if AnalyticsVersion.objects.filter(scope=scope).update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            AnalyticsVersion.objects.create(scope=scope, version=_fresh_version())
+    except IntegrityError:
+        # Criado em paralelo por outro processo
+        AnalyticsVersion.objects.filter(scope=scope).update(version=F('version') + 1)
+
+
+def invalidate_analytics(user_id=None):
+    """Invalida os analytics de um utilizador, ou de todos quando `user_id` é None."""
+    if user_id is None:
+        _bump(GLOBAL_SCOPE)
+    else:
+        _bump(USER_SCOPE.format(user_id=user_id))
+
+
+def data_version(user_id):
+    """
+    Versão atual dos dados do utilizador (uma query): muda a cada invalidate_analytics,
+    em qualquer processo.
+    """
+    scopes = [GLOBAL_SCOPE, USER_SCOPE.format(user_id=user_id)]
+    versions = dict(AnalyticsVersion.objects.filter(
+        scope__in=scopes).values_list('scope', 'version'))
+    for scope in scopes:
+        if scope not in versions:
+            # Primeira leitura do contador (get_or_create já trata a corrida entre processos)
+            versions[scope] = AnalyticsVersion.objects.get_or_create(
+                scope=scope, defaults={'version': _fresh_version()})[0].version
+    return ':'.join(str(versions[scope]) for scope in scopes)
+
+
+def analytics_key(name, user_id, **params):
+    """Chave: nome do cálculo, utilizador, versões atuais e hash dos parâmetros (portfolio, datas...)."""
+    digest = hashlib.sha1(json.dumps(
+        params, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return f'analytics:{name}:{user_id}:{data_version(user_id)}:{digest}'
+
+
+def cached_analytics(name, user_id, compute, timeout=None, **params):
+    """
+    Devolve o resultado em cache de `compute()` para o utilizador e parâmetros,
+    calculando e guardando em caso de falha. O resultado deve ser serializável.
+    """
+    key = analytics_key(name, user_id, **params)
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.set(key, result, timeout or settings.ANALYTICS_CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,161 @@
+# api/dashboard/async_views.py
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views import View
+from rest_framework.exceptions import AuthenticationFailed, NotFound
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .analytics_cache import cached_analytics, data_version
+from .charts import MAX_CHART_POINTS, daily_results, equity_curves, starting_capital
+from .metrics import DashboardMetrics
+from .models import Trade
+from .pagination import KeysetPagination
+from .serializers import TradeSerializer
+from .strategy_stats import strategy_breakdown
+from .time_metrics import time_metrics
+
+JWT = JWTAuthentication()
+
+# Pool partilhado pelos pedidos do processo: no máximo ANALYTICS_THREADS cálculos
+# em paralelo e, como as threads são fixas, no máximo ANALYTICS_THREADS conexões
+ANALYTICS_EXECUTOR = ThreadPoolExecutor(
+    max_workers=settings.ANALYTICS_THREADS, thread_name_prefix='analytics')
+
+
+async def authenticate(request):
+    """Mesmo JWT das views DRF; só a leitura do utilizador vai ao banco (aget)."""
+    header = JWT.get_header(request)
+    try:
+        # Cabeçalho malformado (ex.: 'Bearer a b') ou token inválido: AuthenticationFailed
+        raw_token = header and JWT.get_raw_token(header)
+        if not raw_token:
+            return None
+        token = JWT.get_validated_token(raw_token)
+    except AuthenticationFailed:
+        return None
+    users = User.objects.filter(
+        is_active=True, **{api_settings.USER_ID_FIELD: token.get(api_settings.USER_ID_CLAIM)})
+    return await users.afirst()
+
+
+def _discard_broken_connections():
+    # Como close_old_connections, mas sem CONN_MAX_AGE: a conexão da thread só é
+    # trocada depois de um erro que a deixou inutilizável
+    for conn in connections.all(initialized_only=True):
+        if conn.connection is not None and conn.errors_occurred:
+            if conn.is_usable():
+                conn.errors_occurred = False
+            else:
+                conn.close()
+
+
+def _isolated(function):
+    """
+    Roda `function` numa thread de ANALYTICS_EXECUTOR, fora da thread do request.
+    Cada thread tem a sua conexão com o banco, reaproveitada entre pedidos, então
+    as queries de chamadas diferentes correm de facto em paralelo; acima de
+    ANALYTICS_THREADS chamadas simultâneas, as restantes esperam na fila do pool.
+    """
+    def run():
+        _discard_broken_connections()
+        return function()
+    # Leva o contexto do request (ex.: o perfil da instrumentação) para a thread
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(ANALYTICS_EXECUTOR, context.run, run)
+
+
+def close_analytics_connections():
+    """
+    Fecha as conexões das threads do pool (ex.: antes de apagar a base de testes).
+    A barreira garante que cada tarefa corre numa thread diferente.
+    """
+    barrier = threading.Barrier(settings.ANALYTICS_THREADS)
+
+    def close():
+        connections.close_all()
+        barrier.wait()
+
+    for future in [ANALYTICS_EXECUTOR.submit(close)
+                   for _ in range(settings.ANALYTICS_THREADS)]:
+        future.result()
+
+
+async def gather_analytics(**functions):
+    """Executa os cálculos independentes ao mesmo tempo; devolve {nome: resultado}."""
+    results = await asyncio.gather(*(_isolated(function) for function in functions.values()))
+    return dict(zip(functions, results))
+
+
+class AsyncAPIView(View):
+    """Base das views ASGI nativas: autentica por JWT e responde JSON como o DRF."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await authenticate(request)
+        if request.user is None:
+            return JsonResponse(
+                {'detail': 'As credenciais de autenticação não foram fornecidas.'}, status=401)
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncTradeListView(AsyncAPIView):
+    """
+    Versão ASGI de TradeListAPIView: mesma paginação por cursor e ?fields=, com a
+    página (e as pernas, via prefetch) lida pelo ORM assíncrono.
+    """
+
+    async def get(self, request):
+        drf_request = Request(request)
+        fields = TradeSerializer.requested_fields(drf_request)
+        trades = TradeSerializer.setup_queryset(
+            Trade.objects.filter(user=request.user), fields)
+        paginator = KeysetPagination()
+        try:
+            page = await paginator.apaginate_queryset(trades, drf_request)
+        except NotFound as error:
+            return JsonResponse({'detail': str(error.detail)}, status=404)
+        data = TradeSerializer(page, many=True, context={'request': drf_request}).data
+        return JsonResponse({'next': paginator.get_next_link(), 'results': data})
+
+
+class AsyncDashboardView(AsyncAPIView):
+    """
+    Tudo o que a página inicial do dashboard precisa num só pedido: KPIs, curva de
+    patrimônio, estratégias e métricas de tempo, calculados em paralelo. Usa as
+    mesmas chaves de cache das views individuais.
+    """
+
+    async def get(self, request):
+        user = request.user
+        today = timezone.localdate()
+
+        def equity():
+            return equity_curves(daily_results(user), starting_capital(user),
+                                 'day', MAX_CHART_POINTS)
+
+        # Cria os contadores de versão antes: em paralelo, os quatro cálculos
+        # tentariam criá-los ao mesmo tempo na primeira visita do utilizador
+        await _isolated(lambda: data_version(user.pk))
+        return JsonResponse(await gather_analytics(
+            kpis=lambda: cached_analytics(
+                'kpis', user.pk,
+                lambda: DashboardMetrics(user, today=today).compute().as_dict(),
+                today=today),
+            equity=lambda: cached_analytics(
+                'equity', user.pk, equity, portfolio=None, strategy=None,
+                resolution='day', max_points=MAX_CHART_POINTS),
+            strategies=lambda: cached_analytics(
+                'strategies', user.pk, lambda: strategy_breakdown(user), portfolio=None),
+            time=lambda: cached_analytics(
+                'time_metrics', user.pk, lambda: time_metrics(user), portfolio=None),
+        ))
@@ -0,0 +1,143 @@
+# api/dashboard/benchmarks.py
+
+import statistics
+import time
+import tracemalloc
+
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .analytics_cache import invalidate_analytics
+from .currency_converter import RATES_CACHE, convert_many, convert_to_brl
+from .metrics import closed_trades_frame
+from .models import Trade
+from .serializers import TradeSerializer
+
+# Métricas comparadas com a linha de base; a contagem de queries não tem tolerância
+TIMED_METRICS = ('median_ms', 'peak_kib')
+
+
+class QueryCounter:
+    """
+    Conta as queries executadas (execute_wrapper). Ao contrário de
+    CaptureQueriesContext, não se perde com o reset_queries do início de cada request.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _endpoint(name, **params):
+    def call(client, user):
+        response = client.get(reverse(f'dashboard:{name}'), params)
+        assert response.status_code == 200, (name, response.status_code)
+    return call
+
+
+def _serialize_trades(client, user):
+    trades = TradeSerializer.setup_queryset(
+        Trade.objects.filter(user=user).order_by('-created_at', '-id'))[:500]
+    TradeSerializer(trades, many=True).data
+
+
+def _convert_to_brl(client, user):
+    # Caminho escalar, um trade de cada vez (sem o cache do processo)
+    RATES_CACHE.clear()
+    for amount, currency, closed_at in Trade.objects.closed().filter(
+            user=user).with_closed_at().values_list(
+            'net_result', 'portfolio__currency', 'closed_at')[:1000]:
+        convert_to_brl(amount, currency, closed_at)
+
+
+def _convert_many(client, user):
+    frame = closed_trades_frame(user)
+    convert_many(frame['net_result'], frame['currency'], frame['closed_at'])
+
+
+CASES = {
+    'trade_list': _endpoint('api_trade_list'),
+    'trade_list_sparse': _endpoint('api_trade_list', fields='id,symbol,net_result'),
+    'metrics': _endpoint('api_metrics'),
+    'equity': _endpoint('api_equity_curve'),
+    'strategies': _endpoint('api_strategy_breakdown'),
+    'time_metrics': _endpoint('api_time_metrics'),
+    'calendar': _endpoint('api_calendar'),
+    'tax': _endpoint('api_tax_report'),
+    'journal_search': _endpoint('api_journal_search', q='rompimento'),
+    'monte_carlo': _endpoint('api_monte_carlo', paths=10000, horizon=1000, block=5),
+    'trade_serializer': _serialize_trades,
+    'convert_to_brl': _convert_to_brl,
+    'convert_many': _convert_many,
+}
+
+
+def measure(function, client, user, repeat=5, warm=False):
+    """
+    Roda `function` `repeat` vezes: mediana e mínimo da latência, queries da
+    última execução e pico de memória Python (tracemalloc) numa execução à parte.
+    Sem `warm`, o cache de analytics do utilizador é invalidado antes de cada rodada.
+    """
+    timings = []
+    for _ in range(repeat):
+        if not warm:
+            invalidate_analytics(user.pk)
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            started = time.perf_counter()
+            function(client, user)
+            timings.append((time.perf_counter() - started) * 1000)
+
+    if not warm:
+        invalidate_analytics(user.pk)
+    tracemalloc.start()
+    try:
+        function(client, user)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'median_ms': round(statistics.median(timings), 2),
+        'min_ms': round(min(timings), 2),
+        'queries': queries.count,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(user, cases=None, repeat=5, warm=False):
+    """Mede os casos de CASES (ou só os nomeados em `cases`) para o utilizador."""
+    client = APIClient()
+    client.force_authenticate(user)
+    results = {}
+    for name in cases or CASES:
+        results[name] = measure(CASES[name], client, user, repeat, warm)
+    return {
+        'user': user.username,
+        'trades': Trade.objects.filter(user=user).count(),
+        'recorded_at': timezone.now().isoformat(),
+        'results': results,
+    }
+
+
+def compare(current, baseline, tolerance=0.25):
+    """
+    Regressões de `current` em relação a `baseline` (saídas de run_benchmarks):
+    tempo ou memória acima de (1 + tolerance) x a base, ou qualquer query a mais.
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: {base['queries']} -> {result['queries']} queries")
+        for metric in TIMED_METRICS:
+            if result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {base[metric]} -> {result[metric]}")
+    return regressions
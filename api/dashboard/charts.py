@@ -0,0 +1,163 @@
+# api/dashboard/charts.py
+
+import calendar
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from django.db.models import Sum
+
+from .currency_converter import convert_many
+from .instrumentation import timed
+from .models import BalanceLedgerEntry, DailyPnL
+from .snapshots import trade_snapshot
+
+# Teto de pontos por série enviado ao gráfico, independente do tamanho do histórico
+MAX_CHART_POINTS = 2000
+
+# Resolução -> regra do pandas.resample (rótulo no último dia do período)
+RESOLUTIONS = {'day': None, 'week': 'W', 'month': 'ME'}
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: devolve os índices de até `threshold` pontos
+    que preservam a forma visual da série (picos e vales incluídos). O primeiro e
+    o último ponto são sempre mantidos.
+    """
+    size = len(y)
+    if threshold >= size or threshold < 3:
+        return np.arange(size)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    every = (size - 2) / (threshold - 2)
+    # Limites dos baldes; o último "balde" é apenas o ponto final
+    edges = np.append((np.arange(threshold - 1) * every).astype(int) + 1, size)
+
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, size - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2]
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        # Área do triângulo (ponto anterior, candidato, média do próximo balde)
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous]) -
+                      (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(area.argmax())
+        selected[bucket + 1] = previous
+    return selected
+
+
+def daily_results(user, portfolio=None, strategy=None):
+    """
+    Resultado líquido em BRL por dia (pd.Series com índice de datas).
+    Sem estratégia, lê direto do DailyPnL já consolidado; a estratégia não é
+    uma dimensão do DailyPnL, então nesse caso agrega o snapshot colunar.
+    """
+    if strategy is None:
+        rows = DailyPnL.objects.filter(user=user)
+        if portfolio is not None:
+            rows = rows.filter(portfolio=portfolio)
+        rows = rows.values('date').annotate(
+            net=Sum('net_brl')).order_by('date').values_list('date', 'net')
+        frame = pd.DataFrame.from_records(rows, columns=['date', 'net'])
+        return pd.Series(frame['net'].astype(float).to_numpy(),
+                         index=pd.DatetimeIndex(frame['date'], name='date'))
+
+    return trade_snapshot(user.pk).daily(getattr(portfolio, 'pk', None), strategy.pk)
+
+
+def starting_capital(user, portfolio=None):
+    """Soma dos saldos de abertura (em BRL) dos portfolios, base do percentual submerso."""
+    entries = BalanceLedgerEntry.objects.filter(
+        kind='OPENING', portfolio__user=user)
+    if portfolio is not None:
+        entries = entries.filter(portfolio=portfolio)
+    rows = list(entries.values_list('amount', 'portfolio__currency', 'date'))
+    if not rows:
+        return 0.0
+    amounts, currencies, dates = zip(*rows)
+    return float(convert_many(amounts, currencies, dates).sum())
+
+
+def _points(series, max_points):
+    """Série -> [[data, valor], ...] com no máximo `max_points` pontos (LTTB)."""
+    days = series.index.to_numpy(dtype='datetime64[D]')
+    keep = lttb(days.astype(np.int64), series.to_numpy(), max_points)
+    labels = np.datetime_as_string(days[keep])
+    values = np.round(series.to_numpy()[keep], 2)
+    return [[label, float(value)] for label, value in zip(labels, values)]
+
+
+@timed('pandas')
+def equity_curves(daily, capital=0.0, resolution='day', max_points=MAX_CHART_POINTS):
+    """
+    Curvas de patrimônio (resultado acumulado), drawdown (distância ao pico, em BRL)
+    e submersa (drawdown em % do capital no pico) a partir dos resultados diários.
+    Cada série é reduzida com LTTB de forma independente, para não perder os vales.
+    """
+    rule = RESOLUTIONS[resolution]
+    if rule is not None and not daily.empty:
+        daily = daily.resample(rule).sum()
+
+    equity = daily.cumsum()
+    # Antes do primeiro trade o resultado acumulado é zero: o pico nunca é negativo
+    peak = equity.cummax().clip(lower=0)
+    drawdown = equity - peak
+    base = capital + peak
+    underwater = (drawdown / base.where(base > 0)).fillna(0.0) * 100
+
+    return {
+        'resolution': resolution,
+        'currency': 'BRL',
+        'equity': _points(equity, max_points),
+        'drawdown': _points(drawdown, max_points),
+        'underwater': _points(underwater, max_points),
+        'max_drawdown': round(float(drawdown.min()), 2) if len(drawdown) else 0.0,
+        'max_drawdown_pct': round(float(underwater.min()), 2) if len(underwater) else 0.0,
+    }
+
+
+def _cell(net, count, wins):
+    return {'net': round(float(net), 2), 'count': count, 'wins': wins,
+            'win_rate': round(wins / count * 100, 2) if count else 0.0}
+
+
+def calendar_month(user, year, month, portfolio=None):
+    """
+    Mapa de calor de um mês em BRL: células por dia, totais por semana (segunda a
+    domingo, recortadas ao mês) e do mês. Lê só as linhas do mês no DailyPnL, pelo
+    índice (user, date): o custo não depende do tamanho do histórico.
+    """
+    first = date(year, month, 1)
+    last = date(year, month, calendar.monthrange(year, month)[1])
+    rows = DailyPnL.objects.filter(user=user, date__range=(first, last))
+    if portfolio is not None:
+        rows = rows.filter(portfolio=portfolio)
+    rows = rows.values('date').annotate(
+        net=Sum('net_brl'), count=Sum('count'), wins=Sum('wins')).order_by('date')
+
+    days, weeks = [], {}
+    month_total = [0.0, 0, 0]
+    for row in rows:
+        days.append({'date': row['date'].isoformat(),
+                     **_cell(row['net'], row['count'], row['wins'])})
+        week = weeks.setdefault(row['date'].isocalendar()[:2], [0.0, 0, 0])
+        for total in (week, month_total):
+            total[0] += float(row['net'])
+            total[1] += row['count']
+            total[2] += row['wins']
+
+    week_rows = []
+    for week_start in pd.date_range(first - pd.Timedelta(days=first.weekday()), last, freq='7D'):
+        start, end = max(week_start.date(), first), min((week_start + pd.Timedelta(days=6)).date(), last)
+        totals = weeks.get(week_start.date().isocalendar()[:2], [0.0, 0, 0])
+        week_rows.append({'start': start.isoformat(), 'end': end.isoformat(), **_cell(*totals)})
+
+    return {
+        'year': year, 'month': month, 'currency': 'BRL',
+        'days': days, 'weeks': week_rows, 'total': _cell(*month_total),
+    }
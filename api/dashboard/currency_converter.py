@@ -1,63 +1,217 @@
+import logging
+
+import numpy as np
+import pandas as pd
 import requests
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from decimal import Decimal
-from datetime import date, timedelta
+from datetime import datetime, timedelta
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .instrumentation import timed
+from .models import ExchangeRate, ExchangeRateCoverage
+from .rate_fetcher import RATE_FETCHER
+
+logger = logging.getLogger(__name__)
 
-# O cache continua sendo nosso aliado para performance
+# Enviado depois de gravar cotações novas do BCB (currency, start, end): os cálculos
+# gravados sem cotação (ver convert_many com wait) podem então ser completados
+rates_loaded = Signal()
+
+# Cache em memória por processo, na frente da tabela ExchangeRate (que é compartilhada
+# entre os workers e sobrevive a reinícios)
 RATES_CACHE = {}
 
+# Tentamos até 10 dias para trás para cobrir feriados longos
+FALLBACK_DAYS = 10
 
-def get_exchange_rate(currency_code, date_obj):
+# Idade máxima (além do fallback de feriados) de uma cotação antiga servida enquanto
+# a busca no BCB corre; mais velha que isso, o request espera pela busca
+STALE_DAYS = 5
+
+# Tempo máximo que um request espera por uma busca no BCB (com as novas tentativas)
+FETCH_WAIT = 15
+
+# Endpoint de período: uma única requisição traz a PTAX de todos os dias úteis do intervalo
+PTAX_BASE_URL = "https://olinda.bcb.gov.br/olinda/servico/PTAX/versao/v1/odata/"
+PTAX_PERIOD_URL = (
+    "{base}CotacaoDolarPeriodo(dataInicial=@dataInicial,dataFinalCotacao=@dataFinalCotacao)"
+    "?@dataInicial='{start}'&@dataFinalCotacao='{end}'"
+    "&$top=10000&$format=json&$select=cotacaoVenda,dataHoraCotacao"
+)
+# Demais moedas: o BCB publica vários boletins por dia; a PTAX é o de fechamento
+PTAX_CURRENCY_PERIOD_URL = (
+    "{base}CotacaoMoedaPeriodo(moeda=@moeda,dataInicial=@dataInicial,dataFinalCotacao=@dataFinalCotacao)"
+    "?@moeda='{currency}'&@dataInicial='{start}'&@dataFinalCotacao='{end}'"
+    "&$top=10000&$format=json&$filter=tipoBoletim%20eq%20'Fechamento'"
+    "&$select=cotacaoVenda,dataHoraCotacao"
+)
+
+# Moedas com PTAX publicada pelo BCB; as outras seguem sem conversão
+PTAX_CURRENCIES = ('USD', 'EUR', 'GBP', 'JPY', 'CHF',
+                   'CAD', 'AUD', 'DKK', 'NOK', 'SEK')
+
+
+def fetch_ptax_period(start_date, end_date, currency_code='USD'):
     """
-    Busca a taxa de câmbio (PTAX de venda) do Dólar para uma data específica,
-    usando a API do Banco Central do Brasil.
-    Se a data for um dia não-útil, busca o último dia útil anterior.
+    Busca na API do BCB as cotações PTAX de venda de uma moeda entre duas datas.
+    Retorna um dicionário {date: Decimal} apenas com os dias úteis.
     """
-    # Por enquanto, focamos na conversão USD -> BRL, que é a mais comum.
-    if currency_code != 'USD':
-        # Retorna 1 para não alterar moedas que não sejam dólar
-        return Decimal('1.0')
+    # Formato MM-DD-YYYY exigido pela URL
+    dates = {'base': PTAX_BASE_URL, 'start': start_date.strftime('%m-%d-%Y'),
+             'end': end_date.strftime('%m-%d-%Y')}
+    if currency_code == 'USD':
+        url = PTAX_PERIOD_URL.format(**dates)
+    else:
+        url = PTAX_CURRENCY_PERIOD_URL.format(currency=currency_code, **dates)
 
-    current_date = date_obj
-    # Formato DD/MM/YYYY exigido pelo BCB
-    date_str = current_date.strftime('%d/%m/%Y')
+    response = requests.get(url, timeout=10)  # Timeout de 10s
+    response.raise_for_status()
 
-    # 1. Verifica o cache primeiro
-    if date_str in RATES_CACHE:
-        return RATES_CACHE[date_str]
+    rates = {}
+    for row in response.json().get('value', []):
+        rate = row.get('cotacaoVenda')
+        quoted_at = row.get('dataHoraCotacao')  # Ex: "2024-01-02 13:04:26.866"
+        if rate and quoted_at:
+            quote_date = datetime.strptime(quoted_at[:10], '%Y-%m-%d').date()
+            rates[quote_date] = Decimal(str(rate))
+    return rates
 
-    # 2. Loop para buscar a cotação, andando para trás nos dias se necessário
-    for _ in range(10):  # Tentamos até 10 dias para trás para cobrir feriados longos
-        try:
-            formatted_date = current_date.strftime(
-                '%m-%d-%Y')  # Formato MM-DD-YYYY para a URL
-            # A URL busca a cotação PTAX para uma data específica
-            url = f"https://olinda.bcb.gov.br/olinda/servico/PTAX/versao/v1/odata/CotacaoDolarDia(dataCotacao=@dataCotacao)?@dataCotacao='{formatted_date}'&$top=100&$format=json"
 
-            response = requests.get(url, timeout=10)  # Timeout de 10s
-            response.raise_for_status()
-            data = response.json()
+def _missing_range(currency_code, start_date, end_date):
+    """Trecho a buscar para manter contíguo o intervalo coberto, ou None se já coberto."""
+    coverage = ExchangeRateCoverage.objects.filter(
+        currency=currency_code).first()
+    if coverage is None:
+        return start_date, end_date
+    if coverage.start_date <= start_date and end_date <= coverage.end_date:
+        return None
+    # Estende o intervalo já coberto para a esquerda, para a direita ou para os dois lados
+    fetch_start = start_date if start_date < coverage.start_date else coverage.end_date + \
+        timedelta(days=1)
+    fetch_end = end_date if end_date > coverage.end_date else coverage.start_date - \
+        timedelta(days=1)
+    return fetch_start, fetch_end
 
-            # Se a lista 'value' não estiver vazia, encontramos a cotação
-            if data.get('value'):
-                rate = data['value'][0].get('cotacaoVenda')
-                if rate:
-                    rate_decimal = Decimal(str(rate))
-                    # Guarda a cotação no cache com a DATA ORIGINAL da consulta
-                    RATES_CACHE[date_str] = rate_decimal
-                    return rate_decimal
 
-            # Se não encontrou, tenta o dia anterior
-            current_date -= timedelta(days=1)
+def _fetch_and_store(currency_code, fetch_start, fetch_end):
+    """Busca o trecho no BCB e grava as cotações e a nova cobertura (roda no pool)."""
+    rates = fetch_ptax_period(fetch_start, fetch_end, currency_code)
 
-        except requests.exceptions.RequestException as e:
-            print(f"ERRO: Falha ao acessar a API do BCB: {e}")
-            return None  # Retorna None em caso de falha de conexão
+    # A PTAX de hoje pode ainda não ter sido publicada: só consideramos coberto
+    # o que já é passado (ou o que a API efetivamente devolveu)
+    today = timezone.localdate()
+    covered_end = min(fetch_end, today - timedelta(days=1))
+    if rates:
+        covered_end = max(covered_end, max(rates))
 
-    print(
-        f"AVISO: Não foi possível encontrar a cotação para {currency_code} na data {date_str} ou nos 10 dias anteriores.")
-    return None
+    with transaction.atomic():
+        ExchangeRate.objects.bulk_create(
+            [ExchangeRate(currency=currency_code, date=quote_date, rate=rate)
+             for quote_date, rate in rates.items()],
+            ignore_conflicts=True,
+        )
+        coverage = ExchangeRateCoverage.objects.select_for_update().filter(
+            currency=currency_code).first()
+        if covered_end >= fetch_start:
+            ExchangeRateCoverage.objects.update_or_create(
+                currency=currency_code,
+                defaults={
+                    'start_date': min(fetch_start, coverage.start_date) if coverage else fetch_start,
+                    'end_date': max(covered_end, coverage.end_date) if coverage else covered_end,
+                },
+            )
+    if rates:
+        # Um erro de quem completa os cálculos não pode virar falha da busca
+        for receiver, error in rates_loaded.send_robust(
+                sender=ExchangeRate, currency=currency_code, start=min(rates), end=max(rates)):
+            if isinstance(error, Exception):
+                logger.error('Falha em %s depois de gravar cotações de %s.',
+                             receiver.__qualname__, currency_code, exc_info=error)
+    return rates
 
 
+def load_rates(currency_code, start_date, end_date, wait=True):
+    """
+    Garante que as cotações do período estejam gravadas no banco.
+    Só o trecho ainda não coberto é buscado no BCB, sempre em uma única requisição,
+    de forma que o intervalo coberto de cada moeda continue contíguo. A busca roda
+    no pool do RATE_FETCHER: pedidos simultâneos do mesmo trecho partilham a mesma
+    requisição, e falhas de rede são repetidas com backoff.
+    Retorna True se o período está coberto e False se a API do BCB falhar; com
+    wait=False, retorna None enquanto a busca corre em segundo plano.
+    """
+    if currency_code not in PTAX_CURRENCIES:
+        return True
+
+    missing = _missing_range(currency_code, start_date, end_date)
+    if missing is None:
+        return True
+    future = RATE_FETCHER.submit(
+        (currency_code, *missing), _fetch_and_store, currency_code, *missing)
+    if not wait:
+        return None
+
+    try:
+        future.result(timeout=FETCH_WAIT)
+    except requests.exceptions.RequestException as e:
+        logger.error("Falha ao acessar a API do BCB: %s", e)
+        return False
+    except FutureTimeoutError:
+        logger.error("A API do BCB não respondeu em %ss.", FETCH_WAIT)
+        return False
+    return True
+
+
+def get_exchange_rate(currency_code, date_obj):
+    """
+    Busca a taxa de câmbio (PTAX de venda) de uma moeda para uma data específica,
+    a partir da série gravada no banco (carregada do BCB quando necessário).
+    Se a data for um dia não-útil, usa o último dia útil anterior.
+    """
+    if currency_code not in PTAX_CURRENCIES:
+        # Retorna 1 para não alterar moedas sem PTAX (e o próprio BRL)
+        return Decimal('1.0')
+
+    # 1. Verifica o cache do processo primeiro
+    cache_key = (currency_code, date_obj)
+    if cache_key in RATES_CACHE:
+        return RATES_CACHE[cache_key]
+
+    # 2. Pede a janela de fallback ao BCB em segundo plano, sem bloquear o request
+    window_start = date_obj - timedelta(days=FALLBACK_DAYS - 1)
+    loaded = load_rates(currency_code, window_start, date_obj, wait=False)
+
+    # 3. O último dia útil até a data é resolvido direto na série gravada
+    stored = ExchangeRate.objects.filter(
+        currency=currency_code, date__lte=date_obj).order_by('-date').values_list('rate', flat=True)
+    rate = stored.filter(date__gte=window_start).first()
+
+    if rate is None and loaded is None:
+        # Stale-while-revalidate: enquanto a busca corre, usamos a última cotação
+        # conhecida de até STALE_DAYS antes da janela; só esperamos pelo BCB sem ela
+        rate = stored.filter(date__gte=window_start - timedelta(days=STALE_DAYS)).first()
+        if rate is None:
+            if not load_rates(currency_code, window_start, date_obj):
+                return None  # Retorna None em caso de falha de conexão
+            rate = stored.filter(date__gte=window_start).first()
+
+    if rate is None:
+        logger.warning(
+            "Não foi possível encontrar a cotação para %s na data %s ou nos %s dias anteriores.",
+            currency_code, f'{date_obj:%d/%m/%Y}', FALLBACK_DAYS)
+        return None
+
+    # A cotação de hoje ainda pode mudar (PTAX publicada à tarde) e uma cotação
+    # antiga usada durante a busca será substituída, então nenhuma das duas fica em cache
+    if loaded and date_obj < timezone.localdate():
+        RATES_CACHE[cache_key] = rate
+    return rate
+
+
+@timed('fx')
 def convert_to_brl(amount, currency_code, date_obj):
     """
     Converte um valor de uma moeda estrangeira para BRL.
@@ -74,3 +228,95 @@ def convert_to_brl(amount, currency_code, date_obj):
 
     # Se não conseguiu nenhuma cotação, retorna o valor original para não quebrar os cálculos
     return amount
+
+
+def _stored_rate_series(currency_code, window_start, end_date, stale):
+    # Com `stale`, a série começa STALE_DAYS antes e a última cotação é propagada
+    # por mais STALE_DAYS dias (busca ainda em curso)
+    start = window_start - timedelta(days=STALE_DAYS) if stale else window_start
+    stored = ExchangeRate.objects.filter(
+        currency=currency_code, date__gte=start, date__lte=end_date
+    ).values_list('date', 'rate')
+    series = pd.Series({pd.Timestamp(quote_date): float(rate)
+                       for quote_date, rate in stored}, dtype=float)
+    series = series.reindex(pd.date_range(start, end_date, freq='D'))
+    return series.ffill(limit=FALLBACK_DAYS - 1 + (STALE_DAYS if stale else 0))
+
+
+def get_rate_series(currency_code, start_date, end_date, wait=False):
+    """
+    Retorna a cotação de cada dia corrido do período como uma pd.Series indexada
+    por data, já com o fallback para o último dia útil anterior.
+    Dias sem cotação conhecida ficam como NaN.
+    Com `wait`, espera pela busca no BCB em vez de servir cotações antigas: é o
+    que usam os cálculos que são gravados (DailyPnL, TaxMonth e o snapshot).
+    """
+    days = pd.date_range(start_date, end_date, freq='D')
+    if currency_code not in PTAX_CURRENCIES:
+        return pd.Series(1.0, index=days)
+
+    window_start = start_date - timedelta(days=FALLBACK_DAYS - 1)
+    loaded = load_rates(currency_code, window_start, end_date, wait=wait)
+    series = _stored_rate_series(
+        currency_code, window_start, end_date, stale=loaded is None).reindex(days)
+    if loaded is None and series.isna().any():
+        # Há dias sem cotação de até STALE_DAYS de idade: aqui esperamos pelo BCB
+        load_rates(currency_code, window_start, end_date)
+        series = _stored_rate_series(
+            currency_code, window_start, end_date, stale=False).reindex(days)
+    return series
+
+
+@timed('fx')
+def convert_many(amounts, currencies, dates, wait=False):
+    """
+    Versão vetorizada de convert_to_brl para uma coluna inteira de valores.
+    `currencies` pode ser uma única moeda ou uma sequência alinhada com `amounts`.
+    As cotações são resolvidas uma única vez por moeda (uma consulta ao banco e,
+    no máximo, uma requisição ao BCB) e cruzadas com as datas de uma só vez.
+    Se `amounts` for uma pd.Series, devolve uma pd.Series com o mesmo índice;
+    caso contrário, devolve um np.ndarray de float.
+    Com `wait` (cálculos que serão gravados), espera pela busca no BCB (ver
+    get_rate_series) e os valores sem cotação ficam NaN em vez de manter o valor
+    original: quem grava não deve guardá-los como se fossem BRL.
+    """
+    index = amounts.index if isinstance(amounts, pd.Series) else None
+    # As entradas são alinhadas por posição (np.asarray), nunca pelo índice de uma pd.Series
+    values = pd.Series(np.asarray(amounts, dtype=object)).astype(float)
+    if isinstance(currencies, str):
+        currencies = [currencies] * len(values)
+    currencies = pd.Series(np.asarray(currencies, dtype=object), index=values.index)
+    # Mesma regra de convert_to_brl: usamos a data do próprio datetime
+    days = pd.DatetimeIndex(pd.to_datetime(dates, utc=True))
+    days = pd.Series(days.tz_localize(None).normalize(), index=values.index)
+
+    rates = pd.Series(1.0, index=values.index)
+    for currency_code in currencies.unique():
+        if currency_code == 'BRL':
+            continue
+        mask = (currencies == currency_code).to_numpy()
+        currency_days = days[mask]
+        known_days = currency_days.dropna()
+        if known_days.empty:
+            # Sem nenhuma data válida não há cotação: os valores ficam como estão
+            rates[mask] = np.nan
+            continue
+        series = get_rate_series(
+            currency_code, known_days.min().date(), known_days.max().date(), wait=wait)
+        rates[mask] = series.reindex(currency_days).to_numpy()
+
+    missing = rates.isna() & values.notna()
+    if wait and missing.any():
+        logger.warning(
+            "Sem cotação para %s valor(es) em %s: ficam sem conversão.", int(missing.sum()),
+            ', '.join(sorted(map(str, currencies[missing].unique()))))
+    # Como em convert_to_brl: BRL passa direto e, sem cotação, mantemos o valor
+    # original (com `wait`, fica NaN)
+    keep_original = currencies == 'BRL'
+    if not wait:
+        keep_original |= rates.isna()
+    converted = (values * rates).round(2).mask(keep_original, values)
+
+    if index is None:
+        return converted.to_numpy()
+    return pd.Series(converted.to_numpy(), index=index)
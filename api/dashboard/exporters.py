@@ -0,0 +1,224 @@
+# api/dashboard/exporters.py
+
+import csv
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .currency_converter import convert_many
+from .models import Trade
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_COLUMNS = [
+    'id', 'symbol', 'side', 'status', 'portfolio', 'currency',
+    'fees', 'net_result', 'net_result_brl', 'created_at', 'closed_at',
+    'entry_count', 'entry_quantity', 'avg_entry_price', 'first_entry_date',
+    'close_count', 'close_quantity', 'avg_close_price', 'last_close_date',
+]
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def export_queryset(user):
+    """
+    Trades do utilizador com portfolio via JOIN e pernas em prefetch.
+    Usado com .iterator(chunk_size=...): o prefetch é feito por bloco, então a
+    memória fica limitada ao tamanho do bloco e não ao histórico inteiro.
+    """
+    return Trade.objects.filter(user=user).with_closed_at().select_related(
+        'portfolio').prefetch_related(
+        'entries', 'manual_closes', 'targets', 'stops').order_by('id')
+
+
+def _weighted_average(legs):
+    """Quantidade total e preço médio ponderado de pares (price, quantity, ...)."""
+    quantity = sum(leg[1] for leg in legs)
+    if not quantity:
+        return quantity, None
+    return quantity, sum(price * leg_quantity for price, leg_quantity, *_ in legs) / quantity
+
+
+def _trade_row(trade, net_result_brl):
+    entries = list(trade.entries.all())
+    manual_closes = list(trade.manual_closes.all())
+    targets = list(trade.targets.all())
+    # Saídas executadas, como em accounting.py: fechamentos manuais e alvos com data
+    closes = [(c.price, c.quantity, c.close_date) for c in manual_closes] + [
+        (t.price, t.quantity, t.target_date) for t in targets if t.target_date is not None]
+    entry_quantity, avg_entry_price = _weighted_average(
+        [(e.price, e.quantity) for e in entries])
+    close_quantity, avg_close_price = _weighted_average(closes)
+    return {
+        'id': trade.id,
+        'symbol': trade.symbol,
+        'side': trade.side,
+        'status': trade.status,
+        'portfolio': trade.portfolio.name,
+        'currency': trade.portfolio.currency,
+        'fees': trade.fees,
+        'net_result': trade.net_result,
+        'net_result_brl': net_result_brl,
+        'created_at': trade.created_at,
+        'closed_at': trade.closed_at if trade.status != 'OPEN' else None,
+        'entry_count': len(entries),
+        'entry_quantity': entry_quantity,
+        'avg_entry_price': avg_entry_price,
+        'first_entry_date': min((e.entry_date for e in entries), default=None),
+        'close_count': len(closes),
+        'close_quantity': close_quantity,
+        'avg_close_price': avg_close_price,
+        'last_close_date': max((date for _, _, date in closes), default=None),
+        # Pernas completas, usadas apenas no NDJSON
+        '_entries': entries,
+        '_manual_closes': manual_closes,
+        '_targets': targets,
+        '_stops': list(trade.stops.all()),
+    }
+
+
+def iter_export_chunks(user, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Gera listas de linhas (dicts), um bloco por vez, a partir de um cursor do lado
+    do servidor. A conversão para BRL é vetorizada dentro de cada bloco.
+    """
+    trades = export_queryset(user).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(trades, chunk_size))
+        if not chunk:
+            return
+        converted = convert_many(
+            [trade.net_result for trade in chunk],
+            [trade.portfolio.currency for trade in chunk],
+            [trade.closed_at for trade in chunk],
+        )
+        yield [_trade_row(trade, round(float(value), 2))
+               for trade, value in zip(chunk, converted)]
+
+
+class _Echo:
+    """Pseudo-buffer: o csv.writer escreve e nós devolvemos a linha para o stream."""
+
+    def write(self, value):
+        return value
+
+
+def _isoformat(value):
+    if hasattr(value, 'isoformat'):
+        return timezone.localtime(value).isoformat()
+    return value
+
+
+def stream_csv(chunks):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for rows in chunks:
+        yield ''.join(
+            writer.writerow([_isoformat(row[column]) for column in EXPORT_COLUMNS])
+            for row in rows
+        )
+
+
+def stream_ndjson(chunks):
+    for rows in chunks:
+        lines = []
+        for row in rows:
+            record = {column: row[column] for column in EXPORT_COLUMNS}
+            record['entries'] = [
+                {'price': e.price, 'quantity': e.quantity, 'entry_date': e.entry_date}
+                for e in row['_entries']
+            ]
+            record['manual_closes'] = [
+                {'price': c.price, 'quantity': c.quantity, 'close_date': c.close_date}
+                for c in row['_manual_closes']
+            ]
+            record['targets'] = [
+                {'price': t.price, 'quantity': t.quantity, 'target_date': t.target_date}
+                for t in row['_targets']
+            ]
+            record['stops'] = [
+                {'price': s.price, 'stop_date': s.stop_date} for s in row['_stops']
+            ]
+            lines.append(json.dumps(record, cls=DjangoJSONEncoder))
+        yield '\n'.join(lines) + '\n'
+
+
+class _ParquetSink:
+    """Destino em memória que é esvaziado a cada row group enviado ao cliente."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.closed = False
+
+    def write(self, data):
+        self.buffer.extend(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def stream_parquet(chunks):
+    """Escreve um row group por bloco. Requer o pacote opcional pyarrow."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    money = pa.float64()
+    timestamp = pa.timestamp('us', tz='UTC')
+    schema = pa.schema([
+        ('id', pa.int64()), ('symbol', pa.string()), ('side', pa.string()),
+        ('status', pa.string()), ('portfolio', pa.string()), ('currency', pa.string()),
+        ('fees', money), ('net_result', money), ('net_result_brl', money),
+        ('created_at', timestamp), ('closed_at', timestamp),
+        ('entry_count', pa.int32()), ('entry_quantity', money),
+        ('avg_entry_price', money), ('first_entry_date', timestamp),
+        ('close_count', pa.int32()), ('close_quantity', money),
+        ('avg_close_price', money), ('last_close_date', timestamp),
+    ])
+
+    def column_value(value, field_type):
+        if value is not None and field_type == money:
+            return float(value)
+        return value
+
+    sink = _ParquetSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for rows in chunks:
+        table = pa.table({
+            field.name: pa.array([column_value(row[field.name], field.type) for row in rows],
+                                 type=field.type)
+            for field in schema
+        }, schema=schema)
+        writer.write_table(table)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+STREAM_WRITERS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+    'parquet': stream_parquet,
+}
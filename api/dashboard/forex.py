@@ -0,0 +1,139 @@
+# api/dashboard/forex.py
+
+import math
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .currency_converter import FALLBACK_DAYS, PTAX_CURRENCIES
+from .models import ExchangeRate
+
+# Matrizes por dia, por processo. A do dia corrente é refeita após MATRIX_TTL
+# segundos, pois a PTAX do dia só é publicada à tarde.
+RATE_MATRICES = {}
+MATRIX_TTL = 3600
+
+STANDARD_LOT = 100_000
+LOT_STEP = 0.01
+
+
+class RateMatrix:
+    """
+    Câmbio cruzado de todas as moedas com PTAX num dia: `matrix[i, j]` é o valor
+    de 1 unidade da moeda i na moeda j. As PTAX são cotadas em BRL, então todo
+    par é triangulado por BRL: (i/BRL) / (j/BRL).
+    """
+
+    def __init__(self, day, brl_rates):
+        self.day = day
+        self.currencies = ['BRL', *sorted(brl_rates)]
+        self.index = {code: position for position, code in enumerate(self.currencies)}
+        in_brl = np.array([1.0, *(brl_rates[code] for code in self.currencies[1:])])
+        self.matrix = in_brl[:, None] / in_brl[None, :]
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def from_database(cls, day):
+        """Uma query: a última PTAX até `day` (dentro de FALLBACK_DAYS) de cada moeda."""
+        rows = ExchangeRate.objects.filter(
+            currency__in=PTAX_CURRENCIES, date__lte=day,
+            date__gt=day - timedelta(days=FALLBACK_DAYS),
+        ).order_by('currency', 'date').values_list('currency', 'rate')
+        # Ordenado por data: o último valor de cada moeda prevalece
+        return cls(day, {currency: float(rate) for currency, rate in rows})
+
+    def rate(self, base, quote):
+        return float(self.matrix[self.index[base], self.index[quote]])
+
+    def as_dict(self):
+        return {
+            'date': self.day.isoformat(),
+            'currencies': self.currencies,
+            'matrix': np.round(self.matrix, 6).tolist(),
+        }
+
+
+def rate_matrix(day=None):
+    """Matriz do dia (padrão: hoje), montada uma vez e servida da memória do processo."""
+    today = timezone.localdate()
+    day = day or today
+    matrix = RATE_MATRICES.get(day)
+    if matrix is None or (day >= today and time.monotonic() - matrix.built_at > MATRIX_TTL):
+        matrix = RATE_MATRICES[day] = RateMatrix.from_database(day)
+    return matrix
+
+
+class ForexInputError(ValueError):
+    pass
+
+
+def pip_size(quote):
+    return 0.01 if quote == 'JPY' else 0.0001
+
+
+def position_sizes(matrix, items, account_currency='BRL'):
+    """
+    Tamanho de posição, valor do pip e risco para vários pares de uma vez.
+    Cada item tem `symbol` (ex.: EURUSD), `stop_pips` e `risk_amount` (na moeda da
+    conta) ou `risk_percent` + `balance`. Os itens válidos são calculados juntos,
+    com arrays; os inválidos voltam com `error`.
+    """
+    if account_currency not in matrix.index:
+        raise ForexInputError(f"Moeda da conta sem cotação: {account_currency}.")
+
+    results, valid = [], []
+    quote_index, stops, risks, pips = [], [], [], []
+    for item in items:
+        symbol = str(item.get('symbol', '')).upper().replace('/', '')
+        result = {'symbol': symbol}
+        results.append(result)
+        try:
+            base, quote = symbol[:3], symbol[3:]
+            if len(symbol) != 6 or base not in matrix.index or quote not in matrix.index:
+                raise ForexInputError(f"Par sem cotação: {symbol or '?'}.")
+            stop = float(item['stop_pips'])
+            if 'risk_amount' in item:
+                risk = float(item['risk_amount'])
+            else:
+                risk = float(item['balance']) * float(item['risk_percent']) / 100
+            if not (math.isfinite(stop) and math.isfinite(risk)):
+                raise ForexInputError("'stop_pips' e o risco devem ser números finitos.")
+            if stop <= 0 or risk <= 0:
+                raise ForexInputError("'stop_pips' e o risco devem ser positivos.")
+        except KeyError as e:
+            result['error'] = f"Campo obrigatório: {e.args[0]}."
+            continue
+        except ForexInputError as e:
+            result['error'] = str(e)
+            continue
+        except (TypeError, ValueError):
+            result['error'] = 'Valor numérico inválido.'
+            continue
+        valid.append(result)
+        quote_index.append(matrix.index[quote])
+        stops.append(stop)
+        risks.append(risk)
+        pips.append(pip_size(quote))
+
+    if valid:
+        # Valor de 1 pip por lote padrão, convertido da moeda de cotação para a da conta
+        to_account = matrix.matrix[np.array(quote_index), matrix.index[account_currency]]
+        pip_value = np.array(pips) * STANDARD_LOT * to_account
+        stops, risks = np.array(stops), np.array(risks)
+        with np.errstate(over='ignore', divide='ignore', invalid='ignore'):
+            lots = np.floor(risks / (stops * pip_value) / LOT_STEP) * LOT_STEP
+            risk_amount = lots * stops * pip_value
+        for position, result in enumerate(valid):
+            if not np.isfinite(risk_amount[position]):
+                # Stop ínfimo ou risco enorme: o tamanho não cabe num float
+                result['error'] = 'Posição fora do limite para o stop e o risco pedidos.'
+                continue
+            result.update({
+                'pip_value': round(float(pip_value[position]), 4),
+                'lots': round(float(lots[position]), 2),
+                'units': int(round(lots[position] * STANDARD_LOT)),
+                'risk_amount': round(float(risk_amount[position]), 2),
+            })
+    return results
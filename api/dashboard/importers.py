@@ -0,0 +1,284 @@
+# api/dashboard/importers.py
+
+import csv
+import hashlib
+import io
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .accounting import update_trade_analytics
+from .ledger import sync_trades
+from .models import Trade, TradeEntry, TradeManualClose, TradeStop, TradeTarget
+from .rollups import rebuild_daily_pnl
+from .tax import reset_tax_months
+
+IMPORT_BATCH_SIZE = 1000
+
+# Formato canônico do extrato: uma linha por trade
+IMPORT_COLUMNS = [
+    'symbol', 'side', 'entry_date', 'entry_price', 'quantity',
+    'exit_date', 'exit_price', 'exit_type', 'stop_price', 'fees', 'net_result',
+]
+REQUIRED_COLUMNS = {'symbol', 'side', 'entry_date', 'entry_price', 'quantity'}
+# Campo do modelo onde cada coluna numérica é gravada: define o tamanho aceito
+DECIMAL_FIELDS = {
+    'entry_price': (TradeEntry, 'price'), 'quantity': (TradeEntry, 'quantity'),
+    'exit_price': (TradeManualClose, 'price'), 'stop_price': (TradeStop, 'price'),
+    'fees': (Trade, 'fees'), 'net_result': (Trade, 'net_result'),
+}
+
+SIDES = {'BUY': 'BUY', 'C': 'BUY', 'COMPRA': 'BUY',
+         'SELL': 'SELL', 'V': 'SELL', 'VENDA': 'SELL'}
+EXIT_STATUS = {'target': 'CLOSED_TARGET',
+               'stop': 'CLOSED_STOP', 'manual': 'CLOSED_MANUAL'}
+DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+                '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y')
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    skipped: int = 0
+    errors: list = field(default_factory=list)
+
+    def as_dict(self):
+        return {'created': self.created, 'skipped': self.skipped, 'errors': self.errors}
+
+
+# --- Leitura em streaming ---
+
+
+def read_csv_rows(binary_file, encoding='utf-8-sig'):
+    """Lê o CSV linha a linha, sem carregar o ficheiro inteiro. Aceita ',' ou ';'."""
+    text = io.TextIOWrapper(binary_file, encoding=encoding, newline='')
+    sample = text.readline()
+    delimiter = ';' if sample.count(';') > sample.count(',') else ','
+    header = next(csv.reader([sample], delimiter=delimiter))
+    reader = csv.reader(text, delimiter=delimiter)
+    columns = [name.strip().lower() for name in header]
+    for values in reader:
+        yield dict(zip(columns, values))
+
+
+def read_excel_rows(binary_file):
+    """Lê a primeira folha em modo read_only. Requer o pacote opcional openpyxl."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(binary_file, read_only=True, data_only=True)
+    rows = workbook.worksheets[0].iter_rows(values_only=True)
+    columns = [str(name or '').strip().lower() for name in next(rows, ())]
+    for values in rows:
+        yield dict(zip(columns, values))
+    workbook.close()
+
+
+def read_rows(binary_file, filename):
+    if filename.lower().endswith(('.xlsx', '.xlsm')):
+        return read_excel_rows(binary_file)
+    return read_csv_rows(binary_file)
+
+
+# --- Validação ---
+
+
+def _check_size(number, name):
+    """Recusa valores que não cabem no DecimalField de destino (ver DECIMAL_FIELDS)."""
+    model, field_name = DECIMAL_FIELDS[name]
+    field = model._meta.get_field(field_name)
+    if abs(number) >= Decimal(10) ** (field.max_digits - field.decimal_places):
+        raise ImportRowError(f"'{name}' fora do limite: {number}.")
+    return number
+
+
+def _decimal(value, name, required=False):
+    if value is None or str(value).strip() == '':
+        if required:
+            raise ImportRowError(f"'{name}' é obrigatório.")
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        number = Decimal(str(value))
+    else:
+        text = str(value).strip()
+        if ',' in text:
+            # Formato brasileiro: 1.234,56
+            text = text.replace('.', '').replace(',', '.')
+        try:
+            number = Decimal(text)
+        except InvalidOperation:
+            raise ImportRowError(f"'{name}' inválido: {value!r}.")
+    # Decimal aceita 'nan' e 'inf', que nenhuma comparação ou campo do banco aceita
+    if not number.is_finite():
+        raise ImportRowError(f"'{name}' inválido: {value!r}.")
+    return _check_size(number, name)
+
+
+def _datetime(value, name, required=False):
+    if value is None or str(value).strip() == '':
+        if required:
+            raise ImportRowError(f"'{name}' é obrigatório.")
+        return None
+    if not isinstance(value, datetime):
+        text = str(value).strip()
+        for date_format in DATE_FORMATS:
+            try:
+                value = datetime.strptime(text, date_format)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ImportRowError(f"'{name}' inválido: {text!r}.")
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def parse_row(row):
+    """Valida e normaliza uma linha do extrato. Levanta ImportRowError."""
+    missing = [name for name in REQUIRED_COLUMNS if not str(
+        row.get(name) or '').strip()]
+    if missing:
+        raise ImportRowError(
+            f"Colunas obrigatórias vazias: {', '.join(sorted(missing))}.")
+
+    side = SIDES.get(str(row['side']).strip().upper())
+    if side is None:
+        raise ImportRowError(f"'side' inválido: {row['side']!r}.")
+
+    cleaned = {
+        'symbol': str(row['symbol']).strip().upper(),
+        'side': side,
+        'entry_date': _datetime(row['entry_date'], 'entry_date', required=True),
+        'entry_price': _decimal(row['entry_price'], 'entry_price', required=True),
+        'quantity': _decimal(row['quantity'], 'quantity', required=True),
+        'exit_date': _datetime(row.get('exit_date'), 'exit_date'),
+        'exit_price': _decimal(row.get('exit_price'), 'exit_price'),
+        'stop_price': _decimal(row.get('stop_price'), 'stop_price'),
+        'fees': _decimal(row.get('fees'), 'fees') or Decimal('0'),
+        'net_result': _decimal(row.get('net_result'), 'net_result'),
+    }
+    if cleaned['quantity'] <= 0:
+        raise ImportRowError("'quantity' deve ser positiva.")
+
+    exit_type = str(row.get('exit_type') or 'manual').strip().lower()
+    if exit_type not in EXIT_STATUS:
+        raise ImportRowError(f"'exit_type' inválido: {exit_type!r}.")
+    cleaned['exit_type'] = exit_type
+
+    if cleaned['exit_price'] is not None:
+        cleaned['exit_date'] = cleaned['exit_date'] or cleaned['entry_date']
+        cleaned['status'] = EXIT_STATUS[exit_type]
+        if cleaned['net_result'] is None:
+            direction = 1 if side == 'BUY' else -1
+            gross = (cleaned['exit_price'] - cleaned['entry_price']) * \
+                cleaned['quantity'] * direction
+            cleaned['net_result'] = gross - cleaned['fees']
+    else:
+        cleaned['status'] = 'OPEN'
+    cleaned['net_result'] = _check_size((cleaned['net_result'] or Decimal(
+        '0')).quantize(Decimal('0.01')), 'net_result')
+    return cleaned
+
+
+def natural_key(portfolio_id, cleaned):
+    """Hash estável da linha: a mesma operação reimportada gera o mesmo hash."""
+    parts = [
+        str(portfolio_id), cleaned['symbol'], cleaned['side'],
+        cleaned['entry_date'].isoformat(), str(
+            cleaned['entry_price'].normalize()),
+        str(cleaned['quantity'].normalize()),
+        cleaned['exit_date'].isoformat() if cleaned['exit_date'] else '',
+        str(cleaned['exit_price'].normalize()
+            ) if cleaned['exit_price'] is not None else '',
+    ]
+    return hashlib.sha256('|'.join(parts).encode()).hexdigest()
+
+
+# --- Escrita em lote ---
+
+
+def _write_batch(user, portfolio, batch, result):
+    """Grava um bloco: um bulk_create por tabela, numa única transação."""
+    hashes = {natural_key(portfolio.pk, cleaned): cleaned for cleaned in batch}
+    existing = set(Trade.objects.filter(user=user, import_hash__in=list(hashes)).values_list(
+        'import_hash', flat=True))
+    result.skipped += len(batch) - len(hashes) + len(existing)
+    new_rows = [(key, cleaned)
+                for key, cleaned in hashes.items() if key not in existing]
+    if not new_rows:
+        return
+
+    with transaction.atomic():
+        trades = Trade.objects.bulk_create([
+            Trade(user=user, portfolio=portfolio, symbol=cleaned['symbol'],
+                  side=cleaned['side'], fees=cleaned['fees'],
+                  net_result=cleaned['net_result'], status=cleaned['status'],
+                  import_hash=key)
+            for key, cleaned in new_rows
+        ])
+
+        entries, stops, targets, closes = [], [], [], []
+        for trade, (_, cleaned) in zip(trades, new_rows):
+            entries.append(TradeEntry(trade=trade, price=cleaned['entry_price'],
+                                      quantity=cleaned['quantity'], entry_date=cleaned['entry_date']))
+            if cleaned['stop_price'] is not None:
+                stops.append(TradeStop(trade=trade, price=cleaned['stop_price']))
+            if cleaned['exit_price'] is None:
+                continue
+            if cleaned['exit_type'] == 'target':
+                targets.append(TradeTarget(trade=trade, price=cleaned['exit_price'],
+                                           quantity=cleaned['quantity'], target_date=cleaned['exit_date']))
+            else:
+                closes.append(TradeManualClose(trade=trade, price=cleaned['exit_price'],
+                                               quantity=cleaned['quantity'], close_date=cleaned['exit_date']))
+
+        TradeEntry.objects.bulk_create(entries)
+        TradeStop.objects.bulk_create(stops)
+        TradeTarget.objects.bulk_create(targets)
+        TradeManualClose.objects.bulk_create(closes)
+        # Preços médios, resultado, R e duração vêm das pernas, antes do livro-razão
+        update_trade_analytics(
+            [(trade.pk, trade.side, trade.fees, trade.net_result) for trade in trades])
+        sync_trades([trade.pk for trade in trades])
+    result.created += len(new_rows)
+
+
+def import_trades(user, portfolio, rows, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Importa as linhas (dicts) para o portfolio, validando e gravando em blocos.
+    Linhas inválidas são reportadas com o número da linha e não interrompem a importação;
+    linhas já importadas (mesma chave natural) são ignoradas.
+    Cada bloco é gravado na sua própria transação: se a leitura do ficheiro falhar a
+    meio (UnicodeDecodeError, csv.Error), os blocos anteriores ficam gravados, e uma
+    nova importação do mesmo ficheiro corrigido só acrescenta o resto.
+    """
+    result = ImportResult()
+    batch = []
+    try:
+        # A linha 1 é o cabeçalho
+        for line_number, row in enumerate(rows, start=2):
+            try:
+                batch.append(parse_row(row))
+            except ImportRowError as e:
+                result.errors.append({'line': line_number, 'error': str(e)})
+                continue
+            if len(batch) >= batch_size:
+                _write_batch(user, portfolio, batch, result)
+                batch = []
+        if batch:
+            _write_batch(user, portfolio, batch, result)
+    finally:
+        # bulk_create não dispara sinais: o DailyPnL é reconstruído numa só passada
+        # (o que também invalida os analytics) e a apuração de IR é descartada
+        # (trades novos podem cair em meses já fechados), mesmo que a leitura falhe
+        if result.created:
+            rebuild_daily_pnl(user)
+            reset_tax_months(user)
+    return result
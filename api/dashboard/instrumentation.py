@@ -0,0 +1,187 @@
+# api/dashboard/instrumentation.py
+
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_profile = ContextVar('request_profile', default=None)
+
+# Ordem das fases no cabeçalho Server-Timing
+PHASES = ('sql', 'fx', 'pandas', 'serialize')
+
+
+class RequestProfile:
+    """Tempos e queries de um request amostrado (ver RequestInstrumentationMiddleware)."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = Counter()
+        self.active = set()
+        self.queries = 0
+        self.statements = Counter()
+        self.slow_queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: todas as queries do request passam por aqui
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.timings['sql'] += duration
+            # O SQL vem com os placeholders: queries repetidas com outros parâmetros
+            # (o padrão N+1) têm o mesmo texto
+            self.statements[sql] += 1
+            if duration * 1000 >= settings.INSTRUMENTATION_SLOW_QUERY_MS:
+                self.slow_queries.append({'sql': sql[:500], 'ms': round(duration * 1000, 1)})
+
+    def repeated_queries(self):
+        threshold = settings.INSTRUMENTATION_REPEATED_QUERY_THRESHOLD
+        return [{'sql': sql[:500], 'count': count}
+                for sql, count in self.statements.most_common() if count >= threshold]
+
+    def server_timing(self, total):
+        metrics = [f'{name};dur={self.timings[name] * 1000:.1f}'
+                   for name in PHASES if name in self.timings]
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+def current_profile():
+    """Perfil do request em curso, ou None quando o request não foi amostrado."""
+    return _profile.get()
+
+
+@contextmanager
+def _measure(profile, name):
+    if name in profile.active:
+        # Blocos aninhados da mesma fase só contam uma vez
+        yield
+        return
+    profile.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.timings[name] += time.perf_counter() - started
+        profile.active.discard(name)
+
+
+class timed:
+    """
+    Soma o tempo do bloco à fase `name` do request em curso. Também serve como
+    decorador (@timed('pandas')). Fora de um request amostrado o custo é só o de
+    ler o ContextVar: nenhum gerador ou contexto é criado.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.block = None
+
+    def __enter__(self):
+        profile = _profile.get()
+        if profile is not None:
+            self.block = _measure(profile, self.name)
+            self.block.__enter__()
+
+    def __exit__(self, *exc_info):
+        if self.block is not None:
+            return self.block.__exit__(*exc_info)
+
+    def __call__(self, function):
+        name = self.name
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = _profile.get()
+            if profile is None:
+                return function(*args, **kwargs)
+            with _measure(profile, name):
+                return function(*args, **kwargs)
+        return wrapper
+
+
+@contextmanager
+def _profiling(profile):
+    # Ativa o perfil e conta as queries de todas as conexões dentro do bloco
+    token = _profile.set(profile)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            yield
+    finally:
+        _profile.reset(token)
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Mede uma amostra dos requests (INSTRUMENTATION_SAMPLE_RATE): quantidade e tempo
+    das queries, tempo em câmbio, pandas e serialização. Devolve o cabeçalho
+    Server-Timing, escreve uma linha JSON no log `dashboard.instrumentation` e
+    avisa de queries lentas e de queries idênticas repetidas (N+1).
+    O corpo de um StreamingHttpResponse (síncrono) só é gerado depois de o
+    middleware devolver a resposta: as queries dele também são contadas, mas só
+    entram na linha de log, escrita no fim do corpo; o Server-Timing, enviado
+    antes, cobre apenas até o início do streaming.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.INSTRUMENTATION_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        with _profiling(profile):
+            response = self.get_response(request)
+
+        total = time.perf_counter() - profile.started
+        response['Server-Timing'] = profile.server_timing(total)
+        if response.streaming and not response.is_async:
+            response.streaming_content = self.stream(
+                request, response, profile, response.streaming_content)
+        else:
+            self.report(request, response, profile, total)
+        return response
+
+    def stream(self, request, response, profile, content):
+        """Gera o corpo com o perfil ativo a cada pedaço e escreve o log no fim."""
+        chunks = iter(content)
+        while True:
+            with _profiling(profile):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+        self.report(request, response, profile, time.perf_counter() - profile.started)
+
+    def report(self, request, response, profile, total):
+        repeated = profile.repeated_queries()
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'queries': profile.queries,
+            **{f'{name}_ms': round(profile.timings[name] * 1000, 1) for name in PHASES},
+            'slow_queries': len(profile.slow_queries),
+            'repeated_queries': len(repeated),
+        }))
+        for query in profile.slow_queries:
+            logger.warning('Query lenta (%s ms) em %s: %s', query['ms'], request.path, query['sql'])
+        for query in repeated:
+            logger.warning('Possível N+1 em %s: %s execuções de %s',
+                           request.path, query['count'], query['sql'])
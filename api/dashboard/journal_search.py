@@ -0,0 +1,99 @@
+# api/dashboard/journal_search.py
+
+import re
+
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+from .models import JournalNote
+
+# Dicionário do Postgres usado no índice (migração 0010): stemming em português
+SEARCH_CONFIG = 'portuguese'
+SQLITE_INDEX = 'dashboard_journalnote_fts'
+HIGHLIGHT_START, HIGHLIGHT_STOP = '<mark>', '</mark>'
+MAX_RESULTS = 100
+
+WORD = re.compile(r'\w+')
+
+
+def _postgres_matches(notes, query, limit):
+    from django.contrib.postgres.search import (
+        SearchHeadline, SearchQuery, SearchRank, SearchVectorField,
+    )
+
+    search = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    vector = RawSQL('"dashboard_journalnote"."search_vector"', [],
+                    output_field=SearchVectorField())
+    # O destaque só é calculado para as linhas que sobram depois do LIMIT
+    return list(notes.alias(search_vector=vector).filter(search_vector=search).annotate(
+        rank=SearchRank(vector, search),
+        headline=SearchHeadline('notes', search, config=SEARCH_CONFIG,
+                                start_sel=HIGHLIGHT_START, stop_sel=HIGHLIGHT_STOP,
+                                max_fragments=2),
+    ).order_by('-rank', '-created_at').values_list('id', 'rank', 'headline')[:limit])
+
+
+def _sqlite_query(query):
+    """Texto livre -> consulta FTS5: todas as palavras, cada uma como prefixo."""
+    return ' AND '.join(f'"{word}"*' for word in WORD.findall(query))
+
+
+def _sqlite_matches(notes, query, limit):
+    match = _sqlite_query(query)
+    if not match:
+        return []
+    candidates, params = notes.values('id').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, -bm25({SQLITE_INDEX}), "
+            f"snippet({SQLITE_INDEX}, 0, %s, %s, '…', 32) FROM {SQLITE_INDEX} "
+            f"WHERE {SQLITE_INDEX} MATCH %s AND rowid IN ({candidates}) "
+            f"ORDER BY bm25({SQLITE_INDEX}) LIMIT %s",
+            [HIGHLIGHT_START, HIGHLIGHT_STOP, match, *params, limit])
+        return cursor.fetchall()
+
+
+def _fallback_matches(notes, query, limit):
+    # Outros bancos: sem índice de texto, só filtra (sem ranking nem destaque)
+    words = Q()
+    for word in WORD.findall(query):
+        words &= Q(notes__icontains=word)
+    return [(pk, 0.0, notes_text) for pk, notes_text in
+            notes.filter(words).order_by('-created_at').values_list('id', 'notes')[:limit]]
+
+
+BACKENDS = {'postgresql': _postgres_matches, 'sqlite': _sqlite_matches}
+
+
+def search_notes(user, query, strategy=None, confidence_min=None, confidence_max=None,
+                 date_from=None, date_to=None, limit=20):
+    """
+    Busca de texto completo nas notas do utilizador, da mais relevante para a menos.
+    Os filtros (estratégia, confiança, datas de criação) entram na mesma query que o
+    índice (GIN no Postgres, FTS5 no SQLite). Devolve dicts com `rank` e `headline`
+    (trechos com os termos entre <mark></mark>).
+    """
+    notes = JournalNote.objects.filter(user=user)
+    if strategy is not None:
+        notes = notes.filter(strategy=strategy)
+    if confidence_min is not None:
+        notes = notes.filter(confidence_level__gte=confidence_min)
+    if confidence_max is not None:
+        notes = notes.filter(confidence_level__lte=confidence_max)
+    if date_from is not None:
+        notes = notes.filter(created_at__date__gte=date_from)
+    if date_to is not None:
+        notes = notes.filter(created_at__date__lte=date_to)
+
+    backend = BACKENDS.get(connection.vendor, _fallback_matches)
+    matches = backend(notes, query, min(limit, MAX_RESULTS))
+    if not matches:
+        return []
+
+    details = {row['id']: row for row in JournalNote.objects.filter(
+        pk__in=[pk for pk, _, _ in matches]).values(
+        'id', 'trade', 'strategy', 'confidence_level', 'created_at',
+        symbol=F('trade__symbol'), strategy_name=F('strategy__name'))}
+    return [{**details[pk], 'rank': round(float(rank), 6), 'headline': headline}
+            for pk, rank, headline in matches]
@@ -0,0 +1,166 @@
+# api/dashboard/ledger.py
+
+from collections import defaultdict
+from decimal import Decimal
+
+import pandas as pd
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import BalanceLedgerEntry, BalanceSnapshot, Portfolio, PortfolioTransaction, Trade
+
+ZERO = Decimal('0.00')
+
+
+def post_entries(kind, postings):
+    """
+    Aplica lançamentos (portfolio_id, amount, date, source_id): um UPDATE atômico
+    com F() por portfolio e um bulk_create. Custo independente do histórico.
+    """
+    if not postings:
+        return
+    by_portfolio = defaultdict(list)
+    for posting in postings:
+        by_portfolio[posting[0]].append(posting)
+
+    entries = []
+    with transaction.atomic():
+        for portfolio_id, items in by_portfolio.items():
+            total = sum(amount for _, amount, _, _ in items)
+            Portfolio.objects.filter(pk=portfolio_id).update(
+                balance=F('balance') + total)
+            running = Portfolio.objects.filter(pk=portfolio_id).values_list(
+                'balance', flat=True).get() - total
+            for _, amount, date, source_id in items:
+                running += amount
+                entries.append(BalanceLedgerEntry(
+                    portfolio_id=portfolio_id, kind=kind, source_id=source_id,
+                    date=date, amount=amount, balance_after=running))
+            # Lançamento retroativo: checkpoints a partir desta data deixam de valer
+            BalanceSnapshot.objects.filter(
+                portfolio_id=portfolio_id, date__gte=min(date for _, _, date, _ in items)).delete()
+        BalanceLedgerEntry.objects.bulk_create(entries)
+
+
+def sync_sources(kind, source_ids, targets):
+    """
+    Acerta os lançamentos das origens (trades ou transações) para que cada uma some
+    o valor de `targets[source_id] = (portfolio_id, amount, date)`; origens fora de
+    `targets` devem somar zero. Só grava a diferença em relação ao que já foi
+    lançado e, se a data mudou, estorna o valor lançado na data antiga.
+    """
+    posted = BalanceLedgerEntry.objects.filter(kind=kind, source_id__in=source_ids).values(
+        'source_id', 'portfolio_id', 'date').annotate(total=Sum('amount'))
+
+    postings = []
+    posted_at_target = defaultdict(lambda: ZERO)
+    for row in posted:
+        if not row['total']:
+            continue
+        target = targets.get(row['source_id'])
+        if target is not None and (row['portfolio_id'], row['date']) == (target[0], target[2]):
+            posted_at_target[row['source_id']] += row['total']
+        else:
+            postings.append((row['portfolio_id'], -row['total'],
+                            row['date'], row['source_id']))
+
+    for source_id, (portfolio_id, amount, date) in targets.items():
+        delta = amount - posted_at_target[source_id]
+        if delta:
+            postings.append((portfolio_id, delta, date, source_id))
+    post_entries(kind, postings)
+
+
+def sync_transaction(transaction_id):
+    """Lança (ou estorna) um depósito/saque conforme o estado atual da transação."""
+    movement = PortfolioTransaction.objects.filter(pk=transaction_id).first()
+    for kind in ('DEPOSIT', 'WITHDRAWAL'):
+        targets = {}
+        if movement is not None and movement.type == kind:
+            amount = movement.value if kind == 'DEPOSIT' else -movement.value
+            targets[transaction_id] = (
+                movement.portfolio_id, amount, movement.date)
+        sync_sources(kind, [transaction_id], targets)
+
+
+def sync_trades(trade_ids, chunk_size=500):
+    """
+    Lança o net_result dos trades fechados na data de fechamento e estorna o dos
+    reabertos ou apagados. Algumas queries por bloco, não por trade.
+    """
+    trade_ids = list(trade_ids)
+    for start in range(0, len(trade_ids), chunk_size):
+        chunk = trade_ids[start:start + chunk_size]
+        rows = Trade.objects.closed().filter(pk__in=chunk).with_closed_at().values_list(
+            'id', 'portfolio_id', 'net_result', 'closed_at')
+        targets = {trade_id: (portfolio_id, net_result, closed_at)
+                   for trade_id, portfolio_id, net_result, closed_at in rows}
+        sync_sources('TRADE', chunk, targets)
+
+
+def open_ledger(portfolio):
+    """
+    Lançamento de abertura com o saldo informado na criação do portfolio (sem alterar
+    o saldo). Vale como base para qualquer data: trades podem ser lançados retroativamente.
+    """
+    BalanceLedgerEntry.objects.create(
+        portfolio=portfolio, kind='OPENING', date=portfolio.created_at,
+        amount=portfolio.balance, balance_after=portfolio.balance)
+
+
+# --- Consultas ---
+
+
+def balance_as_of(portfolio, when):
+    """Saldo em `when`: checkpoint mais próximo anterior + soma da cauda de lançamentos."""
+    entries = BalanceLedgerEntry.objects.filter(portfolio=portfolio)
+    tail = entries.exclude(kind='OPENING').filter(date__lte=when)
+    snapshot = BalanceSnapshot.objects.filter(
+        portfolio=portfolio, date__lte=when).order_by('-date').first()
+    if snapshot is not None:
+        base = snapshot.balance
+        tail = tail.filter(date__gt=snapshot.date)
+    else:
+        base = entries.filter(kind='OPENING').aggregate(
+            total=Sum('amount'))['total'] or ZERO
+    return base + (tail.aggregate(total=Sum('amount'))['total'] or ZERO)
+
+
+def balance_history(portfolio, start, end):
+    """
+    Saldo no fim de cada dia entre `start` e `end` (datas), como pd.Series.
+    Uma consulta de saldo inicial e uma leitura dos lançamentos do período.
+    """
+    tz = timezone.get_current_timezone()
+    start_at = timezone.make_aware(pd.Timestamp(start).to_pydatetime(), tz)
+    end_at = timezone.make_aware(
+        (pd.Timestamp(end) + pd.Timedelta(days=1)).to_pydatetime(), tz)
+
+    opening = float(balance_as_of(
+        portfolio, start_at - pd.Timedelta(microseconds=1)))
+    rows = BalanceLedgerEntry.objects.filter(
+        portfolio=portfolio, date__gte=start_at, date__lt=end_at).exclude(
+        kind='OPENING').values_list('date', 'amount')
+    entries = pd.DataFrame.from_records(rows, columns=['date', 'amount'])
+    days = pd.date_range(start, end, freq='D')
+    if entries.empty:
+        return pd.Series(opening, index=days)
+
+    local_days = pd.to_datetime(entries['date'], utc=True).dt.tz_convert(
+        timezone.get_current_timezone_name()).dt.tz_localize(None).dt.normalize()
+    daily = entries['amount'].astype(float).groupby(local_days).sum()
+    return opening + daily.reindex(days, fill_value=0.0).cumsum()
+
+
+def checkpoint_balances(portfolios=None, when=None):
+    """
+    Grava um BalanceSnapshot por portfolio em `when` (padrão: agora), partindo do
+    checkpoint anterior. Pensado para rodar periodicamente (ver checkpoint_balances).
+    """
+    when = when or timezone.now()
+    portfolios = portfolios if portfolios is not None else Portfolio.objects.all()
+    snapshots = [BalanceSnapshot(portfolio=portfolio, date=when, balance=balance_as_of(portfolio, when))
+                 for portfolio in portfolios]
+    BalanceSnapshot.objects.bulk_create(snapshots)
+    return len(snapshots)
@@ -0,0 +1,51 @@
+# api/dashboard/management/commands/benchmark_endpoints.py
+
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.benchmarks import CASES, compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede latência, queries e pico de memória dos endpoints e funções quentes para "
+        "um utilizador (ver generate_synthetic_data). Com --baseline, falha se houver "
+        "regressão em relação a uma execução anterior gravada com --output."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', default='bench-0')
+        parser.add_argument('--case', action='append', choices=sorted(CASES), dest='cases',
+                            help='Caso a medir (repetível; padrão: todos).')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--warm', action='store_true',
+                            help='Mede com o cache de analytics preenchido.')
+        parser.add_argument('--output', help='Grava o resultado em JSON.')
+        parser.add_argument('--baseline', help='JSON de uma execução anterior para comparar.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Folga relativa de tempo e memória (padrão: 0.25).')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"Utilizador '{options['username']}' não encontrado.")
+
+        report = run_benchmarks(user, options['cases'], options['repeat'], options['warm'])
+        self.stdout.write(f"{report['user']}: {report['trades']} trades")
+        self.stdout.write(f"{'caso':<20}{'mediana ms':>12}{'mín ms':>10}{'queries':>9}{'pico KiB':>11}")
+        for name, result in report['results'].items():
+            self.stdout.write(
+                f"{name:<20}{result['median_ms']:>12}{result['min_ms']:>10}"
+                f"{result['queries']:>9}{result['peak_kib']:>11}")
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                regressions = compare(report, json.load(baseline), options['tolerance'])
+            if regressions:
+                raise CommandError('Regressões:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('Sem regressões em relação à linha de base.'))
@@ -0,0 +1,84 @@
+# api/dashboard/management/commands/benchmark_http.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+def latency_summary(latencies, elapsed, errors=0):
+    """p50/p99 (ms) e vazão (pedidos/s) de uma rodada de carga."""
+    latencies = np.asarray(latencies, dtype=float) * 1000
+    if latencies.size == 0:
+        return {'requests': 0, 'errors': errors, 'p50': 0.0, 'p99': 0.0, 'throughput': 0.0}
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return {
+        'requests': int(latencies.size), 'errors': errors,
+        'p50': round(float(p50), 1), 'p99': round(float(p99), 1),
+        'throughput': round(latencies.size / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Carga HTTP com N utilizadores simultâneos contra uma ou mais URLs e relatório de "
+        "p50/p99 e vazão. Para comparar WSGI e ASGI, suba o mesmo projeto nos dois "
+        "servidores (ex.: gunicorn config.wsgi -w 4 -b :8000 e "
+        "uvicorn config.asgi:application --workers 4 --port 8001) e passe as duas URLs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+')
+        parser.add_argument('--username', required=True,
+                            help='Utilizador (já com dados) em nome do qual os pedidos são feitos.')
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--requests', type=int, default=20,
+                            help='Pedidos por utilizador simultâneo.')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def run(self, url, headers, users, per_user, timeout):
+        latencies, errors = [], [0]
+        lock = threading.Lock()
+
+        def worker():
+            session = requests.Session()
+            for _ in range(per_user):
+                started = time.perf_counter()
+                try:
+                    ok = session.get(url, headers=headers, timeout=timeout).ok
+                except requests.exceptions.RequestException:
+                    ok = False
+                duration = time.perf_counter() - started
+                with lock:
+                    if ok:
+                        latencies.append(duration)
+                    else:
+                        errors[0] += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=users) as pool:
+            for _ in range(users):
+                pool.submit(worker)
+        return latency_summary(latencies, time.perf_counter() - started, errors[0])
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"Utilizador '{options['username']}' não encontrado.")
+        headers = {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+        for url in options['urls']:
+            # Aquecimento: a primeira resposta preenche o cache de analytics
+            requests.get(url, headers=headers, timeout=options['timeout'])
+            stats = self.run(url, headers, options['users'], options['requests'],
+                             options['timeout'])
+            self.stdout.write(
+                f"{url}\n  {stats['requests']} pedidos ({stats['errors']} erros), "
+                f"{options['users']} utilizadores simultâneos\n"
+                f"  p50 {stats['p50']} ms | p99 {stats['p99']} ms | "
+                f"{stats['throughput']} pedidos/s")
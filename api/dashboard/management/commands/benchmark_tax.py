@@ -0,0 +1,56 @@
+# api/dashboard/management/commands/benchmark_tax.py
+
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from dashboard.tax import TaxState, compute_tax_months
+
+
+def synthetic_tax_frame(trades, years, seed=0):
+    """Histórico sintético no formato de tax_frame: 70% day trade, 30% ações."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2020-01-01')
+    days = start + pd.to_timedelta(rng.integers(0, 365 * years, trades), unit='D')
+    return pd.DataFrame({
+        'month': days.to_period('M').to_timestamp(),
+        'day': days,
+        'day_trade': rng.random(trades) < 0.7,
+        'stock': rng.random(trades) < 0.3,
+        'net': rng.normal(5, 150, trades).round(2),
+        'sales': rng.uniform(500, 5000, trades).round(2),
+    }).sort_values('day', ignore_index=True)
+
+
+class Command(BaseCommand):
+    help = "Mede a apuração de IR: histórico completo vs. fechamento incremental de um mês."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trades', type=int, default=100_000)
+        parser.add_argument('--years', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def timed(self, function, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - started)
+        return best * 1000
+
+    def handle(self, *args, **options):
+        frame = synthetic_tax_frame(options['trades'], options['years'])
+        months = pd.date_range(frame['month'].min(), frame['month'].max(), freq='MS')
+        last_month = frame[frame['month'] == months[-1]]
+
+        full = self.timed(lambda: compute_tax_months(
+            frame, TaxState(), months), options['repeat'])
+        incremental = self.timed(lambda: compute_tax_months(
+            last_month, TaxState(), months[-1:]), options['repeat'])
+
+        self.stdout.write(
+            f"{options['trades']} trades, {len(months)} meses\n"
+            f"  histórico completo: {full:.1f} ms\n"
+            f"  último mês (incremental): {incremental:.1f} ms")
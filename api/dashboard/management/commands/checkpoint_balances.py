@@ -0,0 +1,14 @@
+# api/dashboard/management/commands/checkpoint_balances.py
+
+from django.core.management.base import BaseCommand
+
+from dashboard.ledger import checkpoint_balances
+
+
+class Command(BaseCommand):
+    help = "Grava um checkpoint do saldo de cada portfolio (rodar periodicamente, ex.: cron diário)."
+
+    def handle(self, *args, **options):
+        count = checkpoint_balances()
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} checkpoints de saldo gravados."))
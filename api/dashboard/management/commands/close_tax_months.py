@@ -0,0 +1,16 @@
+# api/dashboard/management/commands/close_tax_months.py
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from dashboard.tax import close_tax_months
+
+
+class Command(BaseCommand):
+    help = "Apura e grava o IR dos meses já encerrados de todos os utilizadores (rodar no início do mês)."
+
+    def handle(self, *args, **options):
+        closed = 0
+        for user in User.objects.filter(trade__isnull=False).distinct().iterator():
+            closed += len(close_tax_months(user))
+        self.stdout.write(self.style.SUCCESS(f"{closed} meses apurados."))
@@ -0,0 +1,44 @@
+# api/dashboard/management/commands/generate_synthetic_data.py
+
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.models import ExchangeRate
+from dashboard.synthetic import generate_synthetic_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera utilizadores, portfolios, trades (com pernas), estratégias, notas e "
+        "cotações sintéticas reprodutíveis para benchmarks. Use um banco descartável: "
+        "as cotações sintéticas ficam na tabela real de câmbio, então o comando só roda "
+        "num banco vazio ou com --i-know (mesmo com DEBUG)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1)
+        parser.add_argument('--trades', type=int, default=10_000,
+                            help='Trades por utilizador (ex.: 1000, 10000, 100000, 1000000).')
+        parser.add_argument('--years', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='bench',
+                            help='Prefixo dos nomes de utilizador ({prefix}-0, {prefix}-1...).')
+        parser.add_argument('--i-know', action='store_true',
+                            help='Roda mesmo num banco com dados.')
+
+    def handle(self, *args, **options):
+        empty = not User.objects.exists() and not ExchangeRate.objects.exists()
+        if not (empty or options['i_know']):
+            raise CommandError(
+                "O banco já tem dados: as cotações sintéticas substituiriam as do BCB. "
+                "Use um banco descartável ou confirme com --i-know.")
+        started = time.perf_counter()
+        users = generate_synthetic_data(
+            users=options['users'], trades=options['trades'], seed=options['seed'],
+            prefix=options['prefix'], years=options['years'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(users)} utilizadores com {options['trades']} trades cada "
+            f"({', '.join(user.username for user in users)}) em "
+            f"{time.perf_counter() - started:.1f} s."))
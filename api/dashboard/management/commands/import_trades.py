@@ -0,0 +1,40 @@
+# api/dashboard/management/commands/import_trades.py
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.importers import IMPORT_BATCH_SIZE, import_trades, read_rows
+from dashboard.models import Portfolio
+
+
+class Command(BaseCommand):
+    help = "Importa em lote um extrato de corretora (CSV ou Excel) para um portfolio."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--username', required=True)
+        parser.add_argument('--portfolio', required=True,
+                            help='Nome do portfolio de destino.')
+        parser.add_argument('--batch-size', type=int,
+                            default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(
+                f"Utilizador '{options['username']}' não encontrado.")
+        portfolio = Portfolio.objects.filter(
+            user=user, name=options['portfolio']).first()
+        if portfolio is None:
+            raise CommandError(
+                f"Portfolio '{options['portfolio']}' não encontrado.")
+
+        with open(options['path'], 'rb') as statement:
+            result = import_trades(user, portfolio, read_rows(statement, options['path']),
+                                   batch_size=options['batch_size'])
+
+        for error in result.errors:
+            self.stderr.write(f"Linha {error['line']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{result.created} trades importados, {result.skipped} já existentes, "
+            f"{len(result.errors)} linhas com erro."))
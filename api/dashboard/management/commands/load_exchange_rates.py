@@ -0,0 +1,34 @@
+# api/dashboard/management/commands/load_exchange_rates.py
+
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from dashboard.currency_converter import PTAX_CURRENCIES, load_rates
+
+
+class Command(BaseCommand):
+    help = "Pré-carrega as cotações PTAX de um período no banco, em uma única requisição ao BCB."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--currency', default='USD',
+                            help="Código da moeda ou 'ALL' para todas com PTAX.")
+        parser.add_argument('--start', type=date.fromisoformat,
+                            help='Data inicial (AAAA-MM-DD). Padrão: um ano atrás.')
+        parser.add_argument('--end', type=date.fromisoformat,
+                            help='Data final (AAAA-MM-DD). Padrão: hoje.')
+
+    def handle(self, *args, **options):
+        end_date = options['end'] or timezone.localdate()
+        start_date = options['start'] or end_date - timedelta(days=365)
+        if start_date > end_date:
+            raise CommandError('A data inicial deve ser anterior à data final.')
+
+        currencies = PTAX_CURRENCIES if options['currency'].upper() == 'ALL' else [
+            options['currency'].upper()]
+        for currency in currencies:
+            if not load_rates(currency, start_date, end_date):
+                raise CommandError(f'Falha ao acessar a API do BCB ({currency}).')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Cotações de {', '.join(currencies)} carregadas de {start_date:%d/%m/%Y} a {end_date:%d/%m/%Y}."))
@@ -0,0 +1,26 @@
+# api/dashboard/management/commands/rebuild_daily_pnl.py
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.rollups import rebuild_daily_pnl
+
+
+class Command(BaseCommand):
+    help = "Reconstrói do zero a tabela DailyPnL a partir dos trades fechados."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username',
+                            help='Reconstrói apenas os dias deste utilizador.')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(
+                    f"Utilizador '{options['username']}' não encontrado.")
+
+        count = rebuild_daily_pnl(user)
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} linhas de DailyPnL reconstruídas."))
@@ -0,0 +1,36 @@
+# api/dashboard/management/commands/recompute_trades.py
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.accounting import ACCOUNTING_BATCH_SIZE, recompute_trades
+from dashboard.models import Trade
+
+
+class Command(BaseCommand):
+    help = ("Recalcula em lote, a partir das pernas, o preço médio, o resultado, "
+            "o múltiplo de R e o tempo de posição dos trades.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username',
+                            help='Apenas os trades deste utilizador.')
+        parser.add_argument('--portfolio',
+                            help='Apenas os trades deste portfolio (nome; requer --username).')
+        parser.add_argument('--batch-size', type=int,
+                            default=ACCOUNTING_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        trades = Trade.objects.all()
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(
+                    f"Utilizador '{options['username']}' não encontrado.")
+            trades = trades.filter(user=user)
+        if options['portfolio']:
+            if not options['username']:
+                raise CommandError('--portfolio requer --username.')
+            trades = trades.filter(portfolio__name=options['portfolio'])
+
+        count = recompute_trades(trades, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{count} trades recalculados."))
@@ -0,0 +1,146 @@
+# api/dashboard/metrics.py
+
+from dataclasses import dataclass, asdict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from django.utils import timezone
+
+from .currency_converter import convert_many
+from .instrumentation import timed
+from .models import Portfolio, Trade
+from .snapshots import trade_snapshot
+
+CLOSED_TRADE_COLUMNS = [
+    'id', 'user_id', 'portfolio_id', 'symbol', 'side', 'status',
+    'fees', 'net_result', 'portfolio__currency', 'closed_at',
+]
+
+
+def trades_frame(trades, wait=False):
+    """
+    Lê um queryset de trades anotado com `closed_at` para um DataFrame com uma única
+    query (o portfolio vem pelo JOIN do values_list, sem lookups preguiçosos).
+    O resultado é convertido para BRL uma única vez, na coluna `net_result_brl`,
+    e `closed_at` fica no fuso local (TIME_ZONE) e sem tzinfo. `wait` é repassado a
+    convert_many (quem grava o resultado espera pelas cotações do BCB).
+    """
+    rows = trades.order_by('closed_at', 'id').values_list(*CLOSED_TRADE_COLUMNS)
+
+    df = pd.DataFrame.from_records(rows, columns=CLOSED_TRADE_COLUMNS)
+    df = df.rename(columns={'portfolio__currency': 'currency'})
+
+    closed_at_utc = pd.to_datetime(df['closed_at'], utc=True)
+    df['net_result_brl'] = convert_many(
+        df['net_result'], df['currency'], closed_at_utc, wait=wait)
+    df['closed_at'] = closed_at_utc.dt.tz_convert(
+        timezone.get_current_timezone_name()).dt.tz_localize(None)
+    return df
+
+
+def closed_trades_frame(user, portfolio=None):
+    """Trades fechados do utilizador (opcionalmente de um só portfolio), ver trades_frame."""
+    trades = Trade.objects.closed().filter(user=user).with_closed_at()
+    if portfolio is not None:
+        trades = trades.filter(portfolio=portfolio)
+    return trades_frame(trades)
+
+
+@dataclass
+class DashboardKPIs:
+    """Todos os indicadores do dashboard principal, em BRL."""
+    total_balance: float = 0.0
+    total_pl: float = 0.0
+    last_trade_day: date | None = None
+    gains_last_day: float = 0.0
+    last_day_percentage: float = 0.0
+    gains_this_month: float = 0.0
+    month_percentage: float = 0.0
+    gains_this_year: float = 0.0
+    year_percentage: float = 0.0
+    trade_count: int = 0
+    winning_trades: int = 0
+    losing_trades: int = 0
+    win_rate: float = 0.0
+    month_trade_count: int = 0
+    month_winning_trades: int = 0
+    month_win_rate: float = 0.0
+
+    def as_dict(self):
+        return asdict(self)
+
+
+class DashboardMetrics:
+    """
+    Calcula os KPIs do dashboard a partir de uma única leitura dos trades fechados.
+    Uso: DashboardMetrics(request.user).compute()
+    """
+
+    def __init__(self, user, portfolio=None, today=None):
+        self.user = user
+        self.portfolio = portfolio
+        self.today = today or timezone.localdate()
+
+    def total_balance(self):
+        """Soma o saldo dos portfolios do utilizador, convertido para BRL na data de hoje."""
+        portfolios = Portfolio.objects.filter(user=self.user)
+        if self.portfolio is not None:
+            portfolios = portfolios.filter(pk=self.portfolio.pk)
+        balances = list(portfolios.values_list('balance', 'currency'))
+        if not balances:
+            return 0.0
+        amounts, currencies = zip(*balances)
+        converted = convert_many(list(amounts), list(
+            currencies), [self.today] * len(amounts))
+        return float(np.nansum(converted))
+
+    def compute(self):
+        # Lê do snapshot colunar do utilizador, não dos modelos
+        frame = trade_snapshot(self.user.pk).frame(getattr(self.portfolio, 'pk', None))
+        return self.from_frame(frame, self.today, self.total_balance())
+
+    @staticmethod
+    @timed('pandas')
+    def from_frame(frame, today, total_balance=0.0):
+        """
+        Calcula todos os KPIs em uma só passada vetorizada.
+        `frame` precisa das colunas `closed_at` (datetime local) e `net_result_brl`.
+        """
+        kpis = DashboardKPIs(total_balance=float(total_balance))
+        results = frame['net_result_brl'].to_numpy(dtype=float)
+        if results.size == 0:
+            return kpis
+
+        closed_days = frame['closed_at'].dt.normalize().to_numpy()
+        years = frame['closed_at'].dt.year.to_numpy()
+        months = frame['closed_at'].dt.month.to_numpy()
+
+        last_day = closed_days.max()
+        last_day_mask = closed_days == last_day
+        year_mask = years == today.year
+        month_mask = year_mask & (months == today.month)
+        wins = results > 0
+        losses = results < 0
+
+        kpis.total_pl = float(np.nansum(results))
+        kpis.last_trade_day = pd.Timestamp(last_day).date()
+        kpis.gains_last_day = float(np.nansum(results[last_day_mask]))
+        kpis.gains_this_month = float(np.nansum(results[month_mask]))
+        kpis.gains_this_year = float(np.nansum(results[year_mask]))
+
+        kpis.trade_count = int(results.size)
+        kpis.winning_trades = int(wins.sum())
+        kpis.losing_trades = int(losses.sum())
+        kpis.win_rate = kpis.winning_trades / kpis.trade_count * 100
+
+        kpis.month_trade_count = int(month_mask.sum())
+        kpis.month_winning_trades = int((wins & month_mask).sum())
+        if kpis.month_trade_count > 0:
+            kpis.month_win_rate = kpis.month_winning_trades / kpis.month_trade_count * 100
+
+        if kpis.total_balance > 0:
+            kpis.last_day_percentage = kpis.gains_last_day / kpis.total_balance * 100
+            kpis.month_percentage = kpis.gains_this_month / kpis.total_balance * 100
+            kpis.year_percentage = kpis.gains_this_year / kpis.total_balance * 100
+        return kpis
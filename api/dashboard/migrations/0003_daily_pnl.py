@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_exchange_rates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPnL',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('currency', models.CharField(max_length=10)),
+                ('gross', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('fees', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('net', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('net_brl', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('wins', models.IntegerField(default=0)),
+                ('losses', models.IntegerField(default=0)),
+                ('count', models.IntegerField(default=0)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dashboard.portfolio')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'date'], name='daily_pnl_user_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('portfolio', 'date'), name='unique_daily_pnl_per_portfolio')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_daily_pnl'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['user', '-created_at'], name='trade_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['user', 'status', '-created_at'], name='trade_user_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(condition=models.Q(('status', 'OPEN')), fields=['user', '-created_at'], name='trade_open_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tradeentry',
+            index=models.Index(fields=['trade', 'entry_date'], name='trade_entry_trade_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trademanualclose',
+            index=models.Index(fields=['trade', '-close_date'], name='trade_close_trade_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tradetarget',
+            index=models.Index(fields=['trade', '-target_date'], name='trade_target_trade_date_idx'),
+        ),
+    ]
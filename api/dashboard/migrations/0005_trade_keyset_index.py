@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_trade_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='trade',
+            name='trade_user_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='trade_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_trade_import_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trade',
+            name='avg_entry_price',
+            field=models.DecimalField(blank=True, decimal_places=5, editable=False, max_digits=15, null=True),
+        ),
+        migrations.AddField(
+            model_name='trade',
+            name='avg_exit_price',
+            field=models.DecimalField(blank=True, decimal_places=5, editable=False, max_digits=15, null=True),
+        ),
+        migrations.AddField(
+            model_name='trade',
+            name='gross_result',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=15, null=True),
+        ),
+        migrations.AddField(
+            model_name='trade',
+            name='holding_seconds',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='trade',
+            name='quantity',
+            field=models.DecimalField(blank=True, decimal_places=5, editable=False, max_digits=15, null=True),
+        ),
+        migrations.AddField(
+            model_name='trade',
+            name='r_multiple',
+            field=models.DecimalField(blank=True, decimal_places=4, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='trade',
+            name='risk_per_unit',
+            field=models.DecimalField(blank=True, decimal_places=5, editable=False, max_digits=15, null=True),
+        ),
+    ]
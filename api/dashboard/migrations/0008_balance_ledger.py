@@ -0,0 +1,94 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:45
+
+import django.db.models.deletion
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, Greatest
+
+
+def open_existing_ledgers(apps, schema_editor):
+    # Trades fechados e transações já existentes entram no livro-razão como lançados:
+    # sem isso, o primeiro save de um deles lançaria o valor inteiro de novo. O saldo
+    # de abertura é o que sobra do saldo atual depois de descontados esses lançamentos.
+    Portfolio = apps.get_model('dashboard', 'Portfolio')
+    Trade = apps.get_model('dashboard', 'Trade')
+    TradeTarget = apps.get_model('dashboard', 'TradeTarget')
+    TradeManualClose = apps.get_model('dashboard', 'TradeManualClose')
+    PortfolioTransaction = apps.get_model('dashboard', 'PortfolioTransaction')
+    BalanceLedgerEntry = apps.get_model('dashboard', 'BalanceLedgerEntry')
+
+    # Mesma data de fechamento de TradeQuerySet.with_closed_at (o manager histórico não a tem)
+    last_manual_close = TradeManualClose.objects.filter(
+        trade=models.OuterRef('pk')).order_by('-close_date').values('close_date')[:1]
+    last_target = TradeTarget.objects.filter(
+        trade=models.OuterRef('pk'), target_date__isnull=False
+    ).order_by('-target_date').values('target_date')[:1]
+    trades = Trade.objects.exclude(status='OPEN').annotate(
+        last_manual_close=models.Subquery(last_manual_close),
+        last_target=models.Subquery(last_target),
+    ).annotate(closed_at=Greatest(
+        Coalesce('last_manual_close', 'last_target', 'created_at'),
+        Coalesce('last_target', 'last_manual_close', 'created_at'),
+    ))
+
+    flows = defaultdict(list)
+    for trade_id, portfolio_id, amount, date in trades.values_list(
+            'id', 'portfolio_id', 'net_result', 'closed_at').iterator():
+        flows[portfolio_id].append((date, 'TRADE', trade_id, amount))
+    for movement_id, portfolio_id, kind, value, date in PortfolioTransaction.objects.values_list(
+            'id', 'portfolio_id', 'type', 'value', 'date').iterator():
+        flows[portfolio_id].append((date, kind, movement_id, value if kind == 'DEPOSIT' else -value))
+
+    entries = []
+    for portfolio in Portfolio.objects.all().iterator():
+        items = sorted(flows.pop(portfolio.pk, []), key=lambda item: (item[0], item[1], item[2]))
+        running = portfolio.balance - sum(amount for _, _, _, amount in items)
+        entries.append(BalanceLedgerEntry(
+            portfolio_id=portfolio.pk, kind='OPENING', date=portfolio.created_at,
+            amount=running, balance_after=running))
+        for date, kind, source_id, amount in items:
+            running += amount
+            entries.append(BalanceLedgerEntry(
+                portfolio_id=portfolio.pk, kind=kind, source_id=source_id, date=date,
+                amount=amount, balance_after=running))
+    BalanceLedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_trade_derived_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('OPENING', 'Saldo de Abertura'), ('DEPOSIT', 'Depósito'), ('WITHDRAWAL', 'Saque'), ('TRADE', 'Resultado de Trade')], max_length=10)),
+                ('source_id', models.BigIntegerField(blank=True, null=True)),
+                ('date', models.DateTimeField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dashboard.portfolio')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['portfolio', 'date'], name='ledger_portfolio_date_idx'), models.Index(fields=['kind', 'source_id'], name='ledger_source_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dashboard.portfolio')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['portfolio', '-date'], name='snapshot_portfolio_date_idx')],
+            },
+        ),
+        migrations.RunPython(open_existing_ledgers, migrations.RunPython.noop),
+    ]
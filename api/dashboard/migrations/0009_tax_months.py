@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_balance_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaxMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('day_trade_result', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('swing_result', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('stock_sales', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('swing_exempt', models.BooleanField(default=False)),
+                ('day_trade_loss_carry', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('swing_loss_carry', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('irrf', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('irrf_carry', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('tax_due', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('darf_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('darf_carry', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'month'), name='unique_tax_month_per_user')],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:20
+
+from django.db import migrations
+
+# Postgres: coluna gerada (atualizada pelo próprio banco a cada INSERT/UPDATE) + GIN
+POSTGRES_FORWARD = [
+    "ALTER TABLE dashboard_journalnote ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('portuguese'::regconfig, coalesce(notes, ''))) STORED",
+    "CREATE INDEX journal_search_idx ON dashboard_journalnote USING GIN (search_vector)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS journal_search_idx",
+    "ALTER TABLE dashboard_journalnote DROP COLUMN IF EXISTS search_vector",
+]
+
+# SQLite: índice FTS5 externo (só guarda o índice, o texto fica na tabela) mantido por triggers.
+# Migrações que recriem a tabela de notas no SQLite apagam os triggers: recrie-os nelas.
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE dashboard_journalnote_fts USING fts5("
+    "notes, content='dashboard_journalnote', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER dashboard_journalnote_fts_ai AFTER INSERT ON dashboard_journalnote BEGIN "
+    "INSERT INTO dashboard_journalnote_fts(rowid, notes) VALUES (new.id, new.notes); END",
+    "CREATE TRIGGER dashboard_journalnote_fts_ad AFTER DELETE ON dashboard_journalnote BEGIN "
+    "INSERT INTO dashboard_journalnote_fts(dashboard_journalnote_fts, rowid, notes) "
+    "VALUES ('delete', old.id, old.notes); END",
+    "CREATE TRIGGER dashboard_journalnote_fts_au AFTER UPDATE OF notes ON dashboard_journalnote BEGIN "
+    "INSERT INTO dashboard_journalnote_fts(dashboard_journalnote_fts, rowid, notes) "
+    "VALUES ('delete', old.id, old.notes); "
+    "INSERT INTO dashboard_journalnote_fts(rowid, notes) VALUES (new.id, new.notes); END",
+    # Indexa as notas que já existiam
+    "INSERT INTO dashboard_journalnote_fts(dashboard_journalnote_fts) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS dashboard_journalnote_fts_ai",
+    "DROP TRIGGER IF EXISTS dashboard_journalnote_fts_ad",
+    "DROP TRIGGER IF EXISTS dashboard_journalnote_fts_au",
+    "DROP TABLE IF EXISTS dashboard_journalnote_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0009_tax_months'),
+    ]
+
+    operations = [
+        # Índice de texto completo das notas do journal (ver dashboard/journal_search.py)
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
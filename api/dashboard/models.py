@@ -2,6 +2,7 @@
 
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
 
 # --- Modelos de Suporte ---
@@ -40,6 +41,47 @@ class Strategy(models.Model):
         return self.name
 
 
+class TradeQuerySet(models.QuerySet):
+    def closed(self):
+        return self.exclude(status='OPEN')
+
+    def with_closed_at(self):
+        """
+        Anota `closed_at`: a data do último fechamento (alvo ou manual).
+        Sem nenhuma perna de saída registrada, usamos a data de criação do trade.
+        """
+        last_manual_close = TradeManualClose.objects.filter(
+            trade=models.OuterRef('pk')).order_by('-close_date').values('close_date')[:1]
+        last_target = TradeTarget.objects.filter(
+            trade=models.OuterRef('pk'), target_date__isnull=False
+        ).order_by('-target_date').values('target_date')[:1]
+        return self.annotate(
+            last_manual_close=models.Subquery(last_manual_close),
+            last_target=models.Subquery(last_target),
+        ).annotate(
+            closed_at=Greatest(
+                Coalesce('last_manual_close', 'last_target', 'created_at'),
+                Coalesce('last_target', 'last_manual_close', 'created_at'),
+            ),
+        )
+
+    def with_opened_at(self):
+        """Anota `opened_at`: a data da primeira entrada (nula se não houver entradas)."""
+        first_entry = TradeEntry.objects.filter(
+            trade=models.OuterRef('pk')).order_by('entry_date').values('entry_date')[:1]
+        return self.annotate(opened_at=models.Subquery(first_entry))
+
+    def with_strategy(self):
+        """
+        Anota `strategy_ref`: a estratégia da nota de diário mais recente do trade
+        que tenha uma. Assim cada trade conta para uma única estratégia.
+        """
+        latest_strategy = JournalNote.objects.filter(
+            trade=models.OuterRef('pk'), strategy__isnull=False
+        ).order_by('-created_at', '-id').values('strategy_id')[:1]
+        return self.annotate(strategy_ref=models.Subquery(latest_strategy))
+
+
 class Trade(models.Model):
     # Sugestão 1: Novas escolhas para o campo 'status'
     STATUS_CHOICES = (
@@ -66,6 +108,47 @@ class Trade(models.Model):
     status = models.CharField(
         max_length=15, choices=STATUS_CHOICES, default='OPEN')
 
+    # Campos derivados das pernas, recalculados em lote por dashboard/accounting.py
+    quantity = models.DecimalField(
+        max_digits=15, decimal_places=5, blank=True, null=True, editable=False)
+    avg_entry_price = models.DecimalField(
+        max_digits=15, decimal_places=5, blank=True, null=True, editable=False)
+    avg_exit_price = models.DecimalField(
+        max_digits=15, decimal_places=5, blank=True, null=True, editable=False)
+    gross_result = models.DecimalField(
+        max_digits=15, decimal_places=2, blank=True, null=True, editable=False)
+    # Risco por unidade até o stop inicial: com ele MAE/MFE saem em R
+    risk_per_unit = models.DecimalField(
+        max_digits=15, decimal_places=5, blank=True, null=True, editable=False)
+    r_multiple = models.DecimalField(
+        max_digits=10, decimal_places=4, blank=True, null=True, editable=False)
+    holding_seconds = models.BigIntegerField(
+        blank=True, null=True, editable=False)
+
+    # Hash da chave natural da linha importada (ver dashboard/importers.py)
+    import_hash = models.CharField(
+        max_length=64, blank=True, null=True, editable=False)
+
+    objects = TradeQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # Reimportar o mesmo extrato não duplica trades
+            models.UniqueConstraint(
+                fields=['user', 'import_hash'], name='unique_trade_import_hash'),
+        ]
+        indexes = [
+            # Lista de trades: filtro por utilizador, mais recentes primeiro
+            models.Index(fields=['user', '-created_at', '-id'],
+                         name='trade_user_created_idx'),
+            # Dashboards: filtro por utilizador e status, ordenado por data
+            models.Index(fields=['user', 'status', '-created_at'],
+                         name='trade_user_status_created_idx'),
+            # Posições em aberto são poucas: índice parcial pequeno e quente
+            models.Index(fields=['user', '-created_at'], condition=models.Q(status='OPEN'),
+                         name='trade_open_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Trade #{self.id} - {self.symbol} ({self.get_status_display()})"
 
@@ -100,6 +183,12 @@ class TradeEntry(models.Model):
     quantity = models.DecimalField(max_digits=15, decimal_places=5)
     entry_date = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['trade', 'entry_date'],
+                         name='trade_entry_trade_date_idx'),
+        ]
+
 
 class TradeStop(models.Model):
     trade = models.ForeignKey(
@@ -115,6 +204,13 @@ class TradeTarget(models.Model):
     quantity = models.DecimalField(max_digits=15, decimal_places=5)
     target_date = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Usado pela anotação closed_at (último alvo de cada trade)
+            models.Index(fields=['trade', '-target_date'],
+                         name='trade_target_trade_date_idx'),
+        ]
+
 
 class TradeManualClose(models.Model):
     trade = models.ForeignKey(
@@ -123,6 +219,13 @@ class TradeManualClose(models.Model):
     quantity = models.DecimalField(max_digits=15, decimal_places=5)
     close_date = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # Usado pela anotação closed_at (último fechamento de cada trade)
+            models.Index(fields=['trade', '-close_date'],
+                         name='trade_close_trade_date_idx'),
+        ]
+
 
 class PortfolioTransaction(models.Model):
     TRANSACTION_TYPES = (('DEPOSIT', 'Depósito'), ('WITHDRAWAL', 'Saque'))
@@ -130,3 +233,179 @@ class PortfolioTransaction(models.Model):
     type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
     value = models.DecimalField(max_digits=15, decimal_places=2)
     date = models.DateTimeField(default=timezone.now)
+
+
+# --- Cotações de Câmbio ---
+
+
+class ExchangeRate(models.Model):
+    """Cotação PTAX de venda de uma moeda em BRL para um dia útil."""
+    currency = models.CharField(max_length=10)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=15, decimal_places=6)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['currency', 'date'], name='unique_exchange_rate_per_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.currency} {self.date:%d/%m/%Y}: {self.rate}"
+
+
+class ExchangeRateCoverage(models.Model):
+    """
+    Intervalo contíguo de datas já consultado no BCB para uma moeda.
+    Um dia dentro do intervalo sem ExchangeRate é um dia não-útil.
+    """
+    currency = models.CharField(max_length=10, unique=True)
+    start_date = models.DateField()
+    end_date = models.DateField()
+
+    def __str__(self):
+        return f"{self.currency}: {self.start_date:%d/%m/%Y} a {self.end_date:%d/%m/%Y}"
+
+
+# --- Agregados (mantidos por sinais, ver dashboard/rollups.py) ---
+
+
+class DailyPnL(models.Model):
+    """Resultado consolidado dos trades fechados de um portfolio em um dia (fuso local)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    portfolio = models.ForeignKey(Portfolio, on_delete=models.CASCADE)
+    date = models.DateField()
+    currency = models.CharField(max_length=10)
+    gross = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
+    fees = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
+    net = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
+    net_brl = models.DecimalField(
+        max_digits=15, decimal_places=2, default=0.00)
+    wins = models.IntegerField(default=0)
+    losses = models.IntegerField(default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['portfolio', 'date'], name='unique_daily_pnl_per_portfolio'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'date'],
+                         name='daily_pnl_user_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.portfolio_id} {self.date:%d/%m/%Y}: {self.net} {self.currency}"
+
+
+# --- Livro-razão do saldo (mantido por sinais, ver dashboard/ledger.py) ---
+
+
+class BalanceLedgerEntry(models.Model):
+    """
+    Lançamento append-only que altera o saldo de um portfolio.
+    `source_id` aponta para o PortfolioTransaction ou Trade de origem; não é FK
+    para que os estornos continuem rastreáveis depois de a origem ser apagada.
+    """
+    KIND_CHOICES = (
+        ('OPENING', 'Saldo de Abertura'),
+        ('DEPOSIT', 'Depósito'),
+        ('WITHDRAWAL', 'Saque'),
+        ('TRADE', 'Resultado de Trade'),
+    )
+
+    portfolio = models.ForeignKey(Portfolio, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    source_id = models.BigIntegerField(blank=True, null=True)
+    date = models.DateTimeField()
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    # Saldo do portfolio logo após este lançamento (ordem de gravação)
+    balance_after = models.DecimalField(max_digits=15, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['portfolio', 'date'],
+                         name='ledger_portfolio_date_idx'),
+            models.Index(fields=['kind', 'source_id'],
+                         name='ledger_source_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.amount} em {self.date:%d/%m/%Y}"
+
+
+class BalanceSnapshot(models.Model):
+    """Checkpoint do saldo de um portfolio: soma de todos os lançamentos até `date`."""
+    portfolio = models.ForeignKey(Portfolio, on_delete=models.CASCADE)
+    date = models.DateTimeField()
+    balance = models.DecimalField(max_digits=15, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['portfolio', '-date'],
+                         name='snapshot_portfolio_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.portfolio_id} em {self.date:%d/%m/%Y}: {self.balance}"
+
+
+# --- Apuração de IR (estado mensal persistido, ver dashboard/tax.py) ---
+
+
+class TaxMonth(models.Model):
+    """
+    Apuração mensal de IR sobre renda variável de um utilizador, em BRL.
+    Os saldos `*_carry` são o que passa para o mês seguinte: é a partir da última
+    linha gravada que a apuração continua, sem reprocessar os meses anteriores.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Primeiro dia do mês apurado
+    month = models.DateField()
+    day_trade_result = models.DecimalField(
+        max_digits=15, decimal_places=2, default=0.00)
+    swing_result = models.DecimalField(
+        max_digits=15, decimal_places=2, default=0.00)
+    # Total de vendas de ações no mês (limite da isenção de R$ 20 mil)
+    stock_sales = models.DecimalField(
+        max_digits=15, decimal_places=2, default=0.00)
+    swing_exempt = models.BooleanField(default=False)
+    day_trade_loss_carry = models.DecimalField(
+        max_digits=15, decimal_places=2, default=0.00)
+    swing_loss_carry = models.DecimalField(
+        max_digits=15, decimal_places=2, default=0.00)
+    irrf = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
+    irrf_carry = models.DecimalField(
+        max_digits=15, decimal_places=2, default=0.00)
+    tax_due = models.DecimalField(
+        max_digits=15, decimal_places=2, default=0.00)
+    # Valor do DARF do mês e o valor abaixo do mínimo adiado para o mês seguinte
+    darf_amount = models.DecimalField(
+        max_digits=15, decimal_places=2, default=0.00)
+    darf_carry = models.DecimalField(
+        max_digits=15, decimal_places=2, default=0.00)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'month'], name='unique_tax_month_per_user'),
+        ]
+
+    def __str__(self):
+        return f"IR {self.month:%m/%Y} ({self.user_id}): DARF {self.darf_amount}"
+
+
+class AnalyticsVersion(models.Model):
+    """
+    Contador de versão dos analytics (ver dashboard/analytics_cache.py): `scope` é
+    'global' ou 'user:<id>'. Fica no banco, e não no cache, para que todos os
+    workers vejam o mesmo valor mesmo com um cache local por processo.
+    """
+    scope = models.CharField(max_length=40, unique=True)
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.scope}: {self.version}"
@@ -0,0 +1,73 @@
+# api/dashboard/rate_fetcher.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.db import connections
+
+MAX_CONCURRENT_FETCHES = 4
+FETCH_ATTEMPTS = 3
+# Espera antes da 2ª, 3ª... tentativa: 0,5 s, 1 s, 2 s...
+FETCH_BACKOFF = 0.5
+
+
+class SingleFlightFetcher:
+    """
+    Executa buscas externas num pool de threads limitado, fora do ciclo do request.
+    Pedidos simultâneos com a mesma chave partilham a mesma Future (single-flight),
+    e falhas de rede são repetidas com backoff exponencial.
+    """
+
+    def __init__(self, max_workers=MAX_CONCURRENT_FETCHES, attempts=FETCH_ATTEMPTS,
+                 backoff=FETCH_BACKOFF):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_workers = max_workers
+        self._executor = None
+        self._inflight = {}
+        # RLock: se a Future já terminou, add_done_callback chama _forget na hora
+        self._lock = threading.RLock()
+
+    def _pool(self):
+        # Criado sob demanda: processos que nunca buscam cotações não abrem threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix='rate-fetch')
+        return self._executor
+
+    def _run(self, function, args):
+        try:
+            for attempt in range(self.attempts):
+                try:
+                    return function(*args)
+                except requests.exceptions.RequestException:
+                    if attempt == self.attempts - 1:
+                        raise
+                    time.sleep(self.backoff * 2 ** attempt)
+        finally:
+            # Cada thread do pool tem a sua própria conexão com o banco
+            connections.close_all()
+
+    def submit(self, key, function, *args):
+        """Agenda `function(*args)` ou devolve a Future já em curso para a mesma chave."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._pool().submit(self._run, function, args)
+                self._inflight[key] = future
+                future.add_done_callback(lambda _: self._forget(key))
+        return future
+
+    def _forget(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def pending(self, key):
+        with self._lock:
+            return key in self._inflight
+
+
+# Instância do processo usada pelo currency_converter
+RATE_FETCHER = SingleFlightFetcher()
@@ -0,0 +1,13 @@
+# api/dashboard/renderers.py
+
+from rest_framework.renderers import JSONRenderer
+
+from .instrumentation import timed
+
+
+class InstrumentedJSONRenderer(JSONRenderer):
+    """JSONRenderer que soma a codificação à fase `serialize` do request (Server-Timing)."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('serialize'):
+            return super().render(data, accepted_media_type, renderer_context)
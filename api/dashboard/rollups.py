@@ -0,0 +1,145 @@
+# api/dashboard/rollups.py
+
+import logging
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .analytics_cache import invalidate_analytics
+from .currency_converter import FALLBACK_DAYS
+from .metrics import trades_frame
+from .models import DailyPnL, Trade
+
+logger = logging.getLogger(__name__)
+
+
+def closed_day_for(trade_id):
+    """
+    Devolve (user_id, portfolio_id, dia local do fechamento) de um trade fechado,
+    ou None se o trade estiver aberto ou não existir.
+    """
+    row = Trade.objects.closed().filter(pk=trade_id).with_closed_at().values_list(
+        'user_id', 'portfolio_id', 'closed_at').first()
+    if row is None:
+        return None
+    user_id, portfolio_id, closed_at = row
+    return user_id, portfolio_id, timezone.localtime(closed_at).date()
+
+
+def aggregate_daily(frame):
+    """
+    Agrupa um DataFrame de trades_frame em linhas de DailyPnL (não salvas). Os dias
+    com algum trade sem cotação (net_result_brl NaN, ver convert_many com wait)
+    ficam de fora: fill_missing_days grava-os quando as cotações chegarem.
+    """
+    if frame.empty:
+        return []
+
+    net = frame['net_result'].astype(float)
+    fees = frame['fees'].astype(float)
+    daily = frame.assign(
+        date=frame['closed_at'].dt.date,
+        net=net,
+        fees=fees,
+        gross=net + fees,
+        wins=(net > 0).astype(int),
+        losses=(net < 0).astype(int),
+    ).groupby(['user_id', 'portfolio_id', 'date', 'currency'], as_index=False).agg(
+        gross=('gross', 'sum'),
+        fees=('fees', 'sum'),
+        net=('net', 'sum'),
+        net_brl=('net_result_brl', 'sum'),
+        converted=('net_result_brl', 'count'),
+        wins=('wins', 'sum'),
+        losses=('losses', 'sum'),
+        count=('id', 'count'),
+    )
+
+    incomplete = daily['converted'] < daily['count']
+    if incomplete.any():
+        logger.warning('%s dia(s) de DailyPnL por gravar: falta a cotação do câmbio.',
+                       int(incomplete.sum()))
+        daily = daily[~incomplete]
+
+    def money(value):
+        return Decimal(str(round(value, 2)))
+
+    return [
+        DailyPnL(
+            user_id=row.user_id, portfolio_id=row.portfolio_id, date=row.date,
+            currency=row.currency, gross=money(row.gross), fees=money(row.fees),
+            net=money(row.net), net_brl=money(row.net_brl),
+            wins=row.wins, losses=row.losses, count=row.count,
+        )
+        for row in daily.itertuples(index=False)
+    ]
+
+
+def refresh_daily_pnl(portfolio_id, day):
+    """Recalcula apenas a linha de DailyPnL de um portfolio em um dia."""
+    tz = timezone.get_current_timezone()
+    start = datetime.combine(day, time.min, tzinfo=tz)
+    end = datetime.combine(day + timedelta(days=1), time.min, tzinfo=tz)
+
+    trades = Trade.objects.closed().filter(portfolio_id=portfolio_id).with_closed_at().filter(
+        closed_at__gte=start, closed_at__lt=end)
+    rows = aggregate_daily(trades_frame(trades, wait=True))
+
+    with transaction.atomic():
+        DailyPnL.objects.filter(portfolio_id=portfolio_id, date=day).delete()
+        DailyPnL.objects.bulk_create(rows)
+
+
+def refresh_days(*keys):
+    """Recalcula os dias afetados, ignorando None e repetições."""
+    for _, portfolio_id, day in {key for key in keys if key is not None}:
+        refresh_daily_pnl(portfolio_id, day)
+
+
+def rebuild_daily_pnl(user=None):
+    """
+    Reconstrói do zero a tabela DailyPnL, de todos os utilizadores ou de um só
+    (`user` pode ser a instância ou o id).
+    """
+    trades = Trade.objects.closed().with_closed_at()
+    existing = DailyPnL.objects.all()
+    if user is not None:
+        trades = trades.filter(user=user)
+        existing = existing.filter(user=user)
+
+    rows = aggregate_daily(trades_frame(trades, wait=True))
+    with transaction.atomic():
+        existing.delete()
+        DailyPnL.objects.bulk_create(rows, batch_size=1000)
+    invalidate_analytics(getattr(user, 'pk', user))
+    return len(rows)
+
+
+def fill_missing_days(currency, start, end):
+    """
+    Grava as linhas de DailyPnL que ficaram de fora por falta de cotação (ver
+    aggregate_daily), nos dias que as cotações de `currency` de `start` a `end`
+    cobrem. Chamado quando o BCB devolve cotações novas (sinal rates_loaded).
+    """
+    tz = timezone.get_current_timezone()
+    last = end + timedelta(days=FALLBACK_DAYS - 1)
+    trades = Trade.objects.closed().filter(portfolio__currency=currency).with_closed_at().filter(
+        closed_at__gte=datetime.combine(start, time.min, tzinfo=tz),
+        closed_at__lt=datetime.combine(last + timedelta(days=1), time.min, tzinfo=tz))
+    existing = set(DailyPnL.objects.filter(
+        currency=currency, date__range=(start, last)).values_list('portfolio_id', 'date'))
+    missing = {(portfolio_id, timezone.localtime(closed_at).date())
+               for portfolio_id, closed_at in trades.values_list('portfolio_id', 'closed_at')}
+    missing -= existing
+    if not missing:
+        return 0
+
+    rows = [row for row in aggregate_daily(trades_frame(
+        trades.filter(portfolio_id__in={portfolio_id for portfolio_id, _ in missing}), wait=True))
+        if (row.portfolio_id, row.date) in missing]
+    DailyPnL.objects.bulk_create(rows, ignore_conflicts=True)
+    for user_id in {row.user_id for row in rows}:
+        invalidate_analytics(user_id)
+    return len(rows)
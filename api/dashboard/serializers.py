@@ -2,7 +2,8 @@
 
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Trade, Portfolio, Strategy
+from .instrumentation import timed
+from .models import Trade, Portfolio, Strategy, TradeEntry, TradeStop, TradeTarget, TradeManualClose
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -20,10 +21,75 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ('id', 'username', 'email', 'password')
 
+
+class SparseFieldsetMixin:
+    """
+    Permite ao cliente pedir apenas alguns campos com ?fields=id,symbol,net_result.
+    Os campos não pedidos são removidos antes da serialização, então as suas
+    fontes (relações, métodos) nem chegam a ser acedidas.
+    """
+    fields_query_param = 'fields'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.requested_fields(self.context.get('request'))
+        if requested is not None:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+    @classmethod
+    def requested_fields(cls, request):
+        """Devolve o conjunto de campos pedidos, ou None se o cliente quer todos."""
+        if request is None:
+            return None
+        raw = request.query_params.get(cls.fields_query_param)
+        if not raw:
+            return None
+        return {name.strip() for name in raw.split(',') if name.strip()}
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    """Lista que soma a conversão dos objetos à fase `serialize` do request."""
+
+    def to_representation(self, data):
+        with timed('serialize'):
+            return super().to_representation(data)
+
+
+# SERIALIZERS DAS PERNAS DO TRADE (usados aninhados no TradeSerializer)
+
+
+class TradeEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TradeEntry
+        fields = ['id', 'price', 'quantity', 'entry_date']
+
+
+class TradeStopSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TradeStop
+        fields = ['id', 'price', 'stop_date']
+
+
+class TradeTargetSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TradeTarget
+        fields = ['id', 'price', 'quantity', 'target_date']
+
+
+class TradeManualCloseSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TradeManualClose
+        fields = ['id', 'price', 'quantity', 'close_date']
+
 # NOVO SERIALIZER PARA O MODELO TRADE
 
 
-class TradeSerializer(serializers.ModelSerializer):
+class TradeSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Serializa o trade com as suas pernas. O queryset deve vir de
+    TradeSerializer.setup_queryset para não gerar queries por linha.
+    """
     portfolio_name = serializers.CharField(
         source='portfolio.name', read_only=True)
     user_username = serializers.CharField(
@@ -31,15 +97,49 @@ class TradeSerializer(serializers.ModelSerializer):
     # Adicionamos um campo para a versão "legível" do status
     status_display = serializers.CharField(
         source='get_status_display', read_only=True)
+    entries = TradeEntrySerializer(many=True, read_only=True)
+    stops = TradeStopSerializer(many=True, read_only=True)
+    targets = TradeTargetSerializer(many=True, read_only=True)
+    manual_closes = TradeManualCloseSerializer(many=True, read_only=True)
+
+    # Campo serializado -> relação que precisa de JOIN ou prefetch
+    SELECT_RELATED = {'portfolio_name': 'portfolio', 'user_username': 'user'}
+    PREFETCH_RELATED = ('entries', 'stops', 'targets', 'manual_closes')
+
+    @classmethod
+    def setup_queryset(cls, queryset, fields=None):
+        """
+        portfolio e user via JOIN; cada tipo de perna em uma única query extra.
+        Com `fields`, só carrega as relações dos campos pedidos.
+        """
+        def wanted(name):
+            return fields is None or name in fields
+
+        related = [relation for name, relation in cls.SELECT_RELATED.items()
+                   if wanted(name)]
+        if related:
+            queryset = queryset.select_related(*related)
+        legs = [name for name in cls.PREFETCH_RELATED if wanted(name)]
+        if legs:
+            queryset = queryset.prefetch_related(*legs)
+        return queryset
 
     class Meta:
         model = Trade
+        list_serializer_class = TimedListSerializer
         fields = [
             'id',
             'symbol',
             'side',
             'fees',
             'net_result',
+            'gross_result',
+            'quantity',
+            'avg_entry_price',
+            'avg_exit_price',
+            'risk_per_unit',
+            'r_multiple',
+            'holding_seconds',
             'status',  # <-- O campo 'status' (ex: "OPEN")
             'status_display',  # <-- A versão legível (ex: "Em Aberto")
             'created_at',
@@ -47,4 +147,8 @@ class TradeSerializer(serializers.ModelSerializer):
             'portfolio_name',
             'user',
             'user_username',
+            'entries',
+            'stops',
+            'targets',
+            'manual_closes',
         ]
@@ -0,0 +1,192 @@
+# api/dashboard/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .accounting import update_trade_analytics
+from .analytics_cache import invalidate_analytics
+from .currency_converter import rates_loaded
+from .ledger import open_ledger, sync_trades, sync_transaction
+from .models import (
+    JournalNote, Portfolio, PortfolioTransaction, Strategy, Trade, TradeEntry,
+    TradeManualClose, TradeStop, TradeTarget,
+)
+from .rollups import closed_day_for, fill_missing_days, refresh_days
+from .tax import reopen_tax_months
+
+# --- Campos derivados: registados primeiro, para que no commit o DailyPnL, o IR e o
+# livro-razão já leiam o resultado recalculado a partir das pernas ---
+
+
+@receiver(post_save, sender=TradeEntry)
+@receiver(post_save, sender=TradeStop)
+@receiver(post_save, sender=TradeTarget)
+@receiver(post_save, sender=TradeManualClose)
+@receiver(post_delete, sender=TradeEntry)
+@receiver(post_delete, sender=TradeStop)
+@receiver(post_delete, sender=TradeTarget)
+@receiver(post_delete, sender=TradeManualClose)
+def update_leg_analytics(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    trade_id = instance.trade_id
+    transaction.on_commit(lambda: update_trade_analytics([trade_id]))
+
+
+# --- DailyPnL e IR: cada alteração recalcula só o dia antigo e o novo do trade ---
+
+
+def reopen_tax(*keys):
+    # A apuração de IR é refeita a partir do mês mais antigo afetado
+    for user_id, _, day in {key for key in keys if key is not None}:
+        reopen_tax_months(user_id, day)
+
+
+def schedule_refresh(previous_day, trade_id):
+    # O dia novo só é lido no commit: ao apagar um trade, as pernas são apagadas
+    # antes dele e não queremos contabilizá-lo num dia intermediário
+    def refresh():
+        keys = (previous_day, closed_day_for(trade_id))
+        refresh_days(*keys)
+        reopen_tax(*keys)
+
+    transaction.on_commit(refresh)
+
+
+@receiver(pre_save, sender=Trade)
+@receiver(pre_delete, sender=Trade)
+def remember_trade_day(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    instance._previous_closed_day = closed_day_for(instance.pk)
+
+
+@receiver(post_save, sender=Trade)
+@receiver(post_delete, sender=Trade)
+def update_trade_day(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_refresh(
+        getattr(instance, '_previous_closed_day', None), instance.pk)
+
+
+@receiver(pre_save, sender=TradeEntry)
+@receiver(pre_save, sender=TradeTarget)
+@receiver(pre_save, sender=TradeManualClose)
+@receiver(pre_delete, sender=TradeEntry)
+@receiver(pre_delete, sender=TradeTarget)
+@receiver(pre_delete, sender=TradeManualClose)
+def remember_leg_day(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Uma perna nova também pode mudar a data de fechamento do trade
+    instance._previous_closed_day = closed_day_for(instance.trade_id)
+
+
+@receiver(post_save, sender=TradeEntry)
+@receiver(post_save, sender=TradeTarget)
+@receiver(post_save, sender=TradeManualClose)
+@receiver(post_delete, sender=TradeEntry)
+@receiver(post_delete, sender=TradeTarget)
+@receiver(post_delete, sender=TradeManualClose)
+def update_leg_day(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_refresh(
+        getattr(instance, '_previous_closed_day', None), instance.trade_id)
+
+
+@receiver(rates_loaded)
+def fill_days_without_rate(sender, currency, start, end, **kwargs):
+    # Dias que ficaram por gravar porque a busca no BCB tinha falhado
+    fill_missing_days(currency, start, end)
+
+
+# --- Livro-razão: depósitos, saques e trades fechados movem o saldo por delta ---
+
+
+@receiver(post_save, sender=Portfolio)
+def open_portfolio_ledger(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        open_ledger(instance)
+
+
+@receiver(post_save, sender=PortfolioTransaction)
+@receiver(post_delete, sender=PortfolioTransaction)
+def update_transaction_ledger(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction_id = instance.pk
+    transaction.on_commit(lambda: sync_transaction(transaction_id))
+
+
+@receiver(post_save, sender=Trade)
+@receiver(post_delete, sender=Trade)
+def update_trade_ledger(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    trade_id = instance.pk
+    transaction.on_commit(lambda: sync_trades([trade_id]))
+
+
+@receiver(post_save, sender=TradeEntry)
+@receiver(post_save, sender=TradeTarget)
+@receiver(post_save, sender=TradeManualClose)
+@receiver(post_delete, sender=TradeEntry)
+@receiver(post_delete, sender=TradeTarget)
+@receiver(post_delete, sender=TradeManualClose)
+def update_leg_ledger(sender, instance, raw=False, **kwargs):
+    # O resultado e a data de fechamento do trade podem ter mudado
+    if raw:
+        return
+    trade_id = instance.trade_id
+    transaction.on_commit(lambda: sync_trades([trade_id]))
+
+
+# --- Cache de analytics: qualquer escrita do utilizador incrementa a sua versão ---
+# Registados por último: no commit, rodam depois do DailyPnL e do livro-razão, então
+# nenhum cálculo feito com os dados antigos fica guardado sob a versão nova.
+
+
+def schedule_invalidation(user_id):
+    if user_id is not None:
+        transaction.on_commit(lambda: invalidate_analytics(user_id))
+
+
+@receiver(post_save, sender=Trade)
+@receiver(post_delete, sender=Trade)
+@receiver(post_save, sender=Portfolio)
+@receiver(post_delete, sender=Portfolio)
+@receiver(post_save, sender=JournalNote)
+@receiver(post_delete, sender=JournalNote)
+@receiver(post_save, sender=Strategy)
+@receiver(post_delete, sender=Strategy)
+def invalidate_owner_analytics(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_invalidation(instance.user_id)
+
+
+@receiver(post_save, sender=TradeEntry)
+@receiver(post_save, sender=TradeStop)
+@receiver(post_save, sender=TradeTarget)
+@receiver(post_save, sender=TradeManualClose)
+@receiver(post_delete, sender=TradeEntry)
+@receiver(post_delete, sender=TradeStop)
+@receiver(post_delete, sender=TradeTarget)
+@receiver(post_delete, sender=TradeManualClose)
+def invalidate_leg_analytics(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_invalidation(Trade.objects.filter(
+        pk=instance.trade_id).values_list('user_id', flat=True).first())
+
+
+@receiver(post_save, sender=PortfolioTransaction)
+@receiver(post_delete, sender=PortfolioTransaction)
+def invalidate_transaction_analytics(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_invalidation(Portfolio.objects.filter(
+        pk=instance.portfolio_id).values_list('user_id', flat=True).first())
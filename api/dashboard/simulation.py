@@ -0,0 +1,115 @@
+# api/dashboard/simulation.py
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+
+# Caminhos por bloco de trabalho: fixo para que o resultado de uma semente não
+# dependa de quantos processos participam
+CHUNK_PATHS = 2000
+# A partir de quantas células (caminhos x trades) o cálculo é repartido entre processos
+PARALLEL_CELLS = 20_000_000
+# Pontos das faixas de percentis enviados ao gráfico
+BAND_POINTS = 200
+BAND_PERCENTILES = (5, 25, 50, 75, 95)
+SUMMARY_PERCENTILES = (5, 50, 95, 99)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _process_pool():
+    # Criado sob demanda e reaproveitado entre requests, com no máximo
+    # SIMULATION_PROCESSES processos por worker web. Os processos saem de um
+    # forkserver (spawn onde não há): um fork direto de um worker com threads pode
+    # herdar locks presos por outras threads e travar
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            method = ('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+                      else 'spawn')
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, min(settings.SIMULATION_PROCESSES, os.cpu_count() or 1)),
+                mp_context=multiprocessing.get_context(method))
+    return _pool
+
+
+def bootstrap_indices(rng, size, paths, horizon, block=1):
+    """
+    Índices de reamostragem por blocos circulares: cada caminho junta blocos de
+    `block` trades consecutivos a partir de inícios sorteados, preservando as
+    sequências de ganhos e perdas do histórico. block=1 é o bootstrap simples.
+    """
+    blocks = -(-horizon // block)
+    starts = rng.integers(0, size, (paths, blocks, 1))
+    return ((starts + np.arange(block)) % size).reshape(paths, blocks * block)[:, :horizon]
+
+
+def simulate_chunk(results, capital, paths, horizon, block, seed, loss_limit, columns):
+    """
+    Simula `paths` caminhos e devolve o patrimônio nas colunas `columns`, o
+    drawdown máximo e o patrimônio final de cada caminho e se o patrimônio chegou a
+    `loss_limit`. Tudo vetorizado, sem loops por caminho ou por trade.
+    """
+    rng = np.random.default_rng(seed)
+    equity = np.cumsum(results[bootstrap_indices(rng, len(results), paths, horizon, block)],
+                       axis=1)
+    equity += capital
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), capital)
+    max_drawdown = (equity - peak).min(axis=1)
+    ruined = equity.min(axis=1) <= loss_limit
+    return equity[:, columns], max_drawdown, equity[:, -1], ruined
+
+
+def _percentiles(values, percentiles=SUMMARY_PERCENTILES):
+    return {f'p{p}': round(float(value), 2)
+            for p, value in zip(percentiles, np.percentile(values, percentiles))}
+
+
+def monte_carlo(results, capital, paths=1000, horizon=None, block=1, seed=0,
+                loss_pct=20.0, parallel=None):
+    """
+    Reamostra os resultados por trade (BRL) `paths` vezes, em sequências de `horizon`
+    trades (padrão: o tamanho do histórico), a partir de `capital`. Devolve as faixas
+    de percentis do patrimônio, a distribuição do drawdown máximo e do patrimônio
+    final e a probabilidade de perder `loss_pct`% do capital em algum momento.
+    A mesma semente dá sempre o mesmo resultado, com ou sem processos.
+    """
+    results = np.asarray(results, dtype=float)
+    horizon = horizon or len(results)
+    block = max(1, min(block, len(results)))
+    loss_limit = capital * (1 - loss_pct / 100)
+    columns = np.unique(np.linspace(0, horizon - 1, min(BAND_POINTS, horizon)).astype(int))
+
+    sizes = [min(CHUNK_PATHS, paths - start) for start in range(0, paths, CHUNK_PATHS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(results, capital, size, horizon, block, chunk_seed, loss_limit, columns)
+            for size, chunk_seed in zip(sizes, seeds)]
+    if parallel is None:
+        parallel = len(jobs) > 1 and paths * horizon >= PARALLEL_CELLS
+    if parallel:
+        chunks = list(_process_pool().map(simulate_chunk, *zip(*jobs)))
+    else:
+        chunks = [simulate_chunk(*job) for job in jobs]
+
+    equity, max_drawdown, final, ruined = (np.concatenate(part) for part in zip(*chunks))
+    bands = np.percentile(equity, BAND_PERCENTILES, axis=0)
+    return {
+        'paths': paths, 'horizon': horizon, 'block': block, 'seed': seed,
+        'capital': round(float(capital), 2),
+        'equity_bands': {
+            # Passo 1 = patrimônio depois do primeiro trade simulado
+            'steps': (columns + 1).tolist(),
+            **{f'p{p}': np.round(band, 2).tolist() for p, band in zip(BAND_PERCENTILES, bands)},
+        },
+        'max_drawdown': {'mean': round(float(max_drawdown.mean()), 2),
+                         **_percentiles(max_drawdown)},
+        'final_equity': {'mean': round(float(final.mean()), 2), **_percentiles(final)},
+        'loss_pct': loss_pct,
+        'loss_threshold': round(float(loss_limit), 2),
+        'probability_of_loss': round(float(ruined.mean()), 4),
+    }
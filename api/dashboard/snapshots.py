@@ -0,0 +1,211 @@
+# api/dashboard/snapshots.py
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.utils import timezone
+
+from .analytics_cache import data_version
+from .currency_converter import convert_many
+from .models import Trade
+
+SNAPSHOT_COLUMNS = [
+    'id', 'closed_at', 'net_result', 'portfolio__currency', 'symbol', 'side', 'status',
+    'portfolio_id', 'strategy_ref',
+]
+# Colunas guardadas como códigos int32 (-1 = sem valor) + lista de categorias
+CATEGORICAL = {'symbol': 'symbol', 'side': 'side', 'status': 'status',
+               'portfolio': 'portfolio_id', 'strategy': 'strategy_ref'}
+# Um ficheiro .npy por coluna
+COLUMN_FILES = ('id', 'closed_at', 'net_cents', 'net_brl_cents', *CATEGORICAL)
+
+# Snapshots abertos (mapeados) por processo, do menos para o mais recente
+MAX_OPEN_SNAPSHOTS = 64
+# Segundos que uma versão substituída fica em disco: um leitor que leu a versão
+# antiga pouco antes da troca ainda pode estar a abri-la
+SUPERSEDED_GRACE = 300
+SNAPSHOTS = OrderedDict()
+_lock = threading.Lock()
+
+
+def _category(value):
+    # Tipos do numpy/pandas -> tipos do JSON; ids que viraram float por causa de nulos voltam a int
+    value = value.item() if hasattr(value, 'item') else value
+    return int(value) if isinstance(value, float) else value
+
+
+class TradeSnapshot:
+    """
+    Trades fechados de um utilizador em colunas NumPy: `id` (int64), `closed_at`
+    (datetime64 no fuso local), `net_cents` e `net_brl_cents` (int64, centavos na
+    moeda do portfolio e em BRL) e os códigos de symbol, side, status, portfolio e
+    strategy. Ordenados por fechamento. Carregado de disco com mmap: as páginas só
+    são lidas quando usadas e são partilhadas entre os workers. `complete` é falso
+    quando faltou a cotação de algum trade (ver build).
+    """
+
+    def __init__(self, columns, categories, complete=True):
+        self.columns = columns
+        self.categories = categories
+        self.complete = complete
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @classmethod
+    def build(cls, user_id):
+        """
+        Lê os trades fechados numa única query e converte para BRL uma única vez. Sem
+        cotação, o trade fica com o valor original (como nas leituras sem `wait`) e o
+        snapshot sai incompleto: serve o pedido, mas não é gravado.
+        """
+        rows = Trade.objects.closed().filter(user_id=user_id).with_closed_at().with_strategy(
+        ).order_by('closed_at', 'id').values_list(*SNAPSHOT_COLUMNS)
+        df = pd.DataFrame.from_records(rows, columns=SNAPSHOT_COLUMNS)
+        closed_utc = pd.to_datetime(df['closed_at'], utc=True)
+        net = df['net_result'].astype(float)
+        # O snapshot é gravado e partilhado: esperamos pelas cotações em vez de usar antigas
+        net_brl = convert_many(df['net_result'], df['portfolio__currency'], closed_utc,
+                               wait=True)
+        missing = net_brl.isna()
+        net_brl = net_brl.where(~missing, net)
+
+        columns = {
+            'id': df['id'].to_numpy(dtype=np.int64),
+            'closed_at': closed_utc.dt.tz_convert(timezone.get_current_timezone_name())
+            .dt.tz_localize(None).to_numpy(dtype='datetime64[ns]'),
+            'net_cents': np.round(net.to_numpy() * 100).astype(np.int64),
+            'net_brl_cents': np.round(net_brl.to_numpy(dtype=float) * 100).astype(np.int64),
+        }
+        categories = {}
+        for name, source in CATEGORICAL.items():
+            codes, uniques = pd.factorize(df[source])
+            columns[name] = codes.astype(np.int32)
+            categories[name] = [_category(value) for value in uniques]
+        return cls(columns, categories, complete=not missing.any())
+
+    def save(self, path):
+        """Grava uma coluna por ficheiro .npy (mapeável) e as categorias em meta.json."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name, values in self.columns.items():
+            np.save(path / f'{name}.npy', values)
+        (path / 'meta.json').write_text(json.dumps(self.categories))
+
+    @classmethod
+    def load(cls, path):
+        path = Path(path)
+        # FileNotFoundError se a pasta sumiu (ver trade_snapshot)
+        categories = json.loads((path / 'meta.json').read_text())
+        columns = {name: np.load(path / f'{name}.npy', mmap_mode='r') for name in COLUMN_FILES}
+        return cls(columns, categories)
+
+    def code(self, name, value):
+        """Código de `value` na coluna categórica `name` (-2 se não existir: não casa nada)."""
+        try:
+            return self.categories[name].index(value)
+        except ValueError:
+            return -2
+
+    def mask(self, portfolio_id=None, strategy_id=None):
+        selected = np.ones(len(self), dtype=bool)
+        if portfolio_id is not None:
+            selected &= self['portfolio'] == self.code('portfolio', portfolio_id)
+        if strategy_id is not None:
+            selected &= self['strategy'] == self.code('strategy', strategy_id)
+        return selected
+
+    def frame(self, portfolio_id=None, strategy_id=None):
+        """DataFrame com `closed_at` e `net_result_brl`, no formato de DashboardMetrics.from_frame."""
+        selected = self.mask(portfolio_id, strategy_id)
+        return pd.DataFrame({
+            'closed_at': pd.to_datetime(self['closed_at'][selected]),
+            'net_result_brl': self['net_brl_cents'][selected] / 100,
+        })
+
+    def daily(self, portfolio_id=None, strategy_id=None):
+        """Resultado em BRL por dia de fechamento (pd.Series indexada por data)."""
+        selected = self.mask(portfolio_id, strategy_id)
+        days = self['closed_at'][selected].astype('datetime64[D]')
+        unique_days, index = np.unique(days, return_inverse=True)
+        totals = np.bincount(index, weights=self['net_brl_cents'][selected],
+                             minlength=len(unique_days)) / 100
+        return pd.Series(totals, index=pd.DatetimeIndex(
+            unique_days.astype('datetime64[ns]'), name='date'))
+
+
+def _snapshot_dir(user_id):
+    return Path(settings.TRADE_SNAPSHOT_DIR) / str(user_id)
+
+
+def _remove_superseded(directory):
+    """
+    Apaga as versões substituídas há mais de SUPERSEDED_GRACE segundos. Uma versão
+    é substituída quando a seguinte é gravada (pela data de modificação da pasta).
+    """
+    now = time.time()
+    versions = sorted((entry.stat().st_mtime, entry.name) for entry in directory.iterdir()
+                      if not entry.name.startswith('.'))
+    for (_, old), (replaced_at, _) in zip(versions, versions[1:]):
+        if now - replaced_at > SUPERSEDED_GRACE:
+            shutil.rmtree(directory / old, ignore_errors=True)
+
+
+def _write_snapshot(snapshot, directory, path):
+    # Grava numa pasta temporária e renomeia: leitores nunca veem um snapshot pela metade
+    directory.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(dir=directory, prefix='.build-'))
+    snapshot.save(staging)
+    try:
+        os.rename(staging, path)
+    except OSError:
+        # Outro processo gravou a mesma versão primeiro
+        shutil.rmtree(staging, ignore_errors=True)
+    _remove_superseded(directory)
+
+
+def trade_snapshot(user_id):
+    """
+    Snapshot atual do utilizador. A versão é a de data_version, guardada no banco
+    (AnalyticsVersion) e partilhada por todos os workers: os sinais que invalidam os
+    analytics também invalidam o snapshot. Uma versão nova é construída, gravada e
+    mapeada na primeira leitura; se a pasta sumiu entretanto, é reconstruída. Um
+    snapshot incompleto (cotação em falta) não é gravado nem guardado: o pedido
+    seguinte tenta de novo.
+    """
+    version = data_version(user_id).replace(':', '-')
+    with _lock:
+        cached = SNAPSHOTS.get(user_id)
+        if cached is not None and cached[0] == version:
+            SNAPSHOTS.move_to_end(user_id)
+            return cached[1]
+
+    directory = _snapshot_dir(user_id)
+    path = directory / version
+    try:
+        snapshot = TradeSnapshot.load(path)
+    except FileNotFoundError:
+        snapshot = TradeSnapshot.build(user_id)
+        if not snapshot.complete:
+            return snapshot
+        _write_snapshot(snapshot, directory, path)
+        snapshot = TradeSnapshot.load(path)
+
+    with _lock:
+        SNAPSHOTS[user_id] = (version, snapshot)
+        SNAPSHOTS.move_to_end(user_id)
+        while len(SNAPSHOTS) > MAX_OPEN_SNAPSHOTS:
+            SNAPSHOTS.popitem(last=False)
+    return snapshot
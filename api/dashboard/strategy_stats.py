@@ -0,0 +1,102 @@
+# api/dashboard/strategy_stats.py
+
+from django.db.models import Count, Q, Sum
+
+from .models import Strategy, Trade
+
+WIN = Q(net_result__gt=0)
+LOSS = Q(net_result__lt=0)
+
+# Somas aditivas: as métricas de uma tag saem da soma das linhas das suas estratégias
+ADDITIVE_FIELDS = ('trades', 'wins', 'losses', 'net',
+                   'gross_profit', 'gross_loss', 'r_sum', 'r_count')
+
+
+def grouped_sums(user, portfolio=None, date_from=None, date_to=None):
+    """
+    Uma única query agrupada por (estratégia, moeda) com Sum/Count condicionais.
+    As datas filtram pelo fechamento do trade (closed_at, fuso local).
+    """
+    trades = Trade.objects.closed().filter(user=user)
+    if portfolio is not None:
+        trades = trades.filter(portfolio=portfolio)
+    if date_from or date_to:
+        trades = trades.with_closed_at()
+        if date_from:
+            trades = trades.filter(closed_at__date__gte=date_from)
+        if date_to:
+            trades = trades.filter(closed_at__date__lte=date_to)
+
+    return trades.with_strategy().values('strategy_ref', 'portfolio__currency').annotate(
+        trades=Count('id'),
+        wins=Count('id', filter=WIN),
+        losses=Count('id', filter=LOSS),
+        net=Sum('net_result'),
+        gross_profit=Sum('net_result', filter=WIN),
+        gross_loss=Sum('net_result', filter=LOSS),
+        r_sum=Sum('r_multiple'),
+        r_count=Count('r_multiple'),
+    ).order_by()
+
+
+def summarize(sums):
+    """Taxa de acerto, expectativa, fator de lucro e R médio a partir das somas."""
+    trades = sums['trades']
+    gross_profit = float(sums['gross_profit'] or 0)
+    gross_loss = abs(float(sums['gross_loss'] or 0))
+    net = float(sums['net'] or 0)
+    return {
+        'trades': trades,
+        'wins': sums['wins'],
+        'losses': sums['losses'],
+        'net': round(net, 2),
+        'win_rate': round(sums['wins'] / trades * 100, 2) if trades else 0.0,
+        'avg_win': round(gross_profit / sums['wins'], 2) if sums['wins'] else 0.0,
+        'avg_loss': round(-gross_loss / sums['losses'], 2) if sums['losses'] else 0.0,
+        # Expectativa = resultado médio por trade
+        'expectancy': round(net / trades, 2) if trades else 0.0,
+        'profit_factor': round(gross_profit / gross_loss, 2) if gross_loss else None,
+        'avg_r': round(float(sums['r_sum']) / sums['r_count'], 4) if sums['r_count'] else None,
+    }
+
+
+def _add(total, row):
+    for field in ADDITIVE_FIELDS:
+        total[field] = (total.get(field) or 0) + (row[field] or 0)
+
+
+def strategy_breakdown(user, portfolio=None, date_from=None, date_to=None):
+    """
+    Desempenho por estratégia e por tag, em três queries independentes do volume
+    de trades: somas agrupadas, nomes das estratégias e ligações estratégia-tag.
+    Os valores ficam na moeda de cada portfolio (uma linha por moeda).
+    """
+    rows = list(grouped_sums(user, portfolio, date_from, date_to))
+    names = dict(Strategy.objects.filter(
+        user=user).values_list('id', 'name'))
+    links = Strategy.tags.through.objects.filter(strategy__user=user).values_list(
+        'strategy_id', 'tag_id', 'tag__name')
+
+    strategies = [
+        {'strategy': row['strategy_ref'], 'name': names.get(row['strategy_ref'], 'Sem estratégia'),
+         'currency': row['portfolio__currency'], **summarize(row)}
+        for row in rows
+    ]
+
+    by_strategy = {}
+    for row in rows:
+        by_strategy.setdefault(row['strategy_ref'], []).append(row)
+    tags = {}
+    for strategy_id, tag_id, tag_name in links:
+        for row in by_strategy.get(strategy_id, ()):
+            key = (tag_id, row['portfolio__currency'])
+            total = tags.setdefault(key, {'tag': tag_id, 'name': tag_name,
+                                          'currency': row['portfolio__currency']})
+            _add(total, row)
+
+    return {
+        'strategies': sorted(strategies, key=lambda item: -item['net']),
+        'tags': sorted(({'tag': total['tag'], 'name': total['name'], 'currency': total['currency'],
+                         **summarize(total)} for total in tags.values()),
+                       key=lambda item: -item['net']),
+    }
@@ -0,0 +1,146 @@
+# api/dashboard/synthetic.py
+
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .currency_converter import FALLBACK_DAYS
+from .importers import import_trades
+from .models import (
+    ExchangeRate, ExchangeRateCoverage, JournalNote, Portfolio, Strategy, Trade,
+)
+
+# Ativos por moeda do portfolio e preço de referência
+SYMBOLS = {
+    'BRL': {'WINFUT': 125000.0, 'WDOFUT': 5000.0, 'PETR4': 38.0, 'VALE3': 62.0,
+            'ITUB4': 33.0, 'BOVA11': 120.0},
+    'USD': {'ES': 5200.0, 'NQ': 18000.0, 'AAPL': 190.0, 'MSFT': 420.0},
+}
+BASE_RATES = {'USD': 5.0, 'EUR': 5.5}
+STRATEGY_NAMES = ('Rompimento', 'Pullback', 'Reversão', 'Tendência')
+NOTE_PHRASES = (
+    'Entrada no rompimento da máxima com volume.', 'Saída antecipada por medo.',
+    'Operação disciplinada, respeitou o plano.', 'Stop curto demais, violinado.',
+    'Pullback na média de 20 com confirmação.', 'Entrada impulsiva depois do almoço.',
+)
+GENERATION_CHUNK = 10_000
+
+
+def seed_exchange_rates(start, end, currencies=tuple(BASE_RATES), seed=0):
+    """
+    Fonte de câmbio de bancada: cotações sintéticas (passeio aleatório) nos dias
+    úteis de `start` a `end`, com a cobertura marcada, para que nenhuma conversão
+    precise do BCB. Não use num banco com cotações reais.
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(start, end)
+    for currency in currencies:
+        walk = BASE_RATES.get(currency, 1.0) * np.exp(
+            np.cumsum(rng.normal(0, 0.005, len(days))))
+        ExchangeRate.objects.bulk_create([
+            ExchangeRate(currency=currency, date=day.date(), rate=Decimal(f'{rate:.6f}'))
+            for day, rate in zip(days, walk)
+        ], batch_size=5000, ignore_conflicts=True)
+        coverage = ExchangeRateCoverage.objects.filter(currency=currency).first()
+        if coverage is None:
+            ExchangeRateCoverage.objects.create(currency=currency, start_date=start, end_date=end)
+        else:
+            coverage.start_date = min(coverage.start_date, start)
+            coverage.end_date = max(coverage.end_date, end)
+            coverage.save()
+
+
+def synthetic_rows(count, currency='BRL', start=None, end=None, seed=0):
+    """
+    Linhas de extrato (formato de dashboard/importers.py) geradas em blocos
+    vetorizados: 70% day trade, 5% ainda abertos, alvos e stops coerentes com o preço.
+    """
+    rng = np.random.default_rng(seed)
+    end = end or timezone.localdate()
+    start = start or end - timedelta(days=3 * 365)
+    days = pd.bdate_range(start, end).to_numpy()
+    symbols = np.array(list(SYMBOLS[currency]))
+    references = np.array(list(SYMBOLS[currency].values()))
+
+    for offset in range(0, count, GENERATION_CHUNK):
+        size = min(GENERATION_CHUNK, count - offset)
+        picked = rng.integers(0, len(symbols), size)
+        buy = rng.random(size) < 0.6
+        direction = np.where(buy, 1.0, -1.0)
+        entry_at = (rng.choice(days, size) + np.timedelta64(10, 'h') +
+                    rng.integers(0, 7 * 60, size).astype('timedelta64[m]'))
+        intraday = rng.random(size) < 0.7
+        holding = np.where(intraday, rng.integers(5, 300, size) * 60,
+                           rng.integers(1, 20, size) * 86400).astype('timedelta64[s]')
+        entry_price = references[picked] * np.exp(rng.normal(0, 0.1, size))
+        move = rng.normal(0.001, 0.01, size)
+        exit_price = entry_price * (1 + move * direction)
+        stop_price = entry_price * (1 - 0.01 * direction)
+        quantity = rng.integers(1, 10, size)
+        fees = rng.uniform(0, 5, size)
+        is_open = rng.random(size) < 0.05
+        exit_type = np.where(move > 0.005, 'target', np.where(move < -0.008, 'stop', 'manual'))
+
+        for i in range(size):
+            closed = not is_open[i]
+            yield {
+                'symbol': symbols[picked[i]],
+                'side': 'BUY' if buy[i] else 'SELL',
+                'entry_date': pd.Timestamp(entry_at[i]).to_pydatetime(),
+                'entry_price': round(float(entry_price[i]), 2),
+                'quantity': int(quantity[i]),
+                'exit_date': pd.Timestamp(entry_at[i] + holding[i]).to_pydatetime() if closed else None,
+                'exit_price': round(float(exit_price[i]), 2) if closed else None,
+                'exit_type': exit_type[i],
+                'stop_price': round(float(stop_price[i]), 2),
+                'fees': round(float(fees[i]), 2),
+            }
+
+
+def generate_synthetic_data(users=1, trades=10_000, seed=0, prefix='bench', years=3,
+                            batch_size=5000):
+    """
+    Cria `users` utilizadores ({prefix}-0, {prefix}-1...) com dois portfolios (BRL
+    e USD), estratégias, `trades` trades com pernas cada um (80% no portfolio em
+    BRL) e notas de journal em 10% deles. Tudo é reprodutível a partir de `seed`.
+    Devolve a lista de utilizadores criados.
+    """
+    end = timezone.localdate()
+    start = end - timedelta(days=365 * years)
+    # A conversão procura a cotação até FALLBACK_DAYS antes da data do trade
+    seed_exchange_rates(start - timedelta(days=FALLBACK_DAYS), end, seed=seed)
+    rng = np.random.default_rng(seed)
+
+    created = []
+    for index in range(users):
+        user = User.objects.create_user(username=f'{prefix}-{index}', password=prefix)
+        portfolios = {
+            'BRL': Portfolio.objects.create(user=user, name='B3', currency='BRL',
+                                            balance=100000),
+            'USD': Portfolio.objects.create(user=user, name='CME', currency='USD',
+                                            balance=20000),
+        }
+        domestic = int(trades * 0.8)
+        for currency, count in (('BRL', domestic), ('USD', trades - domestic)):
+            import_trades(user, portfolios[currency],
+                          synthetic_rows(count, currency, start, end, seed=seed + index),
+                          batch_size=batch_size)
+
+        strategies = [Strategy.objects.create(user=user, name=name) for name in STRATEGY_NAMES]
+        trade_ids = np.array(Trade.objects.filter(user=user).values_list('id', flat=True))
+        noted = rng.choice(trade_ids, size=len(trade_ids) // 10, replace=False)
+        with transaction.atomic():
+            JournalNote.objects.bulk_create([
+                JournalNote(user=user, trade_id=int(trade_id),
+                            strategy=strategies[rng.integers(len(strategies))],
+                            confidence_level=int(rng.integers(1, 11)),
+                            notes=' '.join(rng.choice(NOTE_PHRASES, 2)))
+                for trade_id in noted
+            ], batch_size=batch_size)
+        created.append(user)
+    return created
@@ -0,0 +1,274 @@
+# api/dashboard/tax.py
+
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime, time
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .currency_converter import convert_many
+from .instrumentation import timed
+from .models import TaxMonth, Trade, TradeEntry, TradeManualClose, TradeTarget
+
+logger = logging.getLogger(__name__)
+
+# Regras de IR sobre renda variável (pessoa física)
+DAY_TRADE_RATE = 0.20
+SWING_RATE = 0.15
+SWING_EXEMPTION_LIMIT = 20000.0
+# IRRF ("dedo-duro"): 1% do resultado positivo diário de day trade e
+# 0,005% do valor das vendas das operações comuns
+DAY_TRADE_IRRF = 0.01
+SWING_IRRF = 0.00005
+# DARF abaixo de R$ 10 não é pago: o valor passa para o mês seguinte
+DARF_MINIMUM = 10.0
+
+# Só ações (ON, PN e classes) têm a isenção de R$ 20 mil; ETFs, FIIs, BDRs e
+# derivativos (WIN, WDO...) são tributados mesmo abaixo do limite
+STOCK_SYMBOL = re.compile(r'^[A-Z]{4}[3-8]F?$')
+
+TAX_COLUMNS = [
+    'side', 'symbol', 'net_result', 'portfolio__currency', 'opened_at', 'closed_at',
+    'last_manual_close', 'last_target', 'entry_notional', 'exit_notional', 'target_notional',
+]
+
+
+def _notional(model, **filters):
+    """Subquery com a soma de preço x quantidade das pernas de um trade."""
+    legs = model.objects.filter(trade=OuterRef('pk'), **filters).values('trade').annotate(
+        total=Sum(F('price') * F('quantity'))).values('total')[:1]
+    return Subquery(legs, output_field=DecimalField(max_digits=20, decimal_places=5))
+
+
+def _local_midnight(day):
+    return datetime.combine(day, time.min, tzinfo=timezone.get_current_timezone())
+
+
+def tax_frame(user, start=None, end=None, wait=False):
+    """
+    Trades fechados entre `start` (inclusive) e `end` (exclusivo), datas locais, numa
+    única query: resultado e valor de venda em BRL, mês, dia, day trade e se é ação.
+    `wait`: ver convert_many.
+    """
+    trades = Trade.objects.closed().filter(user=user).with_closed_at().with_opened_at()
+    if start is not None:
+        trades = trades.filter(closed_at__gte=_local_midnight(start))
+    if end is not None:
+        trades = trades.filter(closed_at__lt=_local_midnight(end))
+    rows = trades.annotate(
+        entry_notional=_notional(TradeEntry),
+        exit_notional=_notional(TradeManualClose),
+        target_notional=_notional(TradeTarget, target_date__isnull=False),
+    ).values_list(*TAX_COLUMNS)
+    df = pd.DataFrame.from_records(rows, columns=TAX_COLUMNS)
+
+    tz_name = timezone.get_current_timezone_name()
+    closed_utc = pd.to_datetime(df['closed_at'], utc=True)
+    closed_day = closed_utc.dt.tz_convert(tz_name).dt.tz_localize(None).dt.normalize()
+    opened_day = pd.to_datetime(df['opened_at'], utc=True).dt.tz_convert(
+        tz_name).dt.tz_localize(None).dt.normalize()
+    has_exit = df['last_manual_close'].notna() | df['last_target'].notna()
+
+    # Venda: a saída de uma compra ou a entrada de uma venda a descoberto
+    notional = df[['entry_notional', 'exit_notional', 'target_notional']].astype(float).fillna(0.0)
+    sales = np.where(df['side'] == 'BUY',
+                     notional['exit_notional'] + notional['target_notional'],
+                     notional['entry_notional'])
+
+    return pd.DataFrame({
+        'month': closed_day.dt.to_period('M').dt.to_timestamp(),
+        'day': closed_day,
+        'day_trade': (has_exit & (opened_day == closed_day)).to_numpy(),
+        'stock': df['symbol'].str.match(STOCK_SYMBOL).fillna(False).astype(bool).to_numpy(),
+        'net': convert_many(df['net_result'], df['portfolio__currency'], closed_utc,
+                            wait=wait).astype(float),
+        'sales': convert_many(pd.Series(sales, index=df.index), df['portfolio__currency'],
+                              closed_utc, wait=wait).astype(float),
+    })
+
+
+@dataclass
+class TaxState:
+    """Saldos que passam de um mês para o outro."""
+    day_trade_loss: float = 0.0
+    swing_loss: float = 0.0
+    irrf_carry: float = 0.0
+    darf_carry: float = 0.0
+
+    @classmethod
+    def after(cls, tax_month):
+        if tax_month is None:
+            return cls()
+        return cls(float(tax_month.day_trade_loss_carry), float(tax_month.swing_loss_carry),
+                   float(tax_month.irrf_carry), float(tax_month.darf_carry))
+
+
+def _offset(result, loss):
+    """Compensa o prejuízo acumulado: devolve (base tributável, prejuízo restante)."""
+    if result <= 0:
+        return 0.0, loss - result
+    used = min(result, loss)
+    return result - used, loss - used
+
+
+def _money(value):
+    return Decimal(f'{value:.2f}')
+
+
+@timed('pandas')
+def compute_tax_months(frame, state, months):
+    """
+    Apura em sequência os meses de `months` (primeiros dias) a partir de `state`.
+    A agregação por mês é vetorizada; só a compensação de prejuízos, que depende do
+    mês anterior, percorre os meses. Devolve dicts com os campos de TaxMonth.
+    """
+    day_trade = frame['day_trade'].to_numpy()
+    stock = frame['stock'].to_numpy()
+    net = frame['net'].to_numpy()
+    sales = frame['sales'].to_numpy()
+    monthly = frame.assign(
+        day_trade_net=np.where(day_trade, net, 0.0),
+        swing_stock=np.where(~day_trade & stock, net, 0.0),
+        swing_other=np.where(~day_trade & ~stock, net, 0.0),
+        stock_sales=np.where(~day_trade & stock, sales, 0.0),
+        swing_sales=np.where(~day_trade, sales, 0.0),
+    ).groupby('month')[['day_trade_net', 'swing_stock', 'swing_other',
+                        'stock_sales', 'swing_sales']].sum().reindex(months, fill_value=0.0)
+
+    daily_day_trade = frame[day_trade].groupby(['month', 'day'])['net'].sum()
+    day_trade_irrf = (daily_day_trade.clip(lower=0) * DAY_TRADE_IRRF).groupby(
+        level='month').sum().reindex(months, fill_value=0.0)
+
+    results = []
+    for month, row in zip(months, monthly.itertuples()):
+        exempt = row.stock_sales <= SWING_EXEMPTION_LIMIT
+        # No mês isento, o lucro com ações não é tributado, mas o prejuízo continua compensável
+        swing = row.swing_other + \
+            (min(row.swing_stock, 0.0) if exempt else row.swing_stock)
+        day_trade_base, state.day_trade_loss = _offset(
+            row.day_trade_net, state.day_trade_loss)
+        swing_base, state.swing_loss = _offset(swing, state.swing_loss)
+        tax = day_trade_base * DAY_TRADE_RATE + swing_base * SWING_RATE
+
+        irrf = day_trade_irrf[month] + row.swing_sales * SWING_IRRF
+        available = irrf + state.irrf_carry
+        deducted = min(tax, available)
+        state.irrf_carry = available - deducted
+
+        due = tax - deducted + state.darf_carry
+        darf = due if due >= DARF_MINIMUM else 0.0
+        state.darf_carry = due - darf
+
+        results.append({
+            'month': month.date(),
+            'day_trade_result': _money(row.day_trade_net),
+            'swing_result': _money(row.swing_stock + row.swing_other),
+            'stock_sales': _money(row.stock_sales),
+            'swing_exempt': bool(exempt and row.swing_stock > 0),
+            'day_trade_loss_carry': _money(state.day_trade_loss),
+            'swing_loss_carry': _money(state.swing_loss),
+            'irrf': _money(irrf),
+            'irrf_carry': _money(state.irrf_carry),
+            'tax_due': _money(tax),
+            'darf_amount': _money(darf),
+            'darf_carry': _money(state.darf_carry),
+        })
+    return results
+
+
+def _month_range(start, end):
+    """Primeiros dias dos meses de `start` até antes de `end`."""
+    return pd.date_range(start, end, freq='MS', inclusive='left')
+
+
+def pending_tax_months(user, until=None, wait=False):
+    """
+    Apura, sem gravar, os meses fechados ainda sem TaxMonth, continuando do último
+    mês gravado: só os trades desses meses são lidos. `until` é o primeiro dia do
+    mês em aberto (padrão: o mês atual, que só é fechado quando termina).
+    Devolve dicts com os campos de TaxMonth. Com `wait`, as cotações vêm sempre
+    do BCB, nunca antigas (ver get_rate_series), e a apuração para antes do primeiro
+    mês com algum resultado sem cotação: esse e os seguintes ficam por apurar.
+    """
+    until = until or timezone.localdate().replace(day=1)
+    last = TaxMonth.objects.filter(user=user).order_by('-month').first()
+    start = None
+    if last is not None:
+        start = (pd.Timestamp(last.month) + pd.offsets.MonthBegin(1)).date()
+        if start >= until:
+            return []
+
+    frame = tax_frame(user, start, until, wait=wait)
+    if start is None:
+        if frame.empty:
+            return []
+        start = frame['month'].min().date()
+    if wait:
+        missing = frame.loc[frame[['net', 'sales']].isna().any(axis=1), 'month']
+        if not missing.empty:
+            until = min(until, missing.min().date())
+            logger.warning('Apuração de IR parada em %s: falta a cotação do câmbio.', until)
+            frame = frame[frame['month'] < pd.Timestamp(until)]
+    months = _month_range(start, until)
+    if months.empty:
+        return []
+    return compute_tax_months(frame, TaxState.after(last), months)
+
+
+def close_tax_months(user, until=None):
+    """Grava os meses de pending_tax_months (ver o comando close_tax_months)."""
+    rows = pending_tax_months(user, until, wait=True)
+    TaxMonth.objects.bulk_create([TaxMonth(user=user, **row) for row in rows],
+                                 ignore_conflicts=True)
+    return rows
+
+
+def tax_report(user, year, today):
+    """
+    Relatório de IR do ano: meses gravados, meses fechados ainda por gravar (apurados
+    sem gravar) e, no ano corrente, a prévia do mês em aberto em `current`.
+    """
+    pending = pending_tax_months(user, today.replace(day=1))
+    months = list(TaxMonth.objects.filter(
+        user=user, month__year=year).order_by('month').values(
+        'month', 'day_trade_result', 'swing_result', 'stock_sales', 'swing_exempt',
+        'day_trade_loss_carry', 'swing_loss_carry', 'irrf', 'irrf_carry',
+        'tax_due', 'darf_amount', 'darf_carry'))
+    months += [row for row in pending if row['month'].year == year]
+    current = None
+    if year == today.year:
+        current = preview_month(user, today.replace(day=1), pending[-1] if pending else None)
+    return {'year': year, 'months': months, 'current': current}
+
+
+def preview_month(user, month, previous=None):
+    """
+    Apuração parcial (não gravada) do mês em aberto. Parte de `previous` (dict de
+    pending_tax_months com o mês anterior) ou do último mês gravado.
+    """
+    if previous is not None:
+        last = TaxMonth(user=user, **previous)
+    else:
+        last = TaxMonth.objects.filter(
+            user=user, month__lt=month).order_by('-month').first()
+    end = (pd.Timestamp(month) + pd.offsets.MonthBegin(1)).date()
+    frame = tax_frame(user, month, end)
+    return compute_tax_months(frame, TaxState.after(last), _month_range(month, end))[0]
+
+
+def reopen_tax_months(user_id, day):
+    """Descarta a apuração do mês de `day` em diante (um trade desses meses mudou)."""
+    TaxMonth.objects.filter(user_id=user_id, month__gte=day.replace(day=1)).delete()
+
+
+def reset_tax_months(user=None):
+    """Descarta toda a apuração (de um utilizador ou de todos), ex.: depois de uma importação."""
+    months = TaxMonth.objects.all()
+    if user is not None:
+        months = months.filter(user=user)
+    months.delete()
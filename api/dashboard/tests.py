@@ -1,3 +1,1726 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipIf, skipUnless
+from datetime import datetime, timedelta, timezone as dt_timezone
+from importlib import import_module
+from importlib.util import find_spec
+from decimal import Decimal
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+import requests
+
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Q
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, modify_settings, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .accounting import recompute_trades
+from .async_views import close_analytics_connections, gather_analytics
+from .analytics_cache import analytics_key, data_version, invalidate_analytics
+from .benchmarks import compare, run_benchmarks
+from .charts import lttb
+from . import currency_converter, simulation, snapshots
+from .forex import RATE_MATRICES, rate_matrix
+from .importers import import_trades, read_csv_rows
+from .management.commands.benchmark_http import latency_summary
+from .instrumentation import RequestInstrumentationMiddleware, logger, timed
+from .journal_search import search_notes
+from .ledger import balance_as_of, balance_history, checkpoint_balances
+from .metrics import DashboardMetrics
+from .rate_fetcher import SingleFlightFetcher
+from .rollups import rebuild_daily_pnl
+from .simulation import bootstrap_indices, monte_carlo
+from .snapshots import SNAPSHOTS, TradeSnapshot, trade_snapshot
+from .strategy_stats import strategy_breakdown
+from .synthetic import generate_synthetic_data
+from .tax import close_tax_months, pending_tax_months
+from .time_metrics import time_metrics
+from .models import BalanceLedgerEntry, ExchangeRate, ExchangeRateCoverage, JournalNote, Strategy, Tag, TaxMonth, DailyPnL, Portfolio, PortfolioTransaction, Trade, TradeEntry, TradeManualClose, TradeStop, TradeTarget
+
+
+def create_trade(user, portfolio, net_result, status='CLOSED_MANUAL', closed_at=None):
+    trade = Trade.objects.create(
+        user=user, portfolio=portfolio, symbol='WINFUT', side='BUY',
+        net_result=net_result, status=status)
+    if closed_at is not None:
+        TradeManualClose.objects.create(
+            trade=trade, price=100, quantity=1, close_date=closed_at)
+    return trade
+
+
+class QueryPlanTests(TestCase):
+    """
+    Garante, via EXPLAIN, que as queries quentes usam os índices compostos.
+    Uma mudança de schema que reintroduza um scan sequencial quebra estes testes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='trader', password='x')
+        cls.portfolio = Portfolio.objects.create(user=cls.user, name='B3')
+        for i in range(5):
+            create_trade(cls.user, cls.portfolio, 10 * i,
+                         closed_at=datetime(2024, 1, i + 1, 15, tzinfo=dt_timezone.utc))
+        create_trade(cls.user, cls.portfolio, 0, status='OPEN')
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Com poucas linhas o Postgres prefere o seq scan; desligamos para ver
+            # se existe um índice utilizável para o plano
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        elif connection.vendor != 'sqlite':
+            self.skipTest('Plano de execução verificado apenas em SQLite e Postgres.')
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, table, *index_names):
+        plan = self.explain(queryset)
+        self.assertTrue(any(name in plan for name in index_names),
+                        f'Nenhum dos índices {index_names} foi usado:\n{plan}')
+        if connection.vendor == 'sqlite':
+            self.assertNotRegex(plan, rf'SCAN {table}\b(?! USING)')
+        else:
+            self.assertNotIn(f'Seq Scan on {table}', plan)
+
+    def test_trade_list_uses_user_created_index(self):
+        queryset = Trade.objects.filter(
+            user=self.user).order_by('-created_at')
+        self.assertUsesIndex(queryset, 'dashboard_trade',
+                             'trade_user_created_idx')
+
+    def test_keyset_page_uses_user_created_index(self):
+        cursor = datetime(2024, 1, 3, tzinfo=dt_timezone.utc)
+        queryset = Trade.objects.filter(user=self.user).order_by('-created_at', '-id').filter(
+            created_at__lte=cursor).filter(Q(created_at__lt=cursor) | Q(id__lt=3))[:50]
+        self.assertUsesIndex(queryset, 'dashboard_trade',
+                             'trade_user_created_idx')
+
+    def test_status_filter_uses_composite_index(self):
+        queryset = Trade.objects.filter(
+            user=self.user, status='CLOSED_MANUAL').order_by('-created_at')
+        self.assertUsesIndex(queryset, 'dashboard_trade',
+                             'trade_user_status_created_idx')
+
+    def test_open_trades_use_index(self):
+        queryset = Trade.objects.filter(
+            user=self.user, status='OPEN').order_by('-created_at')
+        self.assertUsesIndex(queryset, 'dashboard_trade',
+                             'trade_open_user_created_idx', 'trade_user_status_created_idx')
+
+    def test_closed_at_subqueries_use_leg_indexes(self):
+        queryset = Trade.objects.closed().filter(user=self.user).with_closed_at()
+        self.assertUsesIndex(queryset, 'dashboard_trademanualclose',
+                             'trade_close_trade_date_idx')
+        self.assertUsesIndex(queryset, 'dashboard_tradetarget',
+                             'trade_target_trade_date_idx')
+
+    def test_daily_pnl_range_uses_user_date_index(self):
+        queryset = DailyPnL.objects.filter(
+            user=self.user, date__gte=datetime(2024, 1, 1).date())
+        self.assertUsesIndex(queryset, 'dashboard_dailypnl',
+                             'daily_pnl_user_date_idx')
+
+
+class DashboardMetricsTests(TestCase):
+    def test_kpis_from_frame(self):
+        frame = pd.DataFrame({
+            'closed_at': pd.to_datetime(['2023-12-29 10:00', '2024-03-01 11:00',
+                                         '2024-03-04 09:00', '2024-03-04 16:00']),
+            'net_result_brl': [50.0, -20.0, 30.0, np.nan],
+        })
+        kpis = DashboardMetrics.from_frame(frame, datetime(2024, 3, 10).date(), 1000)
+        self.assertEqual(kpis.total_pl, 60.0)
+        self.assertEqual(kpis.last_trade_day, datetime(2024, 3, 4).date())
+        self.assertEqual(kpis.gains_last_day, 30.0)
+        self.assertEqual((kpis.gains_this_month, kpis.gains_this_year), (10.0, 10.0))
+        self.assertEqual(kpis.month_percentage, 1.0)
+        self.assertEqual((kpis.trade_count, kpis.winning_trades, kpis.losing_trades), (4, 2, 1))
+        self.assertEqual(kpis.win_rate, 50.0)
+        self.assertEqual((kpis.month_trade_count, kpis.month_winning_trades), (3, 1))
+
+        empty = DashboardMetrics.from_frame(frame.iloc[:0], datetime(2024, 3, 10).date(), 1000)
+        self.assertEqual((empty.trade_count, empty.total_balance), (0, 1000.0))
+
+    def test_endpoint_uses_closed_trades_only(self):
+        user = User.objects.create_user(username='trader', password='x')
+        portfolio = Portfolio.objects.create(user=user, name='B3', balance=1000)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_trade(user, portfolio, 80, closed_at=datetime(2024, 3, 1, 15, tzinfo=dt_timezone.utc))
+            create_trade(user, portfolio, -30, closed_at=datetime(2024, 3, 2, 15, tzinfo=dt_timezone.utc))
+            create_trade(user, portfolio, 500, status='OPEN')
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.settings(TRADE_SNAPSHOT_DIR=directory):
+            response = client.get(reverse('dashboard:api_metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['trade_count'], 2)
+        self.assertEqual(response.data['total_pl'], 50.0)
+        self.assertEqual(response.data['total_balance'], 1050.0)
+
+
+class QueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='trader', password='x')
+        cls.portfolio = Portfolio.objects.create(
+            user=cls.user, name='B3', balance=1000)
+
+    def test_dashboard_metrics_query_count_is_constant(self):
+        data_version(self.user.pk)
+        for trade_count in (1, 20):
+            with self.captureOnCommitCallbacks(execute=True):
+                for i in range(trade_count):
+                    create_trade(self.user, self.portfolio, 5,
+                                 closed_at=datetime(2024, 2, 1, 15, tzinfo=dt_timezone.utc))
+            # Versão dos dados, leitura dos trades fechados para o snapshot e saldos
+            with self.assertNumQueries(3):
+                kpis = DashboardMetrics(self.user).compute()
+            self.assertEqual(kpis.trade_count,
+                             Trade.objects.closed().filter(user=self.user).count())
+            # Sem alterações, o snapshot em disco é reaproveitado
+            with self.assertNumQueries(2):
+                DashboardMetrics(self.user).compute()
+
+
+class DailyPnLSignalTests(TestCase):
+    """O DailyPnL mantido pelos sinais tem de ser igual ao de uma reconstrução completa."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='trader', password='x')
+        self.b3 = Portfolio.objects.create(user=self.user, name='B3')
+        self.other = Portfolio.objects.create(user=self.user, name='Outro')
+
+    def at(self, day, hour=15):
+        return datetime(2024, 3, day, hour, tzinfo=dt_timezone.utc)
+
+    def rows(self):
+        return sorted(DailyPnL.objects.filter(user=self.user).values_list(
+            'portfolio_id', 'date', 'gross', 'fees', 'net', 'net_brl', 'wins', 'losses', 'count'))
+
+    def assertMatchesRebuild(self, expected_days):
+        incremental = self.rows()
+        rebuild_daily_pnl(self.user)
+        self.assertEqual(incremental, self.rows())
+        self.assertEqual([(portfolio, day.day) for portfolio, day, *_ in incremental],
+                         expected_days)
+
+    def test_signals_match_full_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            trade = create_trade(self.user, self.b3, 50, closed_at=self.at(1))
+            create_trade(self.user, self.b3, -20, closed_at=self.at(1, 18))
+        self.assertMatchesRebuild([(self.b3.pk, 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            trade.net_result = 70
+            trade.fees = 2
+            trade.save()
+        self.assertMatchesRebuild([(self.b3.pk, 1)])
+
+        # Uma perna de alvo mais recente muda o dia do fechamento
+        with self.captureOnCommitCallbacks(execute=True):
+            target = TradeTarget.objects.create(
+                trade=trade, price=110, quantity=1, target_date=self.at(4))
+        self.assertMatchesRebuild([(self.b3.pk, 1), (self.b3.pk, 4)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            target.target_date = self.at(6)
+            target.save()
+        self.assertMatchesRebuild([(self.b3.pk, 1), (self.b3.pk, 6)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            trade.portfolio = self.other
+            trade.save()
+        self.assertMatchesRebuild([(self.b3.pk, 1), (self.other.pk, 6)])
+
+        # Sem o alvo, o trade volta ao dia do fechamento manual
+        with self.captureOnCommitCallbacks(execute=True):
+            target.delete()
+        self.assertMatchesRebuild([(self.b3.pk, 1), (self.other.pk, 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            trade.manual_closes.get().delete()
+            trade.status = 'OPEN'
+            trade.save()
+        self.assertMatchesRebuild([(self.b3.pk, 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Trade.objects.filter(user=self.user).delete()
+        self.assertMatchesRebuild([])
+
+    def test_days_without_rate_wait_for_the_rates(self):
+        usd = Portfolio.objects.create(user=self.user, name='CME', currency='USD')
+        # Busca no BCB falhou: o dia em USD não é gravado como se fosse BRL
+        with mock.patch.object(currency_converter, 'load_rates', return_value=False), \
+                self.assertLogs('dashboard', 'WARNING'), \
+                self.captureOnCommitCallbacks(execute=True):
+            create_trade(self.user, usd, 10, closed_at=self.at(4))
+            create_trade(self.user, self.b3, 5, closed_at=self.at(4))
+        self.assertEqual([portfolio for portfolio, *_ in self.rows()], [self.b3.pk])
+
+        # As cotações chegam numa busca posterior
+        ExchangeRate.objects.create(currency='USD', date=datetime(2024, 3, 1).date(), rate=5)
+        with mock.patch.object(currency_converter, 'load_rates', return_value=True):
+            currency_converter.rates_loaded.send(
+                sender=ExchangeRate, currency='USD', start=datetime(2024, 3, 1).date(),
+                end=datetime(2024, 3, 1).date())
+        self.assertEqual([(portfolio, net_brl) for portfolio, _, _, _, _, net_brl, *_
+                          in self.rows()], [(self.b3.pk, 5), (usd.pk, 50)])
+
+
+class TradeListAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='trader', password='x')
+        cls.portfolio = Portfolio.objects.create(user=cls.user, name='B3')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_trades_with_legs(self, count):
+        for i in range(count):
+            trade = create_trade(self.user, self.portfolio, 10,
+                                 closed_at=datetime(2024, 3, 1, 15, tzinfo=dt_timezone.utc))
+            TradeEntry.objects.create(trade=trade, price=100, quantity=2)
+            TradeStop.objects.create(trade=trade, price=95)
+            TradeTarget.objects.create(trade=trade, price=110, quantity=1)
+
+    def test_returns_nested_legs(self):
+        self.create_trades_with_legs(1)
+        response = self.client.get(reverse('dashboard:api_trade_list'))
+        self.assertEqual(response.status_code, 200)
+        trade = response.json()['results'][0]
+        self.assertEqual(trade['portfolio_name'], 'B3')
+        self.assertEqual(len(trade['entries']), 1)
+        self.assertEqual(len(trade['stops']), 1)
+        self.assertEqual(len(trade['targets']), 1)
+        self.assertEqual(len(trade['manual_closes']), 1)
+
+    def test_query_count_does_not_grow_with_trades(self):
+        for trade_count in (1, 25):
+            self.create_trades_with_legs(trade_count)
+            # trades (com portfolio e user) + uma query por tipo de perna
+            with self.assertNumQueries(5):
+                self.client.get(reverse('dashboard:api_trade_list'))
+
+    def test_cursor_pagination_walks_every_trade_once(self):
+        self.create_trades_with_legs(7)
+        # Empates em created_at são desfeitos pelo id
+        Trade.objects.filter(user=self.user).update(
+            created_at=datetime(2024, 3, 1, tzinfo=dt_timezone.utc))
+
+        seen = []
+        url = reverse('dashboard:api_trade_list') + '?page_size=3'
+        while url:
+            with self.assertNumQueries(5):
+                page = self.client.get(url).json()
+            seen.extend(trade['id'] for trade in page['results'])
+            url = page['next']
+
+        expected = list(Trade.objects.filter(
+            user=self.user).order_by('-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(
+            reverse('dashboard:api_trade_list') + '?cursor=nao-e-um-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_sparse_fieldset_skips_related_lookups(self):
+        self.create_trades_with_legs(3)
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse('dashboard:api_trade_list') + '?fields=id,symbol,net_result')
+        self.assertEqual(set(response.json()['results'][0]),
+                         {'id', 'symbol', 'net_result'})
+
+
+class TradeExportAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='trader', password='x')
+        cls.portfolio = Portfolio.objects.create(user=cls.user, name='B3')
+        for i in range(3):
+            trade = create_trade(cls.user, cls.portfolio, 10 * (i + 1),
+                                 closed_at=datetime(2024, 4, 1, 15, tzinfo=dt_timezone.utc))
+            TradeEntry.objects.create(trade=trade, price=100, quantity=1)
+            TradeEntry.objects.create(trade=trade, price=110, quantity=3)
+        # Saída no alvo (parcial a 120 e o resto a 130), sem fechamento manual
+        cls.target_trade = create_trade(cls.user, cls.portfolio, 70, status='CLOSED_TARGET')
+        TradeEntry.objects.create(trade=cls.target_trade, price=100, quantity=4)
+        TradeStop.objects.create(trade=cls.target_trade, price=95)
+        for price, quantity, day in ((120, 1, 2), (130, 3, 3), (140, 1, None)):
+            TradeTarget.objects.create(
+                trade=cls.target_trade, price=price, quantity=quantity,
+                target_date=day and datetime(2024, 4, day, 15, tzinfo=dt_timezone.utc))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, export_format):
+        response = self.client.get(
+            reverse('dashboard:api_trade_export') + f'?format={export_format}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_streams_one_row_per_trade(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('csv'))))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0]['entry_count'], '2')
+        self.assertEqual(float(rows[0]['avg_entry_price']), 107.5)
+        self.assertEqual(float(rows[2]['net_result_brl']), 30.0)
+        # Alvos executados contam como saídas; o alvo sem data ainda não
+        self.assertEqual(rows[3]['close_count'], '2')
+        self.assertEqual(float(rows[3]['avg_close_price']), 127.5)
+        self.assertTrue(rows[3]['last_close_date'].startswith('2024-04-03'))
+
+    def test_ndjson_export_includes_legs(self):
+        records = [json.loads(line)
+                   for line in self.export('ndjson').splitlines()]
+        self.assertEqual(len(records), 4)
+        self.assertEqual(len(records[0]['entries']), 2)
+        self.assertEqual(len(records[0]['manual_closes']), 1)
+        self.assertEqual(len(records[3]['targets']), 3)
+        self.assertEqual(records[3]['stops'][0]['price'], '95.00000')
+        self.assertEqual(records[3]['close_count'], 2)
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get(
+            reverse('dashboard:api_trade_export') + '?format=xml')
+        self.assertEqual(response.status_code, 400)
+
+
+class TradeImportTests(TestCase):
+    STATEMENT = (
+        'symbol;side;entry_date;entry_price;quantity;exit_date;exit_price;exit_type;stop_price;fees\n'
+        'PETR4;C;02/01/2024 10:00;30,00;100;02/01/2024 15:00;31,50;target;29,00;5\n'
+        'VALE3;V;2024-01-03 11:00;70;10;2024-01-03 16:00;71;stop;;0\n'
+        'ITUB4;C;03/01/2024 11:00;25;50;;;;;\n'
+        'BBAS3;X;03/01/2024 11:00;25;50;;;;;\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='trader', password='x')
+        cls.portfolio = Portfolio.objects.create(user=cls.user, name='B3')
+
+    def run_import(self):
+        rows = read_csv_rows(io.BytesIO(self.STATEMENT.encode()))
+        return import_trades(self.user, self.portfolio, rows, batch_size=2)
+
+    def test_imports_trades_with_legs(self):
+        result = self.run_import()
+        self.assertEqual(result.created, 3)
+        self.assertEqual([error['line'] for error in result.errors], [5])
+
+        petr = Trade.objects.get(symbol='PETR4')
+        self.assertEqual(petr.status, 'CLOSED_TARGET')
+        self.assertEqual(str(petr.net_result), '145.00')
+        self.assertEqual(petr.targets.count(), 1)
+        self.assertEqual(petr.stops.count(), 1)
+        # Campos derivados já calculados na importação
+        self.assertEqual((petr.avg_entry_price, petr.r_multiple), (30, Decimal('1.45')))
+        self.assertEqual(Trade.objects.get(symbol='VALE3').net_result, -10)
+        self.assertEqual(Trade.objects.get(symbol='ITUB4').status, 'OPEN')
+        self.assertEqual(DailyPnL.objects.filter(user=self.user).count(), 2)
+
+    def test_non_finite_and_oversized_numbers_are_row_errors(self):
+        rows = [
+            {'symbol': 'PETR4', 'side': 'C', 'entry_date': '2024-01-02', 'entry_price': '30',
+             'quantity': quantity}
+            for quantity in ('nan', 'inf', '1e30', '10')
+        ]
+        rows[3]['entry_price'] = 'NaN'
+        result = import_trades(self.user, self.portfolio, rows)
+        self.assertEqual(result.created, 0)
+        self.assertEqual([error['line'] for error in result.errors], [2, 3, 4, 5])
+        self.assertIn('fora do limite', result.errors[2]['error'])
+
+    def test_read_error_midway_keeps_rollups_in_sync(self):
+        line = 'PETR4;C;2024-01-02 10:00;30;{};2024-01-02 15:00;31;manual;;0\n'
+        content = (self.STATEMENT.splitlines(keepends=True)[0]
+                   + ''.join(line.format(quantity) for quantity in range(1, 1201))).encode()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(content + b'PETR4;C;\xff\xfe;30;1\n')
+        self.assertEqual(response.status_code, 400)
+        # O primeiro bloco ficou gravado e o DailyPnL acompanha-o
+        self.assertEqual(Trade.objects.filter(user=self.user).count(), 1000)
+        self.assertEqual(DailyPnL.objects.get(user=self.user).count, 1000)
+
+        response = self.upload(content[:200] + b'"aberto' + b'x' * 200_000)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('CSV malformado', response.data['detail'])
+
+    def test_reimport_skips_duplicates(self):
+        self.run_import()
+        result = self.run_import()
+        self.assertEqual(result.created, 0)
+        self.assertEqual(result.skipped, 3)
+        self.assertEqual(Trade.objects.filter(user=self.user).count(), 3)
+
+    def upload(self, content, name='extrato.csv', **data):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        data.setdefault('portfolio', self.portfolio.pk)
+        if content is not None:
+            data['file'] = SimpleUploadedFile(name, content, content_type='text/csv')
+        return client.post(reverse('dashboard:api_trade_import'), data, format='multipart')
+
+    def test_api(self):
+        response = self.upload(self.STATEMENT.encode())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], len(response.data['errors'])), (3, 1))
+        self.assertEqual(self.upload(self.STATEMENT.encode()).data['skipped'], 3)
+
+        other = Portfolio.objects.create(
+            user=User.objects.create_user(username='other', password='x'), name='Alheio')
+        for response in (
+            self.upload(None),
+            self.upload(b''),
+            self.upload(self.STATEMENT.splitlines(keepends=True)[0].encode()),
+            self.upload('symbol;side\nAÇÃO;C\n'.encode('latin-1')),
+            self.upload(self.STATEMENT.encode(), portfolio=other.pk),
+        ):
+            self.assertEqual(response.status_code, 400, response.data)
+        self.assertEqual(Trade.objects.filter(user=self.user).count(), 3)
+
+
+class TradeAccountingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='trader', password='x')
+        cls.portfolio = Portfolio.objects.create(user=cls.user, name='B3')
+
+    def test_recompute_derives_results_from_legs(self):
+        opened = datetime(2024, 5, 2, 10, tzinfo=dt_timezone.utc)
+        closed = datetime(2024, 5, 2, 12, tzinfo=dt_timezone.utc)
+        buy = Trade.objects.create(user=self.user, portfolio=self.portfolio, symbol='PETR4',
+                                   side='BUY', fees=2, status='CLOSED_MANUAL')
+        TradeEntry.objects.create(trade=buy, price=10, quantity=100, entry_date=opened)
+        TradeEntry.objects.create(trade=buy, price=12, quantity=100, entry_date=opened)
+        TradeStop.objects.create(trade=buy, price=10)
+        TradeTarget.objects.create(trade=buy, price=13, quantity=150, target_date=closed)
+        TradeManualClose.objects.create(trade=buy, price=11, quantity=50, close_date=closed)
+
+        sell = Trade.objects.create(user=self.user, portfolio=self.portfolio, symbol='VALE3',
+                                    side='SELL', status='CLOSED_STOP')
+        TradeEntry.objects.create(trade=sell, price=50, quantity=10, entry_date=opened)
+        TradeManualClose.objects.create(trade=sell, price=52, quantity=10, close_date=closed)
+
+        manual = create_trade(self.user, self.portfolio, 42)
+
+        self.assertEqual(recompute_trades(Trade.objects.filter(user=self.user)), 3)
+
+        buy.refresh_from_db()
+        self.assertEqual(buy.avg_entry_price, 11)
+        self.assertEqual(buy.avg_exit_price, Decimal('12.5'))
+        self.assertEqual(buy.gross_result, 300)
+        self.assertEqual(buy.net_result, 298)
+        self.assertEqual(buy.risk_per_unit, 1)
+        self.assertEqual(buy.r_multiple, Decimal('1.49'))
+        self.assertEqual(buy.holding_seconds, 7200)
+
+        sell.refresh_from_db()
+        self.assertEqual(sell.net_result, -20)
+        self.assertIsNone(sell.r_multiple)
+
+        manual.refresh_from_db()
+        self.assertEqual(manual.net_result, 42)
+
+    def test_leg_changes_update_derived_fields(self):
+        opened = datetime(2024, 5, 2, 10, tzinfo=dt_timezone.utc)
+        with self.captureOnCommitCallbacks(execute=True):
+            trade = Trade.objects.create(user=self.user, portfolio=self.portfolio,
+                                         symbol='PETR4', side='BUY', status='CLOSED_MANUAL')
+            entry = TradeEntry.objects.create(trade=trade, price=10, quantity=100,
+                                              entry_date=opened)
+            TradeStop.objects.create(trade=trade, price=9)
+            TradeManualClose.objects.create(trade=trade, price=12, quantity=100,
+                                            close_date=opened + timedelta(hours=1))
+        trade.refresh_from_db()
+        self.assertEqual((trade.net_result, trade.r_multiple, trade.holding_seconds),
+                         (200, 2, 3600))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.price = 11
+            entry.save()
+        trade.refresh_from_db()
+        self.assertEqual((trade.avg_entry_price, trade.net_result, trade.r_multiple),
+                         (11, 100, Decimal('0.5')))
+        self.assertEqual(DailyPnL.objects.get(user=self.user).net_brl, 100)
+
+        # Stop colado à entrada: o R não cabe no campo e fica sem valor
+        with self.captureOnCommitCallbacks(execute=True):
+            trade.stops.update(price=Decimal('10.99999'))
+            close = trade.manual_closes.get()
+            close.price = 30
+            close.save()
+        trade.refresh_from_db()
+        self.assertIsNone(trade.r_multiple)
+
+
+class BalanceLedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='trader', password='x')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.portfolio = Portfolio.objects.create(
+                user=self.user, name='B3', balance=1000)
+
+    def balance(self):
+        self.portfolio.refresh_from_db()
+        return self.portfolio.balance
+
+    def test_movements_and_closed_trades_apply_deltas(self):
+        day = datetime(2024, 5, 2, 12, tzinfo=dt_timezone.utc)
+        with self.captureOnCommitCallbacks(execute=True):
+            PortfolioTransaction.objects.create(
+                portfolio=self.portfolio, type='DEPOSIT', value=500, date=day)
+            withdrawal = PortfolioTransaction.objects.create(
+                portfolio=self.portfolio, type='WITHDRAWAL', value=200, date=day)
+        self.assertEqual(self.balance(), 1300)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            trade = create_trade(self.user, self.portfolio, 150, closed_at=day)
+        self.assertEqual(self.balance(), 1450)
+
+        # Alterar o resultado lança apenas a diferença
+        with self.captureOnCommitCallbacks(execute=True):
+            trade.net_result = 100
+            trade.save()
+        self.assertEqual(self.balance(), 1400)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            trade.delete()
+            withdrawal.delete()
+        self.assertEqual(self.balance(), 1500)
+
+        entries = BalanceLedgerEntry.objects.filter(portfolio=self.portfolio)
+        self.assertEqual(sum(entry.amount for entry in entries), self.balance())
+        # Lançamento, diferença e estorno
+        self.assertEqual(entries.filter(kind='TRADE').count(), 3)
+
+    def test_balance_as_of_uses_checkpoint_and_tail(self):
+        first = datetime(2024, 5, 2, 12, tzinfo=dt_timezone.utc)
+        second = datetime(2024, 5, 4, 12, tzinfo=dt_timezone.utc)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_trade(self.user, self.portfolio, 100, closed_at=first)
+            create_trade(self.user, self.portfolio, -40, closed_at=second)
+
+        checkpoint_balances(when=datetime(2024, 5, 3, tzinfo=dt_timezone.utc))
+        self.assertEqual(balance_as_of(self.portfolio, first), 1100)
+        self.assertEqual(balance_as_of(self.portfolio, second), 1060)
+
+        history = balance_history(self.portfolio, '2024-05-01', '2024-05-05')
+        self.assertEqual(history.tolist(), [1000, 1100, 1100, 1060, 1060])
+
+    def test_migration_backfills_existing_history(self):
+        first = datetime(2024, 5, 2, 12, tzinfo=dt_timezone.utc)
+        second = datetime(2024, 5, 4, 12, tzinfo=dt_timezone.utc)
+        with self.captureOnCommitCallbacks(execute=True):
+            trade = create_trade(self.user, self.portfolio, 100, closed_at=first)
+            create_trade(self.user, self.portfolio, 50, status='OPEN')
+            deposit = PortfolioTransaction.objects.create(
+                portfolio=self.portfolio, type='DEPOSIT', value=300, date=second)
+        # Estado de antes do livro-razão: saldo já com os trades e transações
+        BalanceLedgerEntry.objects.all().delete()
+        migration = import_module('dashboard.migrations.0008_balance_ledger')
+        migration.open_existing_ledgers(django_apps, None)
+
+        entries = BalanceLedgerEntry.objects.filter(portfolio=self.portfolio)
+        self.assertEqual(entries.get(kind='OPENING').amount, 1000)
+        self.assertEqual(entries.get(kind='TRADE').source_id, trade.pk)
+        self.assertEqual(entries.get(kind='DEPOSIT').balance_after, 1400)
+        self.assertEqual(balance_history(self.portfolio, '2024-05-01', '2024-05-04').tolist(),
+                         [1000, 1100, 1100, 1400])
+
+        # Salvar de novo uma origem antiga não lança o valor outra vez
+        with self.captureOnCommitCallbacks(execute=True):
+            trade.save()
+            deposit.value = 250
+            deposit.save()
+        self.assertEqual(self.balance(), 1350)
+        recompute_trades(Trade.objects.filter(pk=trade.pk))
+        self.assertEqual(self.balance(), 1350)
+
+
+class EquityCurveAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='trader', password='x')
+        cls.portfolio = Portfolio.objects.create(
+            user=cls.user, name='B3', balance=1000)
+        results = [100, -50, -100, 200, 30]
+        for day, net_result in enumerate(results, start=1):
+            create_trade(cls.user, cls.portfolio, net_result,
+                         closed_at=datetime(2024, 5, day, 15, tzinfo=dt_timezone.utc))
+        rebuild_daily_pnl(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_malformed_or_foreign_ids_are_rejected(self):
+        foreign = Strategy.objects.create(
+            user=User.objects.create_user(username='other', password='x'), name='Alheia')
+        portfolio, strategy = ({'portfolio': 'abc'},), (
+            {'strategy': 'abc'}, {'strategy': foreign.pk})
+        for name, cases in (('api_equity_curve', portfolio + strategy),
+                            ('api_strategy_breakdown', portfolio),
+                            ('api_time_metrics', portfolio), ('api_calendar', portfolio),
+                            ('api_journal_search', [{'q': 'x', **p} for p in strategy]),
+                            ('api_monte_carlo', portfolio + strategy)):
+            for params in cases:
+                response = self.client.get(reverse(f'dashboard:{name}'), params)
+                self.assertEqual(response.status_code, 400, (name, params))
+                self.assertIn('detail', response.data)
+        response = self.client.post(reverse('dashboard:api_trade_import'), {
+            'portfolio': 'abc', 'file': SimpleUploadedFile('x.csv', b'symbol\n')},
+            format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+    def test_daily_curves(self):
+        response = self.client.get(reverse('dashboard:api_equity_curve'))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([value for _, value in data['equity']], [100, 50, -50, 150, 180])
+        self.assertEqual([value for _, value in data['drawdown']], [0, -50, -150, 0, 0])
+        self.assertEqual(data['max_drawdown'], -150)
+        self.assertAlmostEqual(data['max_drawdown_pct'], -150 / 1100 * 100, places=2)
+        self.assertEqual(data['equity'][0][0], '2024-05-01')
+
+    def test_monthly_resolution_and_point_budget(self):
+        response = self.client.get(reverse('dashboard:api_equity_curve'),
+                                   {'resolution': 'month'})
+        self.assertEqual(response.json()['equity'], [['2024-05-31', 180.0]])
+
+        response = self.client.get(reverse('dashboard:api_equity_curve'), {'max_points': 3})
+        equity = response.json()['equity']
+        self.assertEqual(len(equity), 3)
+        self.assertEqual([equity[0][0], equity[-1][0]], ['2024-05-01', '2024-05-05'])
+
+        response = self.client.get(reverse('dashboard:api_equity_curve'),
+                                   {'resolution': 'year'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_lttb_keeps_extremes(self):
+        y = np.sin(np.linspace(0, 20, 10000))
+        y[5000] = 5
+        keep = lttb(np.arange(y.size), y, 200)
+        self.assertEqual(len(keep), 200)
+        self.assertIn(5000, keep)
+        self.assertEqual([keep[0], keep[-1]], [0, y.size - 1])
+
+
+class AnalyticsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='trader', password='x')
+        self.portfolio = Portfolio.objects.create(user=self.user, name='B3')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeat_load_is_served_from_cache_until_a_write(self):
+        url = reverse('dashboard:api_metrics')
+        closed_at = datetime.now(dt_timezone.utc)
+        with self.captureOnCommitCallbacks(execute=True):
+            trade = create_trade(self.user, self.portfolio, 100, closed_at=closed_at)
+        self.assertEqual(self.client.get(url).json()['trade_count'], 1)
+
+        # Só a leitura dos contadores de versão, que ficam no banco
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).json()['trade_count'], 1)
+
+        # Uma perna nova invalida a versão do utilizador
+        with self.captureOnCommitCallbacks(execute=True):
+            TradeManualClose.objects.create(
+                trade=trade, price=100, quantity=1, close_date=closed_at)
+            create_trade(self.user, self.portfolio, -30, closed_at=closed_at)
+        self.assertEqual(self.client.get(url).json()['trade_count'], 2)
+
+    def test_versions_do_not_live_in_the_local_cache(self):
+        key = analytics_key('kpis', self.user.pk)
+        # Outro worker com o seu próprio cache local (vazio) chega à mesma versão...
+        cache.clear()
+        self.assertEqual(analytics_key('kpis', self.user.pk), key)
+        # ...e vê a invalidação feita por qualquer processo
+        invalidate_analytics(self.user.pk)
+        cache.clear()
+        self.assertNotEqual(analytics_key('kpis', self.user.pk), key)
+
+    def test_other_users_keep_their_entries(self):
+        other = User.objects.create_user(username='other', password='x')
+        key = analytics_key('kpis', other.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_trade(self.user, self.portfolio, 100)
+        self.assertEqual(analytics_key('kpis', other.pk), key)
+        self.assertNotEqual(analytics_key('kpis', self.user.pk, portfolio=1),
+                            analytics_key('kpis', self.user.pk, portfolio=2))
+
+
+class StrategyBreakdownTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='trader', password='x')
+        cls.portfolio = Portfolio.objects.create(user=cls.user, name='B3')
+        breakout = Strategy.objects.create(user=cls.user, name='Rompimento')
+        pullback = Strategy.objects.create(user=cls.user, name='Pullback')
+        trend = Tag.objects.create(name='tendência')
+        breakout.tags.add(trend)
+        pullback.tags.add(trend)
+
+        may = datetime(2024, 5, 10, 15, tzinfo=dt_timezone.utc)
+        june = datetime(2024, 6, 10, 15, tzinfo=dt_timezone.utc)
+        for strategy, net_result, closed_at in [
+            (breakout, 300, may), (breakout, -100, may), (breakout, 200, june),
+            (pullback, -50, may), (None, 10, may),
+        ]:
+            trade = create_trade(cls.user, cls.portfolio, net_result, closed_at=closed_at)
+            if strategy is not None:
+                JournalNote.objects.create(user=cls.user, trade=trade, strategy=strategy, notes='')
+        # Notas sem estratégia são ignoradas e uma segunda nota não duplica o trade
+        JournalNote.objects.create(user=cls.user, trade=trade, notes='sem estratégia')
+        JournalNote.objects.create(user=cls.user, trade=Trade.objects.get(net_result=300),
+                                   strategy=breakout, notes='revisão')
+
+    def test_breakdown_in_constant_queries(self):
+        with self.assertNumQueries(3):
+            result = strategy_breakdown(self.user)
+        strategies = {row['name']: row for row in result['strategies']}
+        breakout = strategies['Rompimento']
+        self.assertEqual((breakout['trades'], breakout['wins'], breakout['losses']), (3, 2, 1))
+        self.assertAlmostEqual(breakout['win_rate'], 66.67)
+        self.assertEqual(breakout['profit_factor'], 5.0)
+        self.assertAlmostEqual(breakout['expectancy'], 133.33)
+        self.assertEqual(strategies['Sem estratégia']['trades'], 1)
+
+        trend, = result['tags']
+        self.assertEqual((trend['trades'], trend['net']), (4, 350))
+        self.assertEqual(trend['profit_factor'], 3.33)
+
+    def test_endpoint_filters_by_date(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        cache.clear()
+        response = client.get(reverse('dashboard:api_strategy_breakdown'),
+                              {'date_from': '2024-06-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['name'], row['trades']) for row in response.json()['strategies']],
+                         [('Rompimento', 1)])
+        response = client.get(reverse('dashboard:api_strategy_breakdown'), {'date_to': 'junho'})
+        self.assertEqual(response.status_code, 400)
+        response = client.get(reverse('dashboard:api_strategy_breakdown'),
+                              {'date_from': '2024-13-40'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TimeMetricsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='trader', password='x')
+        self.portfolio = Portfolio.objects.create(user=self.user, name='B3')
+
+    def add_trade(self, net_result, opened_at, closed_at):
+        trade = create_trade(self.user, self.portfolio, net_result, closed_at=closed_at)
+        TradeEntry.objects.create(trade=trade, price=100, quantity=1, entry_date=opened_at)
+
+    def test_buckets_use_local_time_and_holding_bands(self):
+        # 13h UTC = 10h em São Paulo; 2024-05-06 é uma segunda-feira
+        opened = datetime(2024, 5, 6, 13, tzinfo=dt_timezone.utc)
+        self.add_trade(100, opened, datetime(2024, 5, 6, 13, 2, tzinfo=dt_timezone.utc))
+        self.add_trade(-40, opened, datetime(2024, 5, 6, 14, tzinfo=dt_timezone.utc))
+        self.add_trade(70, datetime(2024, 5, 8, 17, tzinfo=dt_timezone.utc),
+                       datetime(2024, 5, 10, 17, tzinfo=dt_timezone.utc))
+        create_trade(self.user, self.portfolio, 5)
+
+        with self.assertNumQueries(1):
+            result = time_metrics(self.user)
+
+        ten = result['hour'][10]
+        self.assertEqual((ten['net'], ten['count'], ten['win_rate']), (60, 2, 50))
+        self.assertEqual(result['weekday'][0]['count'], 2)
+        self.assertEqual(result['weekday'][2]['net'], 70)
+        self.assertEqual([band['count'] for band in result['holding']], [1, 0, 1, 0, 1, 0, 0])
+        # O trade sem entradas conta por hora, mas não tem duração
+        self.assertEqual(sum(bucket['count'] for bucket in result['hour']), 4)
+
+    def test_empty_history(self):
+        result = time_metrics(self.user)
+        self.assertEqual(sum(bucket['count'] for bucket in result['hour']), 0)
+
+
+class CalendarAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='trader', password='x')
+        cls.portfolio = Portfolio.objects.create(user=cls.user, name='B3')
+        for day, net_result in [(3, 100), (3, -30), (6, 50), (31, -20)]:
+            create_trade(cls.user, cls.portfolio, net_result,
+                         closed_at=datetime(2024, 5, day, 15, tzinfo=dt_timezone.utc))
+        create_trade(cls.user, cls.portfolio, 999,
+                     closed_at=datetime(2024, 6, 3, 15, tzinfo=dt_timezone.utc))
+        rebuild_daily_pnl(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_month_days_weeks_and_total(self):
+        data_version(self.user.pk)
+        # Contadores de versão do cache e as linhas de DailyPnL do mês
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('dashboard:api_calendar'),
+                                       {'year': 2024, 'month': 5})
+        data = response.json()
+        self.assertEqual([(day['date'], day['net'], day['count']) for day in data['days']],
+                         [('2024-05-03', 70, 2), ('2024-05-06', 50, 1), ('2024-05-31', -20, 1)])
+        self.assertEqual(data['days'][0]['win_rate'], 50)
+        # Maio de 2024 começa numa quarta: a primeira semana é recortada
+        self.assertEqual(len(data['weeks']), 5)
+        self.assertEqual((data['weeks'][0]['start'], data['weeks'][0]['end'],
+                          data['weeks'][0]['net']), ('2024-05-01', '2024-05-05', 70))
+        self.assertEqual(data['weeks'][-1]['end'], '2024-05-31')
+        self.assertEqual((data['total']['net'], data['total']['count']), (100, 4))
+
+    def test_invalid_month(self):
+        response = self.client.get(reverse('dashboard:api_calendar'), {'year': 2024, 'month': 13})
+        self.assertEqual(response.status_code, 400)
+
+
+class TaxEngineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='trader', password='x')
+        self.portfolio = Portfolio.objects.create(user=self.user, name='B3')
+
+    def add_trade(self, symbol, net_result, opened_at, closed_at, sale_value, portfolio=None):
+        trade = Trade.objects.create(user=self.user, portfolio=portfolio or self.portfolio,
+                                     symbol=symbol,
+                                     side='BUY', net_result=net_result, status='CLOSED_MANUAL')
+        # Pernas coerentes com o resultado: os sinais recalculam-no a partir delas
+        TradeEntry.objects.create(trade=trade, price=sale_value - net_result, quantity=1,
+                                  entry_date=opened_at)
+        TradeManualClose.objects.create(trade=trade, price=sale_value, quantity=1,
+                                        close_date=closed_at)
+        return trade
+
+    def at(self, month, day, hour=15):
+        return datetime(2024, month, day, hour, tzinfo=dt_timezone.utc)
+
+    def months(self):
+        return {row.month.month: row for row in TaxMonth.objects.filter(user=self.user)}
+
+    def test_monthly_darf_with_exemption_and_loss_carryforward(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            # Janeiro: day trade de +1000 -> 20% menos 1% de IRRF
+            self.add_trade('WINFUT', 1000, self.at(1, 10, 13), self.at(1, 10, 16), 5000)
+            # Fevereiro: ações com vendas abaixo de R$ 20 mil (isento) e prejuízo em day trade
+            self.add_trade('PETR4', 500, self.at(2, 1), self.at(2, 20), 10000)
+            self.add_trade('WINFUT', -300, self.at(2, 5, 13), self.at(2, 5, 16), 5000)
+            # Março: o prejuízo compensa o day trade; vendas de ações acima do limite
+            self.add_trade('WINFUT', 200, self.at(3, 4, 13), self.at(3, 4, 16), 5000)
+            self.add_trade('VALE3', 1000, self.at(3, 1), self.at(3, 15), 30000)
+
+        close_tax_months(self.user, until=datetime(2024, 4, 1).date())
+        months = self.months()
+        self.assertEqual(months[1].darf_amount, Decimal('190.00'))
+        self.assertTrue(months[2].swing_exempt)
+        self.assertEqual(months[2].tax_due, 0)
+        self.assertEqual(months[2].day_trade_loss_carry, 300)
+        self.assertEqual(months[3].day_trade_loss_carry, 100)
+        self.assertEqual(months[3].tax_due, 150)
+        # IRRF: 1% do day trade de março, 0,005% das vendas e a sobra de fevereiro
+        self.assertEqual(months[3].irrf_carry, 0)
+        self.assertEqual(months[3].darf_amount, Decimal('146.00'))
+
+        # Alterar um trade de fevereiro reabre só fevereiro em diante
+        january = months[1].computed_at
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_trade('WINFUT', -50, self.at(2, 6, 13), self.at(2, 6, 16), 5000)
+        self.assertEqual(sorted(self.months()), [1])
+        close_tax_months(self.user, until=datetime(2024, 4, 1).date())
+        months = self.months()
+        self.assertEqual(months[1].computed_at, january)
+        self.assertEqual(months[3].day_trade_loss_carry, 150)
+
+    def test_small_darf_is_deferred(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_trade('WINFUT', 40, self.at(1, 10, 13), self.at(1, 10, 16), 5000)
+        close_tax_months(self.user, until=datetime(2024, 3, 1).date())
+        months = self.months()
+        self.assertEqual(months[1].darf_amount, 0)
+        self.assertEqual(months[1].darf_carry, Decimal('7.60'))
+        self.assertEqual(months[2].darf_carry, Decimal('7.60'))
+
+    def test_endpoint_computes_without_saving(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('dashboard:api_tax_report')
+        self.assertEqual(client.get(url, {'year': 2024}).json()['months'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_trade('WINFUT', 1000, self.at(1, 10, 13), self.at(1, 10, 16), 5000)
+            self.add_trade('WINFUT', 40, self.at(3, 10, 13), self.at(3, 10, 16), 5000)
+        close_tax_months(self.user, until=datetime(2024, 2, 1).date())
+        response = client.get(url, {'year': 2024})
+        self.assertEqual(response.status_code, 200)
+        months = response.json()['months']
+        # Janeiro gravado, os demais meses fechados apurados na hora e nada novo gravado
+        self.assertEqual([month['month'][:7] for month in months[:3]],
+                         ['2024-01', '2024-02', '2024-03'])
+        self.assertEqual((months[2]['darf_amount'], months[2]['darf_carry']), (0, 7.6))
+        self.assertEqual(sorted(self.months()), [1])
+
+    def test_report_is_cached_until_the_data_changes(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('dashboard:api_tax_report')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_trade('WINFUT', 1000, self.at(1, 10, 13), self.at(1, 10, 16), 5000)
+        with mock.patch('dashboard.tax.pending_tax_months',
+                        wraps=pending_tax_months) as pending:
+            first = client.get(url, {'year': 2024}).json()
+            self.assertEqual(client.get(url, {'year': 2024}).json(), first)
+            self.assertEqual(pending.call_count, 1)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.add_trade('WINFUT', 40, self.at(1, 12, 13), self.at(1, 12, 16), 5000)
+            months = client.get(url, {'year': 2024}).json()['months']
+            self.assertEqual(pending.call_count, 2)
+        self.assertEqual(months[0]['day_trade_result'], 1040)
+
+    def test_months_with_missing_rates_are_not_closed(self):
+        usd = Portfolio.objects.create(user=self.user, name='CME', currency='USD')
+        with mock.patch.object(currency_converter, 'load_rates', return_value=False), \
+                self.assertLogs('dashboard', 'WARNING'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.add_trade('WINFUT', 1000, self.at(1, 10, 13), self.at(1, 10, 16), 5000)
+                self.add_trade('ES', 100, self.at(2, 5, 13), self.at(2, 5, 16), 5000, usd)
+                self.add_trade('WINFUT', 40, self.at(3, 10, 13), self.at(3, 10, 16), 5000)
+            rows = close_tax_months(self.user, until=datetime(2024, 4, 1).date())
+        # Fevereiro sem cotação: só janeiro é fechado, fevereiro e março esperam
+        self.assertEqual([row['month'].month for row in rows], [1])
+        self.assertEqual(sorted(self.months()), [1])
+
+    def test_rebuild_keeps_closed_months_and_bulk_paths_reset_them(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            trade = self.add_trade('WINFUT', 1000, self.at(1, 10, 13), self.at(1, 10, 16), 5000)
+        close_tax_months(self.user, until=datetime(2024, 2, 1).date())
+        rebuild_daily_pnl(self.user)
+        self.assertEqual(sorted(self.months()), [1])
+        recompute_trades(Trade.objects.filter(pk=trade.pk))
+        self.assertEqual(self.months(), {})
+
+
+class ForexCalculatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='trader', password='x')
+        cls.day = datetime(2024, 5, 6).date()
+        for currency, rate in [('USD', 5), ('EUR', '5.5'), ('JPY', '0.033')]:
+            ExchangeRate.objects.create(currency=currency, date=cls.day, rate=rate)
+        # Cotação mais antiga é ignorada
+        ExchangeRate.objects.create(currency='USD', date=datetime(2024, 5, 3).date(), rate=4)
+
+    def setUp(self):
+        RATE_MATRICES.clear()
+
+    def test_cross_rates_triangulate_through_brl(self):
+        with self.assertNumQueries(1):
+            matrix = rate_matrix(self.day)
+            rate_matrix(self.day)
+        self.assertAlmostEqual(matrix.rate('EUR', 'USD'), 1.1)
+        self.assertAlmostEqual(matrix.rate('USD', 'JPY'), 5 / 0.033)
+        self.assertEqual(matrix.rate('BRL', 'BRL'), 1)
+
+    def test_batch_position_sizes(self):
+        RATE_MATRICES[timezone.localdate()] = rate_matrix(self.day)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(reverse('dashboard:api_forex_calculator'), {'items': [
+            {'symbol': 'EURUSD', 'stop_pips': 20, 'risk_amount': 500},
+            {'symbol': 'USD/JPY', 'stop_pips': 10, 'risk_percent': 1, 'balance': 33000},
+            {'symbol': 'XAUUSD', 'stop_pips': 10, 'risk_amount': 100},
+            {'symbol': 'EURUSD', 'risk_amount': 100},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        eurusd, usdjpy, gold, missing = response.json()['results']
+        # 1 pip de EURUSD por lote = 10 USD = 50 BRL
+        self.assertEqual((eurusd['pip_value'], eurusd['lots'], eurusd['risk_amount']), (50, 0.5, 500))
+        self.assertEqual((usdjpy['lots'], usdjpy['units']), (1, 100000))
+        self.assertIn('error', gold)
+        self.assertEqual(missing['error'], 'Campo obrigatório: stop_pips.')
+
+    def test_non_finite_inputs_are_item_errors(self):
+        RATE_MATRICES[timezone.localdate()] = rate_matrix(self.day)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(reverse('dashboard:api_forex_calculator'), {'items': [
+            {'symbol': 'USDBRL', 'stop_pips': 'inf', 'risk_amount': 100},
+            {'symbol': 'USDBRL', 'stop_pips': 10, 'risk_amount': 'inf'},
+            {'symbol': 'USDBRL', 'stop_pips': 'nan', 'risk_amount': 100},
+            {'symbol': 'USDBRL', 'stop_pips': 1e-320, 'risk_amount': 1e300},
+            {'symbol': 'USDBRL', 'stop_pips': 10, 'risk_amount': 100},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        *invalid, valid = response.json()['results']
+        self.assertTrue(all('error' in result for result in invalid))
+        self.assertNotIn('error', valid)
+
+
+class JournalSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='journal', password='x')
+        other = User.objects.create_user(username='other', password='x')
+        cls.breakout = Strategy.objects.create(user=cls.user, name='Rompimento')
+        cls.note = JournalNote.objects.create(
+            user=cls.user, strategy=cls.breakout, confidence_level=8,
+            notes='Entrada no rompimento da máxima, operação disciplinada.')
+        JournalNote.objects.create(user=cls.user, confidence_level=3,
+                                   notes='Operações impulsivas depois do almoço.')
+        JournalNote.objects.create(user=other, notes='Rompimento falso, operação ruim.')
+
+    # Acentos e prefixos seguem as regras do FTS5 (no Postgres vale o stemming, abaixo)
+    @skipIf(connection.vendor == 'postgresql', 'regras de busca do FTS5')
+    def test_ranked_and_highlighted(self):
+        # Acentos ignorados
+        [result] = search_notes(self.user, 'operacao')
+        self.assertIn('<mark>operação</mark>', result['headline'])
+        # Cada palavra vale como prefixo: "opera" casa "operação" e "Operações"
+        results = search_notes(self.user, 'opera')
+        self.assertEqual(len(results), 2)
+        self.assertGreaterEqual(results[0]['rank'], results[1]['rank'])
+
+        [only] = search_notes(self.user, 'rompimento disciplinada')
+        self.assertEqual(only['id'], self.note.pk)
+        self.assertEqual(only['strategy_name'], 'Rompimento')
+
+    @skipIf(connection.vendor == 'postgresql', 'regras de busca do FTS5')
+    def test_filters_and_index_follow_saves(self):
+        self.assertEqual(search_notes(self.user, 'opera', confidence_min=5)[0]['id'],
+                         self.note.pk)
+        self.assertEqual(len(search_notes(self.user, 'opera', strategy=self.breakout)), 1)
+        self.assertEqual(search_notes(self.user, 'operacao', date_to=datetime(2000, 1, 1).date()), [])
+
+        self.note.notes = 'Saída antecipada por medo.'
+        self.note.save()
+        self.assertEqual(search_notes(self.user, 'rompimento'), [])
+        self.assertEqual(search_notes(self.user, 'medo')[0]['id'], self.note.pk)
+        self.note.delete()
+        self.assertEqual(search_notes(self.user, 'medo'), [])
+
+    def test_api(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('dashboard:api_journal_search')
+        self.assertEqual(client.get(url).status_code, 400)
+        self.assertEqual(client.get(url, {'q': 'x', 'limit': 'a'}).status_code, 400)
+        response = client.get(url, {'q': 'almoço', 'confidence_max': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        # Sintaxe do FTS5 no texto do utilizador não gera erro
+        self.assertEqual(client.get(url, {'q': '"NEAR( *'}).status_code, 200)
+        # Datas inexistentes são recusadas, não viram erro 500
+        response = client.get(url, {'q': 'almoço', 'date_from': '2024-13-40'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date_from', response.data['detail'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'índice tsvector só existe no PostgreSQL')
+    def test_postgres_tsvector_index(self):
+        # A coluna gerada acompanha os INSERTs e o stemming em português casa as flexões
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT search_vector IS NOT NULL FROM dashboard_journalnote '
+                           'WHERE id = %s', [self.note.pk])
+            self.assertTrue(cursor.fetchone()[0])
+        [result] = search_notes(self.user, 'disciplinadas')
+        self.assertEqual(result['id'], self.note.pk)
+        self.assertIn('<mark>', result['headline'])
+        self.assertEqual(len(search_notes(self.user, 'rompimento')), 1)
+        # Sintaxe websearch: termo excluído com "-"
+        self.assertEqual(search_notes(self.user, 'rompimento -disciplinada'), [])
+
+        self.note.notes = 'Saída antecipada por medo.'
+        self.note.save()
+        self.assertEqual(search_notes(self.user, 'rompimento'), [])
+
+
+class SyntheticBenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        [cls.user] = generate_synthetic_data(trades=200, seed=1, prefix='synthetic')
+
+    def test_dataset_is_complete_and_offline(self):
+        trades = Trade.objects.filter(user=self.user)
+        self.assertEqual(trades.count(), 200)
+        self.assertEqual(TradeEntry.objects.filter(trade__user=self.user).count(), 200)
+        self.assertTrue(trades.filter(portfolio__currency='USD').exists())
+        self.assertTrue(DailyPnL.objects.filter(user=self.user).exists())
+        self.assertTrue(JournalNote.objects.filter(user=self.user).exists())
+        # Cotações sintéticas cobrem o período: nenhuma busca no BCB
+        with mock.patch.object(currency_converter, 'RATE_FETCHER') as fetcher:
+            DashboardMetrics(self.user).compute()
+        fetcher.submit.assert_not_called()
+
+    def test_command_refuses_a_database_with_data(self):
+        # DEBUG não basta: um banco de desenvolvimento também tem cotações reais
+        with self.settings(DEBUG=True), self.assertRaises(CommandError):
+            call_command('generate_synthetic_data', '--trades', '5', stdout=io.StringIO())
+        self.assertFalse(User.objects.filter(username='bench-0').exists())
+        call_command('generate_synthetic_data', '--trades', '5', '--i-know',
+                     stdout=io.StringIO())
+        self.assertEqual(Trade.objects.filter(user__username='bench-0').count(), 5)
+
+    def test_benchmark_report_and_regressions(self):
+        report = run_benchmarks(self.user, ['trade_list_sparse', 'metrics'], repeat=1)
+        self.assertEqual(report['trades'], 200)
+        self.assertEqual(report['results']['trade_list_sparse']['queries'], 1)
+        self.assertEqual(compare(report, report), [])
+
+        slower = json.loads(json.dumps(report))
+        slower['results']['metrics']['median_ms'] *= 2
+        slower['results']['metrics']['queries'] += 1
+        self.assertEqual(len(compare(slower, report)), 2)
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=1.0, INSTRUMENTATION_REPEATED_QUERY_THRESHOLD=3)
+@modify_settings(MIDDLEWARE={
+    'prepend': 'dashboard.instrumentation.RequestInstrumentationMiddleware'})
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='profiled', password='x')
+        portfolio = Portfolio.objects.create(user=cls.user, name='B3')
+        create_trade(cls.user, portfolio, 50,
+                     closed_at=datetime(2024, 3, 1, 15, tzinfo=dt_timezone.utc))
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_and_log_line(self):
+        with self.assertLogs('dashboard.instrumentation', 'INFO') as logs:
+            response = self.client.get(reverse('dashboard:api_metrics'))
+        phases = dict(metric.split(';dur=') for metric in response['Server-Timing'].split(', '))
+        self.assertEqual(set(phases), {'sql', 'fx', 'pandas', 'serialize', 'total'})
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['path'], reverse('dashboard:api_metrics'))
+        self.assertGreater(line['queries'], 0)
+        self.assertEqual(line['repeated_queries'], 0)
+
+    def test_repeated_queries_are_flagged(self):
+        def view(request):
+            for portfolio_id in range(4):
+                list(Portfolio.objects.filter(pk=portfolio_id))
+            return HttpResponse()
+
+        with self.assertLogs('dashboard.instrumentation', 'INFO') as logs:
+            response = RequestInstrumentationMiddleware(view)(RequestFactory().get('/n1/'))
+        self.assertIn('sql;dur=', response['Server-Timing'])
+        self.assertEqual(json.loads(logs.records[0].getMessage())['repeated_queries'], 1)
+        self.assertIn('Possível N+1', logs.records[1].getMessage())
+
+    def test_streaming_body_queries_are_counted(self):
+        with self.assertLogs('dashboard.instrumentation', 'INFO') as logs:
+            response = self.client.get(reverse('dashboard:api_trade_export'), {'format': 'ndjson'})
+            # O log só é escrito quando o corpo termina
+            logger.info('início do corpo')
+            body = b''.join(response.streaming_content)
+        self.assertEqual(len(body.splitlines()), 1)
+        self.assertEqual(logs.records[0].getMessage(), 'início do corpo')
+        # As queries da exportação correm durante o streaming
+        self.assertGreater(json.loads(logs.records[1].getMessage())['queries'], 0)
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_untouched(self):
+        response = self.client.get(reverse('dashboard:api_metrics'))
+        self.assertNotIn('Server-Timing', response)
+        # Fora de um request amostrado, timed() não faz nada
+        with timed('pandas'):
+            pass
+        self.assertEqual(timed('pandas')(lambda value: value * 2)(21), 42)
+
+
+class TradeSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='columnar', password='x')
+        cls.b3 = Portfolio.objects.create(user=cls.user, name='B3')
+        cls.usd = Portfolio.objects.create(user=cls.user, name='CME', currency='USD')
+        cls.strategy = Strategy.objects.create(user=cls.user, name='Pullback')
+        for day, (portfolio, result) in enumerate(
+                [(cls.b3, 100), (cls.b3, -30.5), (cls.usd, 10)], start=1):
+            trade = create_trade(cls.user, portfolio, result,
+                                 closed_at=datetime(2024, 3, day, 15, tzinfo=dt_timezone.utc))
+        JournalNote.objects.create(user=cls.user, trade=trade, strategy=cls.strategy, notes='x')
+        create_trade(cls.user, cls.b3, 999, status='OPEN')
+        ExchangeRate.objects.create(currency='USD', date=datetime(2024, 3, 1).date(), rate=5)
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.enterContext(self.settings(TRADE_SNAPSHOT_DIR=directory))
+        self.user_dir = Path(directory) / str(self.user.pk)
+        SNAPSHOTS.clear()
+
+    def test_columns_and_filters(self):
+        with mock.patch.object(currency_converter, 'load_rates', return_value=True):
+            snapshot = trade_snapshot(self.user.pk)
+        self.assertEqual(len(snapshot), 3)
+        self.assertEqual(snapshot['net_cents'].dtype, np.int64)
+        self.assertEqual(snapshot['closed_at'].dtype, np.dtype('datetime64[ns]'))
+        self.assertEqual(snapshot['net_cents'].tolist(), [10000, -3050, 1000])
+        self.assertEqual(snapshot['net_brl_cents'].tolist(), [10000, -3050, 5000])
+        # As colunas vêm do disco, mapeadas
+        self.assertIsInstance(snapshot['id'], np.memmap)
+
+        self.assertEqual(snapshot.frame(self.b3.pk)['net_result_brl'].sum(), 69.5)
+        self.assertEqual(snapshot.daily(strategy_id=self.strategy.pk).tolist(), [50.0])
+        self.assertEqual(len(snapshot.frame(strategy_id=999)), 0)
+
+    def test_rebuilt_when_trades_change(self):
+        with mock.patch.object(currency_converter, 'load_rates', return_value=True):
+            first = trade_snapshot(self.user.pk)
+            self.assertIs(trade_snapshot(self.user.pk), first)
+            with self.captureOnCommitCallbacks(execute=True):
+                create_trade(self.user, self.b3, 7,
+                             closed_at=datetime(2024, 3, 4, 15, tzinfo=dt_timezone.utc))
+            second = trade_snapshot(self.user.pk)
+        self.assertEqual(len(second), 4)
+        # A versão substituída fica em disco durante SUPERSEDED_GRACE
+        self.assertEqual(len(list(self.user_dir.iterdir())), 2)
+
+        with mock.patch.object(currency_converter, 'load_rates', return_value=True), \
+                mock.patch.object(snapshots, 'SUPERSEDED_GRACE', -1):
+            with self.captureOnCommitCallbacks(execute=True):
+                create_trade(self.user, self.b3, 8,
+                             closed_at=datetime(2024, 3, 5, 15, tzinfo=dt_timezone.utc))
+            third = trade_snapshot(self.user.pk)
+        self.assertEqual(len(third), 5)
+        [current] = self.user_dir.iterdir()
+        loaded = TradeSnapshot.load(current)
+        self.assertEqual(loaded.categories['symbol'], ['WINFUT'])
+
+    def test_not_saved_while_a_rate_is_missing(self):
+        ExchangeRate.objects.filter(currency='USD').delete()
+        with mock.patch.object(currency_converter, 'load_rates', return_value=False), \
+                self.assertLogs('dashboard', 'WARNING'):
+            snapshot = trade_snapshot(self.user.pk)
+        # O trade em USD fica sem conversão só neste pedido: nada vai para o disco
+        self.assertFalse(snapshot.complete)
+        self.assertEqual(snapshot['net_brl_cents'].tolist(), [10000, -3050, 1000])
+        self.assertFalse(self.user_dir.exists())
+        self.assertNotIn(self.user.pk, SNAPSHOTS)
+
+        ExchangeRate.objects.create(currency='USD', date=datetime(2024, 3, 1).date(), rate=5)
+        with mock.patch.object(currency_converter, 'load_rates', return_value=True):
+            snapshot = trade_snapshot(self.user.pk)
+        self.assertEqual(snapshot['net_brl_cents'].tolist(), [10000, -3050, 5000])
+        self.assertEqual(len(list(self.user_dir.iterdir())), 1)
+
+    def test_missing_directory_is_rebuilt(self):
+        with mock.patch.object(currency_converter, 'load_rates', return_value=True):
+            trade_snapshot(self.user.pk)
+            # Outro processo apagou a versão entre a leitura da versão e o load
+            [current] = self.user_dir.iterdir()
+            shutil.rmtree(current)
+            SNAPSHOTS.clear()
+            snapshot = trade_snapshot(self.user.pk)
+        self.assertEqual(len(snapshot), 3)
+        self.assertTrue((current / 'meta.json').exists())
+
+
+class MonteCarloTests(TestCase):
+    def test_block_bootstrap_keeps_sequences(self):
+        rng = np.random.default_rng(0)
+        index = bootstrap_indices(rng, 10, paths=50, horizon=7, block=3)
+        self.assertEqual(index.shape, (50, 7))
+        # Dentro de cada bloco os trades são consecutivos (circularmente)
+        steps = (np.diff(index, axis=1) % 10)[:, [0, 1, 3, 4]]
+        self.assertTrue((steps == 1).all())
+
+    def test_deterministic_with_or_without_processes(self):
+        results = np.random.default_rng(3).normal(2, 50, 300)
+        inline = monte_carlo(results, 1000, paths=4500, horizon=300, block=4, seed=7,
+                             parallel=False)
+        pooled = monte_carlo(results, 1000, paths=4500, horizon=300, block=4, seed=7,
+                             parallel=True)
+        self.assertEqual(inline, pooled)
+        # Pool limitado por worker e sem fork direto do processo web
+        pool = simulation._process_pool()
+        self.assertLessEqual(pool._max_workers, settings.SIMULATION_PROCESSES)
+        self.assertIn(pool._mp_context.get_start_method(), ('forkserver', 'spawn'))
+        self.assertNotEqual(inline, monte_carlo(results, 1000, paths=4500, horizon=300, seed=8))
+
+        bands = inline['equity_bands']
+        self.assertEqual(bands['steps'][-1], 300)
+        self.assertTrue(np.all(np.array(bands['p5']) <= np.array(bands['p95'])))
+        self.assertLessEqual(inline['max_drawdown']['p95'], 0)
+        self.assertTrue(0 <= inline['probability_of_loss'] <= 1)
+
+    def test_certain_loss(self):
+        result = monte_carlo([-10.0, -20.0], 100, paths=10, horizon=10, loss_pct=50)
+        self.assertEqual(result['probability_of_loss'], 1.0)
+        # No melhor caso, dez perdas de 10
+        self.assertLessEqual(result['final_equity']['p99'], 0)
+
+    def test_api(self):
+        user = User.objects.create_user(username='montecarlo', password='x')
+        portfolio = Portfolio.objects.create(user=user, name='B3', balance=1000)
+        with self.captureOnCommitCallbacks(execute=True):
+            for day, result in enumerate([100, -50, 30, -20], start=1):
+                create_trade(user, portfolio, result,
+                             closed_at=datetime(2024, 3, day, 15, tzinfo=dt_timezone.utc))
+        client = APIClient()
+        client.force_authenticate(user)
+        url = reverse('dashboard:api_monte_carlo')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        with self.settings(TRADE_SNAPSHOT_DIR=directory):
+            response = client.get(url, {'paths': 500, 'block': 2})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['trades'], 4)
+            # Saldo atual: abertura + resultados já lançados no livro-razão
+            self.assertEqual(response.data['capital'], 1060)
+            self.assertEqual(response.data['horizon'], 4)
+            self.assertEqual(client.get(url, {'paths': 500, 'block': 2}).data, response.data)
+            self.assertEqual(client.get(url, {'paths': 0}).status_code, 400)
+            self.assertEqual(client.get(url, {'strategy': 999}).status_code, 400)
+            for params in ({'capital': 'inf'}, {'capital': 'nan'}, {'loss_pct': 'nan'}):
+                self.assertEqual(client.get(url, params).status_code, 400, params)
+
+
+class CurrencyConversionTests(TestCase):
+    def setUp(self):
+        currency_converter.RATES_CACHE.clear()
+
+    def day(self, day, month=5):
+        return datetime(2024, month, day).date()
+
+    def cover(self, start, end):
+        ExchangeRateCoverage.objects.create(currency='USD', start_date=start, end_date=end)
+
+    def test_missing_range_keeps_coverage_contiguous(self):
+        missing = currency_converter._missing_range
+        self.assertEqual(missing('USD', self.day(1), self.day(5)), (self.day(1), self.day(5)))
+        self.cover(self.day(10), self.day(20))
+        self.assertIsNone(missing('USD', self.day(12), self.day(15)))
+        # Para a esquerda, para a direita e para os dois lados, sempre encostado à cobertura
+        self.assertEqual(missing('USD', self.day(5), self.day(15)), (self.day(5), self.day(9)))
+        self.assertEqual(missing('USD', self.day(15), self.day(25)), (self.day(21), self.day(25)))
+        self.assertEqual(missing('USD', self.day(5), self.day(25)), (self.day(5), self.day(25)))
+        # Um período solto à direita também cobre o buraco até ele
+        self.assertEqual(missing('USD', self.day(28), self.day(30)), (self.day(21), self.day(30)))
+
+    def test_convert_many_aligns_by_position(self):
+        self.cover(self.day(1), self.day(31))
+        ExchangeRate.objects.create(currency='USD', date=self.day(3), rate=5)
+        ExchangeRate.objects.create(currency='USD', date=self.day(6), rate=6)
+        amounts = pd.Series([10.0, 10.0, 10.0, 10.0], index=[40, 41, 42, 43])
+        currencies = pd.Series(['USD', 'BRL', 'USD', 'USD'])
+        dates = pd.Series(pd.to_datetime(
+            ['2024-05-04 15:00', '2024-05-04 15:00', '2024-05-06 15:00', None], utc=True),
+            index=[7, 8, 9, 10])
+
+        converted = currency_converter.convert_many(amounts, currencies, dates)
+        # Sábado usa a sexta anterior; BRL passa direto; sem data, o valor fica como está
+        self.assertEqual(list(converted.index), [40, 41, 42, 43])
+        self.assertEqual(converted.tolist(), [50.0, 10.0, 60.0, 10.0])
+
+        plain = currency_converter.convert_many(
+            [Decimal('1.5'), None], 'USD', [datetime(2024, 5, 6, tzinfo=dt_timezone.utc), None])
+        self.assertEqual(plain[0], 9.0)
+        self.assertTrue(np.isnan(plain[1]))
+
+
+class StubPTAXHandler(BaseHTTPRequestHandler):
+    """Faz as vezes da API PTAX do BCB: conta pedidos, atrasa e falha sob demanda."""
+    server_state = None
+
+    def do_GET(self):
+        state = self.server_state
+        with state['lock']:
+            state['requests'] += 1
+            state['active'] += 1
+            state['max_active'] = max(state['max_active'], state['active'])
+            failing = state['failures'] > 0
+            state['failures'] -= failing
+        time.sleep(state['delay'])
+        with state['lock']:
+            state['active'] -= 1
+        if failing:
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = json.dumps({'value': [
+            {'cotacaoVenda': 5.1234, 'dataHoraCotacao': '2024-05-06 13:04:26.866'},
+        ]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RateFetcherTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubPTAXHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}/'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StubPTAXHandler.server_state = self.state = {
+            'lock': threading.Lock(), 'requests': 0, 'active': 0, 'max_active': 0,
+            'failures': 0, 'delay': 0.0}
+        patcher = mock.patch.object(currency_converter, 'PTAX_BASE_URL', self.base_url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch(self, day=6):
+        day = datetime(2024, 5, day).date()
+        return currency_converter.fetch_ptax_period(day, day)
+
+    def test_concurrent_requests_share_one_fetch(self):
+        self.state['delay'] = 0.2
+        fetcher = SingleFlightFetcher(max_workers=4)
+        futures = [fetcher.submit(('USD', 6), self.fetch) for _ in range(10)]
+        results = [future.result(timeout=5) for future in futures]
+        self.assertEqual(self.state['requests'], 1)
+        self.assertEqual(results[0], {datetime(2024, 5, 6).date(): Decimal('5.1234')})
+        self.assertFalse(fetcher.pending(('USD', 6)))
+
+    def test_retries_with_backoff(self):
+        self.state['failures'] = 2
+        fetcher = SingleFlightFetcher(attempts=3, backoff=0.01)
+        self.assertTrue(fetcher.submit('k', self.fetch).result(timeout=5))
+        self.assertEqual(self.state['requests'], 3)
+
+        self.state['failures'] = 5
+        with self.assertRaises(currency_converter.requests.exceptions.HTTPError):
+            fetcher.submit('k', self.fetch).result(timeout=5)
+
+    def test_concurrency_is_bounded(self):
+        self.state['delay'] = 0.1
+        fetcher = SingleFlightFetcher(max_workers=2)
+        futures = [fetcher.submit(day, self.fetch, day) for day in range(1, 9)]
+        for future in futures:
+            future.result(timeout=5)
+        self.assertEqual(self.state['requests'], 8)
+        self.assertLessEqual(self.state['max_active'], 2)
+
+
+class StaleRateTests(TestCase):
+    def fetcher(self, fetched=None):
+        # Busca simulada: grava `fetched` ao ser pedida (ou nunca termina, se None)
+        def submit(key, function, *args):
+            future = Future()
+            if fetched is not None:
+                ExchangeRate.objects.bulk_create(
+                    ExchangeRate(currency='USD', date=day, rate=rate) for day, rate in fetched)
+                future.set_result(len(fetched))
+            return future
+        return mock.Mock(submit=mock.Mock(side_effect=submit))
+
+    def test_last_known_rate_is_served_while_fetch_runs(self):
+        ExchangeRate.objects.create(currency='USD', date=datetime(2024, 4, 24).date(), rate=5)
+        pending = self.fetcher()
+        with mock.patch.object(currency_converter, 'RATE_FETCHER', pending):
+            rate = currency_converter.get_exchange_rate('USD', datetime(2024, 5, 6).date())
+        self.assertEqual(rate, 5)
+        pending.submit.assert_called_once()
+        # A cotação antiga não fica no cache do processo
+        self.assertNotIn(('USD', datetime(2024, 5, 6).date()), currency_converter.RATES_CACHE)
+
+    def test_rates_older_than_stale_days_wait_for_the_fetch(self):
+        ExchangeRate.objects.create(currency='USD', date=datetime(2024, 4, 1).date(), rate=5)
+        with mock.patch.object(currency_converter, 'RATE_FETCHER', self.fetcher([])):
+            rate = currency_converter.get_exchange_rate('USD', datetime(2024, 5, 6).date())
+            converted = currency_converter.convert_many(
+                [10.0], 'USD', [datetime(2024, 5, 6, tzinfo=dt_timezone.utc)])
+        self.assertIsNone(rate)
+        self.assertEqual(converted.tolist(), [10.0])
+
+    def test_wait_skips_stale_rates(self):
+        ExchangeRate.objects.create(currency='USD', date=datetime(2024, 4, 24).date(), rate=5)
+        day = [datetime(2024, 5, 6, tzinfo=dt_timezone.utc)]
+        with mock.patch.object(currency_converter, 'RATE_FETCHER', self.fetcher()):
+            self.assertEqual(currency_converter.convert_many([10.0], 'USD', day).tolist(), [50.0])
+        fetched = [(datetime(2024, 5, 6).date(), 6)]
+        with mock.patch.object(currency_converter, 'RATE_FETCHER', self.fetcher(fetched)):
+            self.assertEqual(
+                currency_converter.convert_many([10.0], 'USD', day, wait=True).tolist(), [60.0])
+
+
+class AsyncAPITests(TransactionTestCase):
+    """
+    As views ASGI calculam em threads com conexões próprias, que só enxergam dados
+    já gravados: daí o TransactionTestCase.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='async', password='x')
+        portfolio = Portfolio.objects.create(user=self.user, name='B3', balance=1000)
+        for day, result in enumerate([100, -40, 60], start=1):
+            create_trade(self.user, portfolio, result,
+                         closed_at=datetime(2024, 3, day, 15, tzinfo=dt_timezone.utc))
+        token = RefreshToken.for_user(self.user).access_token
+        self.headers = {'Authorization': f'Bearer {token}'}
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        self.addCleanup(close_analytics_connections)
+
+    async def test_requires_jwt(self):
+        response = await self.async_client.get(reverse('dashboard:api_async_dashboard'))
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get(
+            reverse('dashboard:api_async_trade_list'), headers={'Authorization': 'Bearer x'})
+        self.assertEqual(response.status_code, 401)
+        # Cabeçalho malformado: 401, como na view DRF
+        response = await self.async_client.get(
+            reverse('dashboard:api_async_trade_list'), headers={'Authorization': 'Bearer a b'})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_trade_list_matches_sync_view(self):
+        url = reverse('dashboard:api_async_trade_list')
+        response = await self.async_client.get(url, {'page_size': 2}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(len(body['results']), 2)
+        self.assertIn('cursor=', body['next'])
+
+        expected = await sync_to_async(self.api.get)(
+            reverse('dashboard:api_trade_list'), {'page_size': 2})
+        self.assertEqual(body['results'], json.loads(expected.content)['results'])
+
+        last = await self.async_client.get(body['next'], headers=self.headers)
+        self.assertEqual(len(last.json()['results']), 1)
+        self.assertIsNone(last.json()['next'])
+
+    async def test_dashboard_gathers_all_analytics(self):
+        response = await self.async_client.get(
+            reverse('dashboard:api_async_dashboard'), headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(set(body), {'kpis', 'equity', 'strategies', 'time'})
+        self.assertEqual(body['kpis']['trade_count'], 3)
+        self.assertEqual(body['equity']['equity'][-1][1], 120.0)
+
+        # Mesmas chaves de cache que as views síncronas
+        metrics = await sync_to_async(self.api.get)(reverse('dashboard:api_metrics'))
+        self.assertEqual(json.loads(metrics.content)['total_pl'], body['kpis']['total_pl'])
+
+    async def test_gather_is_bounded_and_reuses_connections(self):
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def query():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            Trade.objects.count()
+            with lock:
+                running[0] -= 1
+            return id(connection.connection)
+
+        calls = {f'q{n}': query for n in range(12)}
+        first = set((await gather_analytics(**calls)).values())
+        second = set((await gather_analytics(**calls)).values())
+        self.assertLessEqual(peak[0], settings.ANALYTICS_THREADS)
+        self.assertLessEqual(len(first), settings.ANALYTICS_THREADS)
+        # As threads do pool ficam com as suas conexões entre pedidos
+        self.assertEqual(second, first)
+
+
+@skipUnless(find_spec('uvicorn'), 'uvicorn não instalado')
+@override_settings(ALLOWED_HOSTS=['127.0.0.1'])
+class ASGIServerTests(TransactionTestCase):
+    """As views ASGI e o benchmark_http contra o projeto servido de facto pelo uvicorn."""
+
+    def setUp(self):
+        import uvicorn
+        from config.asgi import application
+
+        cache.clear()
+        self.user = User.objects.create_user(username='asgi', password='x')
+        portfolio = Portfolio.objects.create(user=self.user, name='B3', balance=1000)
+        for day, result in enumerate([100, -40, 60], start=1):
+            create_trade(self.user, portfolio, result,
+                         closed_at=datetime(2024, 3, day, 15, tzinfo=dt_timezone.utc))
+        token = RefreshToken.for_user(self.user).access_token
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+        self.server = uvicorn.Server(uvicorn.Config(
+            application, host='127.0.0.1', port=0, lifespan='off', log_level='warning'))
+        thread = threading.Thread(target=self.server.run, daemon=True)
+        thread.start()
+        for _ in range(500):
+            if self.server.started:
+                break
+            time.sleep(0.01)
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        self.base_url = f'http://127.0.0.1:{port}'
+        self.addCleanup(close_analytics_connections)
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(setattr, self.server, 'should_exit', True)
+
+    def test_async_views_under_concurrent_load(self):
+        url = self.base_url + reverse('dashboard:api_async_dashboard')
+        self.assertEqual(requests.get(url, timeout=10).status_code, 401)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(
+                lambda _: requests.get(url, headers=self.headers, timeout=30), range(16)))
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertEqual({response.json()['kpis']['trade_count'] for response in responses}, {3})
+
+        trades = requests.get(self.base_url + reverse('dashboard:api_async_trade_list'),
+                              {'page_size': 2}, headers=self.headers, timeout=10)
+        self.assertEqual(len(trades.json()['results']), 2)
+
+    def test_benchmark_http(self):
+        out = io.StringIO()
+        call_command('benchmark_http', self.base_url + reverse('dashboard:api_async_dashboard'),
+                     '--username', 'asgi', '--users', '3', '--requests', '2', stdout=out)
+        self.assertIn('6 pedidos (0 erros), 3 utilizadores simultâneos', out.getvalue())
+
+
+class LatencySummaryTests(SimpleTestCase):
+    def test_percentiles_and_throughput(self):
+        stats = latency_summary([0.01] * 99 + [1.0], elapsed=2.0, errors=1)
+        self.assertEqual(stats, {'requests': 100, 'errors': 1, 'p50': 10.0,
+                                 'p99': 19.9, 'throughput': 50.0})
+        self.assertEqual(latency_summary([], 1.0, errors=3)['requests'], 0)
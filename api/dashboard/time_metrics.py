@@ -0,0 +1,79 @@
+# api/dashboard/time_metrics.py
+
+import numpy as np
+import pandas as pd
+from django.utils import timezone
+
+from .currency_converter import convert_many
+from .instrumentation import timed
+from .models import Trade
+
+WEEKDAYS = ['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom']
+
+# Faixas de duração (limite superior em segundos) e os seus rótulos
+HOLDING_BANDS = [5 * 60, 30 * 60, 2 * 3600, 24 * 3600, 5 * 86400, 20 * 86400]
+HOLDING_LABELS = ['< 5 min', '5-30 min', '30 min-2 h', '2 h-1 dia',
+                  '1-5 dias', '5-20 dias', '> 20 dias']
+
+TIME_COLUMNS = ['net_result', 'portfolio__currency',
+                'opened_at', 'closed_at', 'last_manual_close', 'last_target']
+
+
+def time_frame(user, portfolio=None):
+    """
+    Snapshot colunar dos trades fechados numa única query: resultado em BRL, hora e
+    dia da semana da entrada (fuso local) e duração até a última perna de saída.
+    """
+    trades = Trade.objects.closed().filter(user=user)
+    if portfolio is not None:
+        trades = trades.filter(portfolio=portfolio)
+    rows = trades.with_closed_at().with_opened_at().values_list(*TIME_COLUMNS)
+    df = pd.DataFrame.from_records(rows, columns=TIME_COLUMNS)
+
+    closed_at = pd.to_datetime(df['closed_at'], utc=True)
+    opened_at = pd.to_datetime(df['opened_at'], utc=True)
+    local_open = opened_at.fillna(closed_at).dt.tz_convert(
+        timezone.get_current_timezone_name())
+
+    # Sem perna de saída, closed_at é a data de criação: a duração fica desconhecida
+    has_exit = df['last_manual_close'].notna() | df['last_target'].notna()
+    holding = (closed_at - opened_at).dt.total_seconds().where(has_exit)
+
+    return pd.DataFrame({
+        'net': convert_many(df['net_result'], df['portfolio__currency'], closed_at).astype(float),
+        'hour': local_open.dt.hour,
+        'weekday': local_open.dt.weekday,
+        'holding_band': np.where(holding.notna(), np.searchsorted(
+            HOLDING_BANDS, holding.fillna(0), side='right'), -1),
+    })
+
+
+@timed('pandas')
+def bucket_stats(index, net, size, labels=None):
+    """Resultado, quantidade e taxa de acerto por balde, com np.bincount (sem loops por trade)."""
+    valid = index >= 0
+    index, net = index[valid], net[valid]
+    total = np.bincount(index, weights=net, minlength=size)
+    count = np.bincount(index, minlength=size)
+    wins = np.bincount(index, weights=net > 0, minlength=size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        win_rate = np.where(count > 0, wins / count * 100, 0.0)
+    return [
+        {'bucket': bucket, 'label': labels[bucket] if labels else f'{bucket:02d}h',
+         'net': round(float(total[bucket]), 2), 'count': int(count[bucket]),
+         'win_rate': round(float(win_rate[bucket]), 2)}
+        for bucket in range(size)
+    ]
+
+
+def time_metrics(user, portfolio=None):
+    """Histogramas por hora do dia, dia da semana e faixa de duração, em BRL."""
+    frame = time_frame(user, portfolio)
+    net = frame['net'].to_numpy()
+    return {
+        'currency': 'BRL',
+        'hour': bucket_stats(frame['hour'].to_numpy(dtype=np.int64), net, 24),
+        'weekday': bucket_stats(frame['weekday'].to_numpy(dtype=np.int64), net, 7, WEEKDAYS),
+        'holding': bucket_stats(frame['holding_band'].to_numpy(dtype=np.int64), net,
+                                len(HOLDING_LABELS), HOLDING_LABELS),
+    }
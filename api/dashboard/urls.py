@@ -1,11 +1,39 @@
 # api/dashboard/urls.py
 
 from django.urls import path
-from .views import TradeListAPIView  # Importamos a nossa nova e única view
+from .views import (
+    TradeListAPIView, DashboardMetricsAPIView, TradeExportAPIView, TradeImportAPIView,
+    EquityCurveAPIView, StrategyBreakdownAPIView, TimeMetricsAPIView,
+    CalendarAPIView, TaxReportAPIView, ForexCalculatorAPIView, JournalSearchAPIView,
+    MonteCarloAPIView,
+)
+from .async_views import AsyncDashboardView, AsyncTradeListView
 
 app_name = 'dashboard'
 
 urlpatterns = [
-    # O único endpoint que o dashboard serve agora é a lista de trades
     path('api/trades/', TradeListAPIView.as_view(), name='api_trade_list'),
+    path('api/trades/export/', TradeExportAPIView.as_view(),
+         name='api_trade_export'),
+    path('api/trades/import/', TradeImportAPIView.as_view(),
+         name='api_trade_import'),
+    path('api/metrics/', DashboardMetricsAPIView.as_view(), name='api_metrics'),
+    path('api/charts/equity/', EquityCurveAPIView.as_view(),
+         name='api_equity_curve'),
+    path('api/analytics/strategies/', StrategyBreakdownAPIView.as_view(),
+         name='api_strategy_breakdown'),
+    path('api/analytics/time/', TimeMetricsAPIView.as_view(),
+         name='api_time_metrics'),
+    path('api/analytics/monte-carlo/', MonteCarloAPIView.as_view(),
+         name='api_monte_carlo'),
+    path('api/calendar/', CalendarAPIView.as_view(), name='api_calendar'),
+    path('api/tax/', TaxReportAPIView.as_view(), name='api_tax_report'),
+    path('api/forex/calculator/', ForexCalculatorAPIView.as_view(),
+         name='api_forex_calculator'),
+    path('api/journal/search/', JournalSearchAPIView.as_view(),
+         name='api_journal_search'),
+    # Versões ASGI nativas (servidas com uvicorn/daphne; sob WSGI também funcionam)
+    path('api/async/trades/', AsyncTradeListView.as_view(), name='api_async_trade_list'),
+    path('api/async/dashboard/', AsyncDashboardView.as_view(),
+         name='api_async_dashboard'),
 ]
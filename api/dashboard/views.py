@@ -1,15 +1,80 @@
 # api/dashboard/views.py
 
+import csv
+import math
+
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from django.utils import timezone
 from rest_framework import generics
+from rest_framework.exceptions import ParseError
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 # 1. Importamos os nossos NOVOS modelos e serializers
-from .models import Trade
+from .models import Portfolio, Strategy, Trade
 from .serializers import UserSerializer, TradeSerializer
+from .metrics import DashboardMetrics
+from .pagination import KeysetPagination
+from .exporters import CONTENT_TYPES, STREAM_WRITERS, iter_export_chunks, parquet_available
+from .importers import import_trades, read_rows
+from .analytics_cache import cached_analytics
+from .strategy_stats import strategy_breakdown
+from .time_metrics import time_metrics
+from .tax import tax_report
+from .forex import ForexInputError, position_sizes, rate_matrix
+from .journal_search import MAX_RESULTS, search_notes
+from .simulation import monte_carlo
+from .snapshots import trade_snapshot
+from .charts import (
+    MAX_CHART_POINTS, RESOLUTIONS, calendar_month, daily_results, equity_curves, starting_capital,
+)
 
 # --- Views da API ---
 
+NOT_FOUND_MESSAGES = {
+    Portfolio: 'Portfolio não encontrado.',
+    Strategy: 'Estratégia não encontrada.',
+}
+
+
+def owned_or_400(model, user, raw_pk):
+    """
+    Objeto de `model` do utilizador com a chave `raw_pk` (da query string ou do corpo),
+    ou None se `raw_pk` vier vazio. Uma chave malformada, inexistente ou de outro
+    utilizador levanta ParseError, que o DRF responde com 400 e {'detail': ...}.
+    """
+    if raw_pk in (None, ''):
+        return None
+    try:
+        instance = model.objects.filter(user=user, pk=raw_pk).first()
+    except (TypeError, ValueError, ValidationError):
+        instance = None
+    if instance is None:
+        raise ParseError(NOT_FOUND_MESSAGES[model])
+    return instance
+
+
+def dates_or_400(params, *names):
+    """
+    Datas AAAA-MM-DD dos parâmetros `names` que vieram preenchidos, como dict.
+    Um formato errado ou uma data inexistente (ex.: 2024-13-40) levanta ParseError (400).
+    """
+    dates = {}
+    for name in names:
+        if params.get(name):
+            try:
+                dates[name] = parse_date(params[name])
+            except ValueError:
+                dates[name] = None
+            if dates[name] is None:
+                raise ParseError(f"'{name}' deve estar no formato AAAA-MM-DD.")
+    return dates
+
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -21,11 +86,335 @@ class RegisterView(generics.CreateAPIView):
 
 class TradeListAPIView(generics.ListAPIView):
     """
-    Esta view da API lista todos os trades do utilizador autenticado.
+    Esta view da API lista os trades do utilizador autenticado, paginados por
+    cursor (ver KeysetPagination) e com suporte a ?fields= para resposta enxuta.
     """
     serializer_class = TradeSerializer
     permission_classes = [IsAuthenticated]  # Mantemos a segurança
+    # Ordena por (created_at, id): serve só para modelos com created_at
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        # A query agora busca por Trades, não por Operations
-        return Trade.objects.filter(user=self.request.user).order_by('-created_at')
+        # Número constante de queries, independente da quantidade de trades
+        trades = Trade.objects.filter(
+            user=self.request.user).order_by('-created_at', '-id')
+        return TradeSerializer.setup_queryset(
+            trades, TradeSerializer.requested_fields(self.request))
+
+
+class DashboardMetricsAPIView(APIView):
+    """
+    Devolve todos os KPIs do dashboard, calculados em uma única passada
+    sobre os trades fechados do utilizador autenticado. O resultado fica em cache
+    até a próxima alteração dos dados do utilizador (ou a virada do dia).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        today = timezone.localdate()
+        return Response(cached_analytics(
+            'kpis', request.user.pk,
+            lambda: DashboardMetrics(request.user, today=today).compute().as_dict(),
+            today=today))
+
+
+class TradeExportAPIView(APIView):
+    """
+    Exporta todo o histórico de trades do utilizador em streaming, com as pernas
+    agregadas e o resultado em BRL: ?format=csv (padrão), ndjson ou parquet.
+    A memória usada fica constante, independente do tamanho do histórico.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def perform_content_negotiation(self, request, force=False):
+        # Aqui ?format= escolhe o formato do ficheiro, não um renderer do DRF
+        renderer = self.get_renderers()[0]
+        return renderer, renderer.media_type
+
+    def get(self, request):
+        export_format = request.query_params.get('format', 'csv')
+        if export_format not in STREAM_WRITERS:
+            return Response(
+                {'detail': f"Formato inválido. Use um de: {', '.join(STREAM_WRITERS)}."},
+                status=400)
+        if export_format == 'parquet' and not parquet_available():
+            return Response(
+                {'detail': 'A exportação em Parquet requer o pacote pyarrow.'}, status=400)
+
+        response = StreamingHttpResponse(
+            STREAM_WRITERS[export_format](iter_export_chunks(request.user)),
+            content_type=CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="trades.{export_format}"'
+        return response
+
+
+class TradeImportAPIView(APIView):
+    """
+    Importa um extrato (CSV ou Excel) para um portfolio do utilizador.
+    Espera multipart com `file` e `portfolio` (id). Ver dashboard/importers.py
+    para o formato das colunas.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': "Envie o extrato no campo 'file'."}, status=400)
+        portfolio = owned_or_400(Portfolio, request.user, request.data.get('portfolio'))
+        if portfolio is None:
+            return Response({'detail': "Informe o portfolio em 'portfolio'."}, status=400)
+
+        try:
+            rows = read_rows(upload, upload.name)
+            result = import_trades(request.user, portfolio, rows)
+        except ImportError:
+            return Response(
+                {'detail': 'A importação de Excel requer o pacote openpyxl.'}, status=400)
+        # Nos dois casos, os blocos lidos antes do erro ficam gravados (ver import_trades)
+        except UnicodeDecodeError:
+            return Response({'detail': 'Ficheiro ilegível: use CSV em UTF-8.'}, status=400)
+        except csv.Error as error:
+            return Response({'detail': f'CSV malformado: {error}.'}, status=400)
+        if not (result.created or result.skipped or result.errors):
+            return Response({'detail': 'O ficheiro não contém nenhum trade.'}, status=400)
+        return Response(result.as_dict(), status=201)
+
+
+class EquityCurveAPIView(APIView):
+    """
+    Curvas de patrimônio, drawdown e submersa do utilizador, em BRL, a partir do
+    DailyPnL. Filtros: ?portfolio=<id>, ?strategy=<id>, ?resolution=day|week|month
+    e ?max_points=<n> (no máximo MAX_CHART_POINTS pontos por série).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        resolution = params.get('resolution', 'day')
+        if resolution not in RESOLUTIONS:
+            return Response(
+                {'detail': f"Resolução inválida. Use uma de: {', '.join(RESOLUTIONS)}."},
+                status=400)
+        try:
+            max_points = min(int(params.get('max_points', MAX_CHART_POINTS)), MAX_CHART_POINTS)
+        except ValueError:
+            return Response({'detail': "'max_points' deve ser um inteiro."}, status=400)
+        if max_points < 3:
+            return Response({'detail': "'max_points' deve ser pelo menos 3."}, status=400)
+
+        portfolio = owned_or_400(Portfolio, request.user, params.get('portfolio'))
+        strategy = owned_or_400(Strategy, request.user, params.get('strategy'))
+
+        def compute():
+            daily = daily_results(request.user, portfolio, strategy)
+            capital = starting_capital(request.user, portfolio)
+            return equity_curves(daily, capital, resolution, max_points)
+
+        return Response(cached_analytics(
+            'equity', request.user.pk, compute,
+            portfolio=getattr(portfolio, 'pk', None), strategy=getattr(strategy, 'pk', None),
+            resolution=resolution, max_points=max_points))
+
+
+class StrategyBreakdownAPIView(APIView):
+    """
+    Desempenho por estratégia e por tag (taxa de acerto, expectativa, fator de lucro,
+    R médio), agregado no banco. Filtros: ?portfolio=<id>, ?date_from= e ?date_to=
+    (AAAA-MM-DD, pela data de fechamento).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        dates = dates_or_400(params, 'date_from', 'date_to')
+        portfolio = owned_or_400(Portfolio, request.user, params.get('portfolio'))
+
+        return Response(cached_analytics(
+            'strategies', request.user.pk,
+            lambda: strategy_breakdown(request.user, portfolio, **dates),
+            portfolio=getattr(portfolio, 'pk', None), **dates))
+
+
+class TimeMetricsAPIView(APIView):
+    """
+    Resultado, quantidade e taxa de acerto dos trades fechados por hora do dia e
+    dia da semana da entrada (fuso TIME_ZONE) e por faixa de duração. ?portfolio=<id>.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        portfolio = owned_or_400(Portfolio, request.user, request.query_params.get('portfolio'))
+
+        return Response(cached_analytics(
+            'time_metrics', request.user.pk, lambda: time_metrics(request.user, portfolio),
+            portfolio=getattr(portfolio, 'pk', None)))
+
+
+class CalendarAPIView(APIView):
+    """
+    Resultado diário de um mês para o calendário: ?year=&month= (padrão: mês atual)
+    e ?portfolio=<id>. Inclui os totais por semana e do mês, em BRL.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        today = timezone.localdate()
+        try:
+            year = int(params.get('year', today.year))
+            month = int(params.get('month', today.month))
+        except ValueError:
+            return Response({'detail': "'year' e 'month' devem ser inteiros."}, status=400)
+        if not (1 <= month <= 12 and 1900 <= year <= 9999):
+            return Response({'detail': 'Mês ou ano inválido.'}, status=400)
+
+        portfolio = owned_or_400(Portfolio, request.user, params.get('portfolio'))
+
+        return Response(cached_analytics(
+            'calendar', request.user.pk,
+            lambda: calendar_month(request.user, year, month, portfolio),
+            year=year, month=month, portfolio=getattr(portfolio, 'pk', None)))
+
+
+class TaxReportAPIView(APIView):
+    """
+    Apuração mensal de IR (day trade e operações comuns) de um ano: ?year= (padrão:
+    ano atual). Os meses fechados ainda não gravados (ver o comando close_tax_months)
+    são apurados sem gravar e o resultado fica em cache até à próxima alteração dos
+    dados; o mês em aberto vem em `current`, como prévia.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        today = timezone.localdate()
+        try:
+            year = int(request.query_params.get('year', today.year))
+        except ValueError:
+            return Response({'detail': "'year' deve ser um inteiro."}, status=400)
+
+        # A chave leva o mês atual: a virada do mês muda o que está em aberto
+        return Response(cached_analytics(
+            'tax_report', request.user.pk,
+            lambda: tax_report(request.user, year, today),
+            year=year, month=today.replace(day=1)))
+
+
+class ForexCalculatorAPIView(APIView):
+    """
+    Calculadora de posição em forex, servida de uma matriz de câmbio em memória.
+    GET devolve a matriz do dia. POST recebe um item ou {"items": [...]} com
+    symbol, stop_pips e risk_amount (ou risk_percent + balance), e opcionalmente
+    account_currency (padrão BRL).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(rate_matrix().as_dict())
+
+    def post(self, request):
+        data = request.data
+        items = data.get('items', [data]) if isinstance(data, dict) else None
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return Response({'detail': "Envie um objeto ou {'items': [...]}."}, status=400)
+
+        matrix = rate_matrix()
+        try:
+            results = position_sizes(matrix, items, str(
+                data.get('account_currency', 'BRL')).upper())
+        except ForexInputError as e:
+            return Response({'detail': str(e)}, status=400)
+        return Response({'date': matrix.day.isoformat(), 'results': results})
+
+
+class JournalSearchAPIView(APIView):
+    """
+    Busca de texto completo nas notas do journal: ?q= (obrigatório), com ranking e
+    trechos destacados. Filtros: ?strategy=<id>, ?confidence_min=, ?confidence_max=,
+    ?date_from=, ?date_to= (AAAA-MM-DD) e ?limit= (até MAX_RESULTS).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        query = params.get('q', '').strip()
+        if not query:
+            return Response({'detail': "Informe o termo de busca em 'q'."}, status=400)
+
+        filters = {}
+        try:
+            for name in ('confidence_min', 'confidence_max'):
+                if params.get(name):
+                    filters[name] = int(params[name])
+            limit = int(params.get('limit', 20))
+        except ValueError:
+            return Response(
+                {'detail': "'confidence_min', 'confidence_max' e 'limit' devem ser inteiros."},
+                status=400)
+        if not 1 <= limit <= MAX_RESULTS:
+            return Response({'detail': f"'limit' deve estar entre 1 e {MAX_RESULTS}."}, status=400)
+        filters.update(dates_or_400(params, 'date_from', 'date_to'))
+        filters['strategy'] = owned_or_400(Strategy, request.user, params.get('strategy'))
+
+        return Response({'query': query,
+                         'results': search_notes(request.user, query, limit=limit, **filters)})
+
+
+class MonteCarloAPIView(APIView):
+    """
+    Simulação de Monte Carlo (bootstrap por blocos) dos resultados dos trades
+    fechados, em BRL: faixas de percentis do patrimônio, distribuição do drawdown
+    máximo e probabilidade de perder ?loss_pct=% (padrão 20) do capital.
+    Parâmetros: ?paths= (até MAX_PATHS), ?horizon= (trades por caminho, padrão: o
+    histórico), ?block=, ?seed=, ?capital= (padrão: saldo atual), ?portfolio=, ?strategy=.
+    """
+    permission_classes = [IsAuthenticated]
+    MAX_PATHS = 20_000
+    MAX_HORIZON = 5_000
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            paths = int(params.get('paths', 1000))
+            horizon = int(params['horizon']) if params.get('horizon') else None
+            block = int(params.get('block', 1))
+            seed = int(params.get('seed', 0))
+            loss_pct = float(params.get('loss_pct', 20))
+            capital = float(params['capital']) if params.get('capital') else None
+        except ValueError:
+            return Response({'detail': 'Parâmetros numéricos inválidos.'}, status=400)
+        # float() aceita 'inf' e 'nan', que depois não cabem no JSON da resposta
+        if not math.isfinite(loss_pct) or (capital is not None and not math.isfinite(capital)):
+            return Response({'detail': "'capital' e 'loss_pct' devem ser números finitos."},
+                            status=400)
+        if not 1 <= paths <= self.MAX_PATHS:
+            return Response({'detail': f"'paths' deve estar entre 1 e {self.MAX_PATHS}."},
+                            status=400)
+        if horizon is not None and not 1 <= horizon <= self.MAX_HORIZON:
+            return Response({'detail': f"'horizon' deve estar entre 1 e {self.MAX_HORIZON}."},
+                            status=400)
+        if block < 1 or seed < 0 or not 0 < loss_pct <= 100:
+            return Response(
+                {'detail': "'block' deve ser positivo, 'seed' não negativa e 'loss_pct' entre 0 e 100."},
+                status=400)
+
+        portfolio = owned_or_400(Portfolio, request.user, params.get('portfolio'))
+        strategy = owned_or_400(Strategy, request.user, params.get('strategy'))
+
+        snapshot = trade_snapshot(request.user.pk)
+        selected = snapshot.mask(getattr(portfolio, 'pk', None), getattr(strategy, 'pk', None))
+        results = snapshot['net_brl_cents'][selected] / 100
+        if results.size < 2:
+            return Response({'detail': 'São necessários pelo menos 2 trades fechados.'},
+                            status=400)
+        if capital is None:
+            capital = DashboardMetrics(request.user, portfolio).total_balance()
+        horizon = horizon or min(results.size, self.MAX_HORIZON)
+
+        return Response(cached_analytics(
+            'monte_carlo', request.user.pk,
+            lambda: {'trades': int(results.size), **monte_carlo(
+                results, capital, paths, horizon, block, seed, loss_pct)},
+            portfolio=getattr(portfolio, 'pk', None), strategy=getattr(strategy, 'pk', None),
+            paths=paths, horizon=horizon, block=block, seed=seed, loss_pct=loss_pct,
+            capital=capital))
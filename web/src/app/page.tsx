@@ -22,7 +22,10 @@ export default function HomePage() {
   const router = useRouter();
 
   const [trades, setTrades] = useState<Trade[]>([]);
+  // Link da próxima página (cursor), ou null quando já temos todos os trades
+  const [nextPage, setNextPage] = useState<string | null>(null);
   const [isLoading, setIsLoading] = useState(true);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
 
   useEffect(() => {
@@ -44,7 +47,9 @@ export default function HomePage() {
         setIsLoading(true);
         // 2. AQUI ESTÁ A MUDANÇA: Apontamos para o novo endpoint de trades!
         const data = await apiClient('/dashboard/api/trades/');
-        setTrades(data);
+        // A lista agora é paginada por cursor: { next, results }
+        setTrades(data.results);
+        setNextPage(data.next);
       } catch (err: any) {
         setError(err.message);
         console.error("Erro ao buscar trades:", err);
@@ -56,6 +61,25 @@ export default function HomePage() {
     fetchTrades();
   }, [isAuthenticated, isAuthLoading, router]); // Dependências do useEffect
 
+  // Segue o link `next` da API, que já traz o cursor da página seguinte
+  const loadMore = async () => {
+    if (!nextPage) {
+      return;
+    }
+    try {
+      setIsLoadingMore(true);
+      const url = new URL(nextPage);
+      const data = await apiClient(`${url.pathname}${url.search}`);
+      setTrades(current => [...current, ...data.results]);
+      setNextPage(data.next);
+    } catch (err: any) {
+      setError(err.message);
+      console.error("Erro ao buscar mais trades:", err);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   // Se a autenticação estiver a carregar, mostramos uma mensagem genérica
   if (isAuthLoading || isLoading) {
     return <p className="text-center mt-10">A carregar...</p>;
@@ -83,6 +107,16 @@ export default function HomePage() {
           ))}
         </ul>
       )}
+
+      {nextPage && (
+        <button
+          onClick={loadMore}
+          disabled={isLoadingMore}
+          className="mt-6 px-4 py-2 rounded bg-gray-700 hover:bg-gray-600 disabled:opacity-50"
+        >
+          {isLoadingMore ? 'A carregar...' : 'Carregar mais'}
+        </button>
+      )}
     </main>
   );
 }
\ No newline at end of file